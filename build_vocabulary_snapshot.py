@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+
+"""
+This script exports the vocabularies that are looked up remotely (EFO terms in OLS, NCBI taxonomy, ENA's
+vocabularies in USI) into a local snapshot file, which is used by the --offline option of the other scripts.
+The snapshot has a version (by default the date it was built), and a format version that is checked when it
+is read. Term URLs whose ontology has been looked up before (stored in the look-up cache) are included as well.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+from utils.concurrent_lookups import DEFAULT_HOST_LIMIT, LookupClient
+from utils.common_utils import create_logger
+from utils.compression import open_file
+from utils.converter_utils import ontology_term
+from utils.lookup_cache import get_lookup_cache
+from utils.vocabulary_snapshot import FORMAT_VERSION, get_default_snapshot_path, is_offline, term_key
+
+
+# Terms whose descendants are the allowed values of the metadata checks
+DESCENDANT_TERMS = ("unit", "study_design", "role")
+
+DEFAULT_ORGANISMS = ["Homo sapiens", "Mus musculus", "Rattus norvegicus", "Danio rerio", "Drosophila melanogaster",
+                     "Caenorhabditis elegans", "Saccharomyces cerevisiae", "Schizosaccharomyces pombe",
+                     "Arabidopsis thaliana", "Oryza sativa", "Zea mays", "Triticum aestivum", "Solanum lycopersicum",
+                     "Glycine max", "Xenopus laevis", "Xenopus tropicalis", "Gallus gallus", "Sus scrofa",
+                     "Bos taurus", "Ovis aries", "Canis lupus familiaris", "Macaca mulatta", "Escherichia coli",
+                     "Bacillus subtilis", "Mycobacterium tuberculosis", "Staphylococcus aureus",
+                     "Pseudomonas aeruginosa", "Plasmodium falciparum", "Candida albicans", "Aspergillus fumigatus"]
+
+DEFAULT_ONTOLOGIES = ["EFO", "UBERON", "CL", "CLO", "NCBITaxon", "UO", "PATO", "CHEBI", "OBI", "MONDO", "DOID", "HP",
+                      "ORDO", "BTO", "PO", "GO", "NCIT", "HANCESTRO"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--output', default=get_default_snapshot_path(),
+                        help="Path of the snapshot file, compressed if it ends with .gz "
+                             "(default is {})".format(get_default_snapshot_path()))
+    parser.add_argument('-V', '--version', default=time.strftime("%Y-%m-%d"),
+                        help="Version of the snapshot (default is today's date)")
+    parser.add_argument('-g', '--organisms', nargs='+', default=[],
+                        help="Additional organism names to look up in NCBI taxonomy")
+    parser.add_argument('-G', '--organisms_file',
+                        help="Path to a file with additional organism names, one per line")
+    parser.add_argument('-t', '--ontologies', nargs='+', default=[],
+                        help="Additional ontologies to look up the source file of")
+    parser.add_argument('-w', '--workers', type=int, default=DEFAULT_HOST_LIMIT,
+                        help="Number of look-ups that are sent to each service at the same time (default is {})".format(
+                            DEFAULT_HOST_LIMIT))
+    parser.add_argument('-v', '--verbose', action='store_const', const=10, default=20,
+                        help="Option to output detailed logging (debug level).")
+    args = parser.parse_args()
+
+    return args
+
+
+def build_snapshot(version, organisms, ontologies, logger, workers=DEFAULT_HOST_LIMIT):
+    """Look up all vocabularies and return the content of the snapshot as dictionary.
+    The look-ups of each section are sent concurrently, with at most the given number of requests to each service.
+    Raises an exception if one of the vocabularies needed by the checks could not be retrieved."""
+
+    snapshot = OrderedDict([("format_version", FORMAT_VERSION),
+                            ("version", version),
+                            ("created", time.strftime("%Y-%m-%dT%H:%M:%S"))])
+
+    with LookupClient(host_limit=workers) as client:
+        # Allowed values of the checks
+        terms = {category: ontology_term(category) for category in DESCENDANT_TERMS}
+        descendants = client.look_up_all(
+            lambda category: client.get_term_descendants(terms[category]["ontology"], terms[category]["uri"], logger),
+            DESCENDANT_TERMS)
+        term_descendants = OrderedDict()
+        for category in DESCENDANT_TERMS:
+            term = terms[category]
+            if not descendants.get(category):
+                raise Exception("Failed to retrieve the descendants of {} ({}).".format(term["uri"], category))
+            term_descendants[term_key(term["ontology"], term["uri"])] = sorted(descendants[category])
+            logger.info("Retrieved {} descendants of {}".format(len(descendants[category]), category))
+        snapshot["term_descendants"] = term_descendants
+
+        # The parents of the unit terms give the unit types (see converter.json2dm.lookup_unit_type)
+        units = term_descendants[term_key(terms["unit"]["ontology"], terms["unit"]["uri"])]
+        parents = client.look_up_all(lambda unit: client.get_term_parent("efo", unit), units)
+        snapshot["term_parents"] = OrderedDict((term_key("efo", unit), parent) for unit, parent in parents.items())
+        logger.info("Retrieved the parents of {} of {} units".format(len(parents), len(units)))
+
+        # ENA's vocabularies from USI
+        snapshot["ena_library_terms"] = client.get_ena_library_terms(logger)
+        snapshot["ena_instrument_models"] = client.get_ena_instrument_terms(logger)
+        if not snapshot["ena_library_terms"] or not snapshot["ena_instrument_models"]:
+            raise Exception("Failed to retrieve ENA's library and instrument vocabularies from USI.")
+
+        # Taxonomy
+        taxa = client.look_up_all(lambda organism: client.get_taxon(organism, logger), organisms)
+        for organism in organisms:
+            if organism not in taxa:
+                logger.warning("Organism {} was not found in NCBI taxonomy.".format(organism))
+        snapshot["taxa"] = taxa
+        logger.info("Retrieved {} of {} organisms".format(len(taxa), len(organisms)))
+
+        # Ontologies of term URLs that have been looked up before, and the ontology source files
+        term_ontologies = dict(get_lookup_cache("term_ontologies").values)
+        snapshot["term_ontologies"] = OrderedDict(sorted(term_ontologies.items()))
+        all_ontologies = sorted(set(ontologies).union(o for o in term_ontologies.values() if o), key=str.upper)
+        snapshot["ontology_source_files"] = client.look_up_all(client.get_ontology_source_file, all_ontologies)
+        logger.info("Retrieved the source files of {} of {} ontologies".format(
+            len(snapshot["ontology_source_files"]), len(all_ontologies)))
+
+    return snapshot
+
+
+def write_snapshot(snapshot, file_path):
+    """Write the snapshot to the file. The file is replaced in one go, so that running processes that read
+    it never see a partially written snapshot."""
+    directory = os.path.dirname(os.path.abspath(file_path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    with open_file(tmp_path, "w", compression="gzip" if file_path.endswith(".gz") else None) as fh:
+        json.dump(snapshot, fh)
+    os.replace(tmp_path, file_path)
+
+
+def main():
+    process_name = "build_vocabulary_snapshot"
+
+    args = parse_args()
+    output_dir, output_name = os.path.split(os.path.abspath(args.output))
+    logger = create_logger(output_dir, process_name, output_name, log_level=args.verbose)
+    if is_offline():
+        logger.error("The snapshot can't be built in offline mode.")
+        sys.exit(1)
+
+    organisms = DEFAULT_ORGANISMS + args.organisms
+    if args.organisms_file:
+        with open(args.organisms_file, encoding="utf-8") as fh:
+            organisms.extend(line.strip() for line in fh if line.strip())
+    organisms = list(OrderedDict.fromkeys(organisms))
+
+    try:
+        snapshot = build_snapshot(args.version, organisms, DEFAULT_ONTOLOGIES + args.ontologies, logger,
+                                  workers=args.workers)
+    except Exception as e:
+        logger.error("Failed to build the vocabulary snapshot: {}".format(e))
+        sys.exit(1)
+    write_snapshot(snapshot, args.output)
+    logger.info("Wrote vocabulary snapshot version {} to {}".format(args.version, args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+
+"""
+This script runs the conversion and validation as a local service (HTTP or Unix socket).
+The mapping config, the compiled JSON schema and the look-up and validation caches are loaded once and kept
+in memory, so that jobs don't start cold like the command line scripts. Jobs are sent as JSON object in
+POST requests to /validate, /mtab2usi or /json2mtab, and are run by a bounded pool of worker threads.
+The results and the log messages of each job are returned as JSON.
+New cache entries are written to the cache files every few seconds, after a number of jobs and at shutdown,
+not after every job, as the files are read, merged and written in full.
+"""
+
+import argparse
+import json
+import logging
+import os
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from converter import json2dm
+from converter.dm2json import datamodel2json_conversion
+from converter.magetab2dm import data_objects_from_magetab
+from json2mtab_conversion import write_magetab
+from magetab_validation import validate_magetab
+from utils.common_utils import create_logger
+from utils.converter_utils import read_json_file
+from utils.lookup_cache import save_lookup_caches
+from utils.magetab_document import MageTabDocument
+from utils.vocabulary_snapshot import add_offline_argument, get_snapshot, start_offline_mode
+from validator import metadata_validation as mv
+from validator.file_verification import DEFAULT_WORKERS, create_checksum_cache
+from validator.json_schema_validation import validate_submission_json
+
+
+DEFAULT_PORT = 8642
+DEFAULT_QUEUE_SIZE = 16
+# Seconds and number of jobs after which the caches are saved
+DEFAULT_SAVE_INTERVAL = 60
+DEFAULT_SAVE_JOBS = 100
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default="127.0.0.1",
+                        help="Address to listen on (default is 127.0.0.1)")
+    parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT,
+                        help="Port to listen on (default is {})".format(DEFAULT_PORT))
+    parser.add_argument('-u', '--socket',
+                        help="Path of a Unix socket to listen on instead of a TCP port")
+    parser.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKERS,
+                        help="Number of jobs that are run at the same time (default is {})".format(DEFAULT_WORKERS))
+    parser.add_argument('-q', '--queue', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Number of jobs that can wait for a worker, further requests are rejected "
+                             "(default is {})".format(DEFAULT_QUEUE_SIZE))
+    parser.add_argument('--save_interval', type=float, default=DEFAULT_SAVE_INTERVAL,
+                        help="Seconds between saving the caches, 0 to only save after --save_jobs jobs and at "
+                             "shutdown (default is {})".format(DEFAULT_SAVE_INTERVAL))
+    parser.add_argument('--save_jobs', type=int, default=DEFAULT_SAVE_JOBS,
+                        help="Number of jobs after which the caches are saved, 0 to only save on the timer and at "
+                             "shutdown (default is {})".format(DEFAULT_SAVE_JOBS))
+    parser.add_argument('-v', '--verbose', action='store_const', const=10, default=20,
+                        help="Option to output detailed logging (debug level).")
+    add_offline_argument(parser)
+    args = parser.parse_args()
+
+    return args
+
+
+class ServiceBusy(Exception):
+    pass
+
+
+class JobLogHandler(logging.Handler):
+
+    def __init__(self):
+        """Handler that keeps the log messages of a job, to return them with the results."""
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append({"logger": record.name, "level": record.levelname, "message": record.getMessage()})
+
+
+def create_job_loggers(names, log_level=20):
+    """Return new loggers for a job, all writing to the same JobLogHandler.
+    The loggers are not registered with the logging module, so concurrent jobs don't share them."""
+    handler = JobLogHandler()
+    loggers = []
+    for name in names:
+        logger = logging.Logger(name, log_level)
+        logger.addHandler(handler)
+        loggers.append(logger)
+    return handler, loggers
+
+
+class ConversionService:
+
+    def __init__(self, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE, logger=None,
+                 save_interval=DEFAULT_SAVE_INTERVAL, save_jobs=DEFAULT_SAVE_JOBS):
+        """
+        Runs conversion and validation jobs with resources that are loaded once (warm).
+
+        :param workers: number of jobs that are run at the same time
+        :param queue_size: number of jobs that can wait for a worker
+        :param logger: log handler for the service messages
+        :param save_interval: seconds between saving the caches (0 to disable the timer)
+        :param save_jobs: number of jobs after which the caches are saved (0 to disable)
+        """
+        self.logger = logger or logging.getLogger()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.workers = workers
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.jobs = {"validate": self.validate, "mtab2usi": self.mtab2usi, "json2mtab": self.json2mtab}
+        # Warm resources
+        self.mapping = json2dm.load_mapping_config()
+        self.validation_cache = mv.create_validation_cache()
+        self.checksum_cache = create_checksum_cache()
+        self.converters = threading.local()
+        self.lock = threading.Lock()
+        self.counts = {"completed": 0, "failed": 0, "rejected": 0}
+        self.started = time.time()
+        # Jobs that have finished since the caches were saved
+        self.save_jobs = save_jobs
+        self.unsaved_jobs = 0
+        self.save_lock = threading.Lock()
+        self.stopped = threading.Event()
+        if save_interval:
+            threading.Thread(target=self.save_periodically, args=(save_interval,), daemon=True).start()
+
+    def submit(self, job_type, params):
+        """Run a job on the worker pool and return its result dictionary.
+        Raises ServiceBusy if all workers are busy and the queue is full."""
+        if job_type not in self.jobs:
+            raise KeyError(job_type)
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.counts["rejected"] += 1
+            raise ServiceBusy("All {} workers are busy and the queue is full.".format(self.workers))
+        try:
+            future = self.executor.submit(self.run_job, job_type, params)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda f: self.slots.release())
+        return future.result()
+
+    def run_job(self, job_type, params):
+        start = time.perf_counter()
+        log_handler, loggers = create_job_loggers(("Service", "MAGE-TAB", "Metadata"), params.get("log_level", 20))
+        result = {"job": job_type, "status": "completed"}
+        try:
+            result.update(self.jobs[job_type](params, *loggers))
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = "{}: {}".format(type(e).__name__, e)
+        result["elapsed"] = time.perf_counter() - start
+        result["log"] = log_handler.messages
+        with self.lock:
+            self.counts[result["status"]] += 1
+            self.unsaved_jobs += 1
+            save = self.save_jobs and self.unsaved_jobs >= self.save_jobs
+        self.logger.info("{} job {} in {:.3f} s".format(job_type, result["status"], result["elapsed"]))
+        if save:
+            self.save_caches()
+        return result
+
+    def validate(self, params, logger, mtab_logger, metadata_logger):
+        """Validation job, with the same options as magetab_validation.py (idf, data_dir, submission_type,
+        incremental, files, checksums, fastq, interned)."""
+        idf_file = params["idf"]
+        cache = self.validation_cache if params.get("incremental", True) else None
+        results = validate_magetab(idf_file, logger, mtab_logger, metadata_logger, data_dir=params.get("data_dir", ""),
+                                   submission_type=params.get("submission_type"), cache=cache,
+                                   check_files=params.get("files", False), checksums=params.get("checksums", False),
+                                   checksum_cache=self.checksum_cache, fastq_records=params.get("fastq"),
+                                   workers=params.get("jobs", 1), interned=params.get("interned", False))
+        return {"error_codes": results.unique_codes(), "results": [r.to_dict() for r in results]}
+
+    def mtab2usi(self, params, logger, *other_loggers):
+        """Conversion job from MAGE-TAB to USI-JSON, with the same options as mtab2usi_conversion.py
+        (idf, outdir, envelope, indent, compact, compression, interned)."""
+        idf_file = params["idf"]
+        outdir = params.get("outdir") or os.path.dirname(idf_file)
+        with MageTabDocument(idf_file, logger=logger, interned=params.get("interned", False)) as document:
+            sub = data_objects_from_magetab(idf_file, document.sdrf_file, document.submission_type, document)
+        datamodel2json_conversion(sub, outdir, logger, write_envelope=params.get("envelope", False),
+                                  indent=params.get("indent"), compact=params.get("compact", False),
+                                  compression=params.get("compression"))
+        return {"outdir": outdir}
+
+    def json2mtab(self, params, logger, *other_loggers):
+        """Conversion job from a USI-JSON envelope to MAGE-TAB, with the same options as json2mtab_conversion.py
+        (json, outdir, key, compression)."""
+        json_file = params["json"]
+        json_data = read_json_file(json_file)
+        json_errors = validate_submission_json(json_file, logger=logger, json_data=json_data)
+        sub = self.get_converter(params.get("key", "ae")).convert_submission(json_data, source_file_name=json_file)
+        write_magetab(sub, json_file, params.get("outdir"), logger, compression=params.get("compression"))
+        return {"json_errors": json_errors}
+
+    def get_converter(self, import_key):
+        """Return the JSON converter of the current worker thread, so that the compiled mapping plans are reused
+        (a converter keeps the pending look-ups of the submission it converts, so it is not shared)."""
+        converters = getattr(self.converters, "by_key", None)
+        if converters is None:
+            converters = self.converters.by_key = {}
+        if import_key not in converters:
+            converters[import_key] = json2dm.JSONConverter(self.mapping, import_key=import_key)
+        return converters[import_key]
+
+    def save_caches(self):
+        """Write new look-up results, validation results and file checksums to the cache files,
+        if any jobs have finished since they were last saved."""
+        with self.save_lock:
+            with self.lock:
+                if not self.unsaved_jobs:
+                    return
+                self.unsaved_jobs = 0
+            try:
+                self.validation_cache.save()
+                self.checksum_cache.save()
+                save_lookup_caches()
+            except Exception as e:
+                self.logger.error("Failed to save the caches: {}".format(e))
+
+    def save_periodically(self, interval):
+        """Save the caches every interval seconds until the service is shut down (run in a separate thread)."""
+        while not self.stopped.wait(interval):
+            self.save_caches()
+
+    def status(self):
+        with self.lock:
+            status = dict(self.counts)
+        status["uptime"] = time.time() - self.started
+        status["cached_validation_results"] = len(self.validation_cache.store)
+        status["cached_checksums"] = len(self.checksum_cache)
+        status["unsaved_jobs"] = self.unsaved_jobs
+        snapshot = get_snapshot()
+        status["offline_snapshot"] = snapshot.version if snapshot else None
+        return status
+
+    def shutdown(self):
+        self.stopped.set()
+        self.executor.shutdown(wait=True)
+        self.save_caches()
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/status":
+            self.send_json(200, self.server.service.status())
+        else:
+            self.send_json(404, {"error": "Unknown path {}".format(self.path)})
+
+    def do_POST(self):
+        job_type = self.path.strip("/")
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            params = json.loads(self.rfile.read(length).decode("utf-8") or "{}")
+            if not isinstance(params, dict):
+                raise ValueError("Expected a JSON object with the job parameters")
+        except ValueError as e:
+            self.send_json(400, {"error": "Invalid request: {}".format(e)})
+            return
+        try:
+            self.send_json(200, self.server.service.submit(job_type, params))
+        except KeyError:
+            self.send_json(404, {"error": "Unknown job type \"{}\"".format(job_type)})
+        except ServiceBusy as e:
+            self.send_json(503, {"error": str(e)})
+
+    def send_json(self, code, content):
+        body = json.dumps(content).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket connections don't have a client address
+        return self.client_address[0] if self.client_address else "local"
+
+    def log_message(self, format, *args):
+        self.server.service.logger.debug(format % args)
+
+
+class ServiceHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ServiceUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def create_server(service, host="127.0.0.1", port=DEFAULT_PORT, socket_path=None):
+    """Return the HTTP server for the service, listening on the TCP port or on the Unix socket if it is given."""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ServiceUnixServer(socket_path, ServiceRequestHandler)
+    else:
+        server = ServiceHTTPServer((host, port), ServiceRequestHandler)
+    server.service = service
+    return server
+
+
+def main():
+    process_name = "conversion_service"
+
+    args = parse_args()
+    logger = create_logger(".", process_name, "daemon", log_level=args.verbose, logger_name="Service")
+    start_offline_mode(args)
+
+    service = ConversionService(workers=args.workers, queue_size=args.queue, logger=logger,
+                                save_interval=args.save_interval, save_jobs=args.save_jobs)
+    server = create_server(service, args.host, args.port, args.socket)
+    logger.info("Listening on {} with {} workers".format(
+        args.socket or "http://{}:{}".format(args.host, args.port), args.workers))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down")
+    finally:
+        server.server_close()
+        service.shutdown()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,8 @@
 from collections import OrderedDict, defaultdict
 
 from datamodel.components import Attribute
-from utils.converter_utils import is_accession, get_efo_url, write_json_file, attrib2dict, get_controlled_vocabulary
+from utils.converter_utils import is_accession, get_efo_url, write_json_stream, attrib2dict, get_controlled_vocabulary
+from utils.profiling import timed
 
 
 def generate_usi_project_object(project):
@@ -266,39 +267,63 @@ def generate_usi_ref_object(alias, sub_info, accession=None):
     return ref_object
 
 
-def datamodel2json_conversion(submission, working_dir, logger, write_envelope=False):
+def generate_usi_submittables(submission):
+    """
+    Return the submittable types with the datamodel objects and the function that generates a USI object
+    from each of them. This allows generating the USI objects one by one while they are written out.
+
+    :param submission: object, Submission class object that holds metadata of the whole experiment
+    :return: ordered dictionary with the USI submittable type as key and a tuple of (objects, function) as value
+    """
+    sub_info = submission.info
+    submittables = OrderedDict([
+        ("projects", ([submission.project], generate_usi_project_object)),
+        ("studies", ([submission.study], lambda study: generate_usi_study_object(study, sub_info))),
+        ("protocols", (submission.protocol, generate_usi_protocol_object)),
+        ("samples", (submission.sample, generate_usi_sample_object)),
+        ("assays", (submission.assay, lambda assay: generate_usi_assay_object(assay, sub_info))),
+        ("assayData", (submission.assay_data, lambda ad: generate_usi_data_object(ad, sub_info)))
+    ])
+    # Analysis is optional
+    if submission.analysis:
+        submittables["analyses"] = (submission.analysis, lambda a: generate_usi_analysis_object(a, sub_info))
+    return submittables
+
+
+@timed()
+def datamodel2json_conversion(submission, working_dir, logger, write_envelope=False, indent=None, compact=False,
+                              compression=None):
     """
     Take metadata in common datamodel and write JSON files
 
+    The USI objects are generated and written one at a time (instead of building the complete JSON first),
+    so that the memory needed for the conversion does not grow with the size of the submission.
+
     :param submission: object, Submission class object that holds metadata of the whole experiment
     :param working_dir: string, directory to write files to
     :param logger: object, log handler
     :param write_envelope: boolean, flag to package objects into one submission envelope JSON file
+    :param indent: (optional) number of spaces to indent the JSON output
+    :param compact: boolean, flag to write the JSON without whitespace
+    :param compression: (optional) gzip, bz2 or zstd to write compressed JSON files
     :return: None
     """
 
-    # Dict to store USI objects to write to file:
-    envelope = {
-        "submission": {},
-        "projects": [generate_usi_project_object(submission.project)],
-        "studies": [generate_usi_study_object(submission.study, submission.info)],
-        "protocols": [generate_usi_protocol_object(p) for p in submission.protocol],
-        "samples": [generate_usi_sample_object(s) for s in submission.sample],
-        "assays": [generate_usi_assay_object(a, submission.info) for a in submission.assay],
-        "assayData": [generate_usi_data_object(ad, submission.info) for ad in submission.assay_data]
-    }
-    # Analysis is optional
-    if submission.analysis:
-        envelope["analyses"] = [generate_usi_analysis_object(a, submission.info) for a in submission.analysis]
+    submittables = generate_usi_submittables(submission)
 
     if not write_envelope:
         # Write individual JSON files
-        for submittable_type, objects in envelope.items():
+        for submittable_type, (objects, generate_object) in submittables.items():
             if objects:
                 logger.info("Writing JSON file for {} to {}.".format(submittable_type, working_dir))
-                write_json_file(working_dir, objects, submittable_type, submission.info)
+                write_json_stream(working_dir, (generate_object(o) for o in objects),
+                                  submittable_type, submission.info, indent=indent, compact=compact,
+                                  compression=compression)
     else:
         # Write submission envelope with all USI objects
+        envelope = OrderedDict([("submission", {})])
+        for submittable_type, (objects, generate_object) in submittables.items():
+            envelope[submittable_type] = (generate_object(o) for o in objects)
         logger.info("Writing JSON envelope file to {}.".format(working_dir))
-        write_json_file(working_dir, envelope, "envelope", submission.info)
-
+        write_json_stream(working_dir, envelope, "envelope", submission.info, indent=indent, compact=compact,
+                          compression=compression)
@@ -6,9 +6,12 @@ import re
 from collections import OrderedDict, defaultdict
 
 from utils.common_utils import get_ontology_source_file
+from utils.compression import compressed_file_name, open_file
 from utils.converter_utils import get_controlled_vocabulary, new_file_prefix, dict_to_vertical_table
+from utils.profiling import timed
 
 
+@timed()
 def generate_idf(sub):
     """Transform study/project/protocol metadata in data model to an IDF vertical table."""
 
@@ -79,6 +82,7 @@ def generate_idf(sub):
     return idf
 
 
+@timed()
 def generate_sdrf(sub):
     """Transform sample and file metadata in data model to an SDRF table."""
 
@@ -406,33 +410,38 @@ def column_name_to_magetab(header, sep="~~~"):
     return header_list[-1]
 
 
-def write_sdrf_file(pandas_table, new_file_name, logger):
+@timed()
+def write_sdrf_file(pandas_table, new_file_name, logger, compression=None):
     """Write out SDRF tab-delimited text file from merged pandas table
 
     :param pandas_table: pandas data frame containing unique column headers for each SDRF column
     :param new_file_name: file path to write SDRF
     :param logger: log for errors
+    :param compression: (optional) gzip, bz2 or zstd to write a compressed file (the extension is added)
     :return: None
 
     """
     logger.debug("Renaming unique column headers back to MAGE-TAB format.")
     pandas_table.rename(column_name_to_magetab, axis="columns", inplace=True)
 
+    new_file_name = compressed_file_name(new_file_name, compression)
     logger.debug("Writing new SDRF {}".format(new_file_name))
     try:
-        pandas_table.to_csv(new_file_name, sep='\t', encoding='utf-8', index=False)
+        with open_file(new_file_name, 'w', compression=compression, newline='') as sf:
+            pandas_table.to_csv(sf, sep='\t', index=False)
     except Exception as e:
         logger.error("Failed to write SDRF: {}".format(str(e)))
 
 
-def write_idf_file(idf, new_idf_file, logger):
+def write_idf_file(idf, new_idf_file, logger, compression=None):
     """Write out IDF tab-delimited text file from dictionary
 
     :param idf: dictionary with IDF fields as keys
     :param new_idf_file, file path to write IDF
     :param logger: log for errors
+    :param compression: (optional) gzip, bz2 or zstd to write a compressed file (the extension is added)
     """
-    return dict_to_vertical_table(idf, new_idf_file, logger)
+    return dict_to_vertical_table(idf, new_idf_file, logger, compression=compression)
 
 
 def get_term_sources(sub):
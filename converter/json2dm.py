@@ -1,6 +1,14 @@
 
+import json
+import math
+import multiprocessing
+import os
 import re
+import time
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pkg_resources
 
 from datamodel.submission import Submission
 from datamodel.sample import Sample
@@ -10,8 +18,153 @@ from datamodel.project import Project
 from datamodel.data import AssayData, Analysis
 from datamodel.assay import SeqAssay, SingleCellAssay, MicroarrayAssay
 from datamodel.components import Attribute, Unit
-from utils.converter_utils import guess_submission_type_from_study, get_term_from_url
-from utils.common_utils import get_ontology_from_term_url, get_term_parent
+from utils.converter_utils import guess_submission_type_from_study, get_term_from_url, ontology_term, read_json_file
+from utils.common_utils import get_ontology_from_term_url, get_term_parent, guess_ontology_from_term_url, \
+    resolve_term_url_ontologies
+from utils.lookup_cache import get_lookup_cache, save_lookup_caches
+from utils.profiling import timed
+
+
+# Maximum number of parallel requests for looking up unit types and term sources before the conversion
+PREFETCH_WORKERS = 8
+
+
+def get_unit_type_cache():
+    """Return the unit type cache that is shared by all converters in this process.
+    It is seeded with the unit types of common units from the bundled ontology terms file."""
+    return get_lookup_cache("unit_types", seed=ontology_term("unit_types"))
+
+
+def lookup_unit_type(unit_value):
+    """Look up a unit term in EFO and return the parent term as 'unit type', with "derived" removed from the label."""
+    parent = get_term_parent("efo", unit_value)
+    if parent:
+        return re.sub("\\s*derived\\s*", "", parent, 1)
+
+
+# The converter of a batch worker process, created once by _init_batch_worker
+_batch_converter = None
+
+
+def load_mapping_config():
+    """Read the mapping config (import instructions for each datamodel class) from the datamodel package."""
+    return json.loads(pkg_resources.resource_string('datamodel',
+                                                    os.path.join("config", "datamodel_mapping_config.json")))
+
+
+def convert_envelope_files(json_files, mapping, import_key="ae", workers=1, pre_check=None, handler=None):
+    """
+    Convert a collection of submission envelope files to Submission objects using a pool of worker processes.
+    Each worker keeps one JSONConverter, so that the compiled mapping plans are reused for all envelopes,
+    and the unit type and term source caches are shared between workers via the cache files.
+
+    Functions passed as pre_check and handler need to be defined at module level (they are sent to the workers).
+
+    :param json_files: list of paths to submission envelope JSON files
+    :param mapping: JSON schema object describing the import strategy for each element in the datamodel
+    :param import_key: the key to select the import strategy from the mapping file
+    :param workers: number of worker processes, with 1 the files are converted in the current process
+    :param pre_check: (optional) function that is called with the file path and the JSON content before the
+                      conversion, it should raise an exception if the file must not be converted
+    :param handler: (optional) function that is called with the Submission object and file path, e.g. to write output
+    :return: iterator of result dictionaries with file, status ("converted" or "failed"), latency (seconds) and error
+    """
+    tasks = [(json_file, pre_check, handler) for json_file in json_files]
+    if workers > 1:
+        with multiprocessing.Pool(workers, initializer=_init_batch_worker, initargs=(mapping, import_key)) as pool:
+            for result in pool.imap_unordered(_convert_envelope_task, tasks):
+                yield result
+    else:
+        _init_batch_worker(mapping, import_key)
+        for task in tasks:
+            yield _convert_envelope_task(task)
+
+
+def _init_batch_worker(mapping, import_key):
+    global _batch_converter
+    _batch_converter = JSONConverter(mapping, import_key=import_key)
+
+
+def _convert_envelope_task(task):
+    """Convert one envelope file with the converter of the worker and time it. Failures are recorded, not raised."""
+    json_file, pre_check, handler = task
+    result = {"file": json_file, "status": "converted", "latency": None, "error": None}
+    start = time.perf_counter()
+    try:
+        envelope_json = read_json_file(json_file)
+        if pre_check:
+            pre_check(json_file, envelope_json)
+        sub = _batch_converter.convert_submission(envelope_json, source_file_name=json_file)
+        if handler:
+            handler(sub, json_file)
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = "{}: {}".format(type(e).__name__, str(e))
+    result["latency"] = time.perf_counter() - start
+    return result
+
+
+def summarise_batch_results(results, percentiles=(50, 90, 95, 99)):
+    """
+    Summarise the results of convert_envelope_files.
+    :param results: list of result dictionaries
+    :param percentiles: the latency percentiles to report
+    :return: dictionary with the number of converted/failed envelopes, latency percentiles and failures
+    """
+    latencies = sorted(r["latency"] for r in results)
+    failures = [{"file": r["file"], "error": r["error"]} for r in results if r["status"] == "failed"]
+    latency_summary = OrderedDict()
+    if latencies:
+        for p in percentiles:
+            # Nearest-rank percentile
+            rank = int(math.ceil(p / 100.0 * len(latencies)))
+            latency_summary["p{}".format(p)] = latencies[max(rank - 1, 0)]
+        latency_summary["max"] = latencies[-1]
+        latency_summary["mean"] = sum(latencies) / len(latencies)
+    return OrderedDict([
+        ("envelopes", len(results)),
+        ("converted", len(results) - len(failures)),
+        ("failed", len(failures)),
+        ("latency_seconds", latency_summary),
+        ("failures", failures)
+    ])
+
+
+# Returned by compiled conversion functions if the attribute is not found in the submittable
+NO_VALUE = object()
+
+
+def compile_path(path):
+    """Return a function that finds the object in a JSON instance by traversing through the elements in the path.
+    A missing element on the way is treated as an empty object.
+    :param path: list of element names
+    :return: function taking a JSON instance
+    """
+    parents = tuple(path[:-1])
+    last = path[-1]
+    if not parents:
+        return lambda json_object: json_object.get(last)
+
+    def get_target(json_object):
+        for element in parents:
+            json_object = json_object.get(element, {})
+        return json_object.get(last)
+
+    return get_target
+
+
+def iter_envelope_attributes(envelope_json):
+    """Go through all submittables in the envelope and yield the USI-JSON attribute objects (value, units, terms)."""
+    for submittables in envelope_json.values():
+        if not isinstance(submittables, list):
+            continue
+        for submittable in submittables:
+            if not isinstance(submittable, dict):
+                continue
+            for attribute_list in submittable.get("attributes", {}).values():
+                for attribute in attribute_list:
+                    if isinstance(attribute, dict):
+                        yield attribute
 
 
 class JSONConverter:
@@ -31,8 +184,12 @@ class JSONConverter:
         """
         self.mapping = mapping
         self.import_key = import_key
-        self.unit_types = {}  # Will be used to store already discovered unit types
+        self.mapping_plans = {}  # Compiled conversion instructions by (submittable name, import key)
+        self.unit_types = get_unit_type_cache()  # Shared store of already discovered unit types
+        self.pending_unit_types = {}  # Unit type look-ups that have been started but not collected yet
+        self.pending_term_sources = None  # Batch look-up of the term sources of all term URLs in the envelope
 
+    @timed()
     def convert_submission(self, envelope_json, submission_type=None, source_file_name=None):
         """
         Converter that takes a JSON as input and converts it to a Submission class object
@@ -42,6 +199,11 @@ class JSONConverter:
         :param source_file_name: name of the original metadata file
         :return: Submission object
         """
+        # Start looking up the unit types and term sources in the background,
+        # while the other submittables are converted
+        self.prefetch_unit_types(envelope_json)
+        self.prefetch_term_sources(envelope_json)
+
         # We only take the first project in the list
         project_json = self.get_first_object_from_list(envelope_json.get("projects", []))
         project = Project(**self.convert_submittable(project_json, "project"))
@@ -90,56 +252,82 @@ class JSONConverter:
         }
 
         submission = Submission(sub_info, project, study, protocols, samples, assays, assay_data, analysis)
+
+        # Store new unit types and term sources for other converters/processes
+        save_lookup_caches()
+
         return submission
 
     def convert_submittable(self, submittable_object, submittable_name):
         """
         Use the mapping instructions and convert the different attributes accordingly.
+        The instructions are compiled once per submittable type (see get_mapping_plan).
         :param submittable_object: part of a JSON submission envelope containing the details for a single "submittable"
         :param submittable_name: name of the submittable as referenced in the mapping file
         :return: dictionary of the datamodel class attributes with the values to be inserted
         """
         submittable_attributes = OrderedDict()
 
-        # Go through attributes in the config
-        for attribute, attribute_info in self.mapping.get(submittable_name, {}).items():
-            # Get information how to convert
-            convert_function = None
-            mapping_info = attribute_info.get("import", {}).get(self.import_key, {})
-            path = mapping_info.get("path", [])
-            method = mapping_info.get("method", "")
-            translation = mapping_info.get("translation", {})
-            if method:
-                # Retrieve function by name
-                convert_function = getattr(self, method)
-            if path and convert_function:
-                # Find the target object in the input JSON using the directions in path
-                target_object = self.interpret_path(path, submittable_object)
-                # For lists
-                if isinstance(target_object, list):
-                    if attribute_info.get("type") in ("string", "attribute"):
-                        # Take the first entry
-                        submittable_attributes[attribute] = self.get_first_object_from_list(
-                            [convert_function(o, translation) for o in target_object])
-                    else:
-                        # Apply the conversion on each element of the list
-                        submittable_attributes[attribute] = [convert_function(o, translation) for o in target_object]
-                elif target_object:
-                    submittable_attributes[attribute] = convert_function(target_object, translation)
+        for attribute, convert in self.get_mapping_plan(submittable_name):
+            value = convert(submittable_object)
+            if value is not NO_VALUE:
+                submittable_attributes[attribute] = value
 
         return submittable_attributes
 
-    def interpret_path(self, path, json_object):
+    def get_mapping_plan(self, submittable_name):
+        """Return the compiled conversion plan for a submittable type, compiling it on first use.
+        The plan is a list of (attribute name, conversion function) tuples for all attributes
+        that have import instructions for the converter's import key."""
+        plan_key = (submittable_name, self.import_key)
+        if plan_key not in self.mapping_plans:
+            plan = []
+            for attribute, attribute_info in self.mapping.get(submittable_name, {}).items():
+                convert = self.compile_attribute(attribute_info)
+                if convert:
+                    plan.append((attribute, convert))
+            self.mapping_plans[plan_key] = plan
+        return self.mapping_plans[plan_key]
+
+    def compile_attribute(self, attribute_info):
         """
-        Return the object in the JSON reached by traversing through the elements in the path.
-        :param path: list of element names
-        :param json_object: JSON instance
-        :return: JSON object
+        Read the import instructions for one attribute from the mapping and return a function
+        that takes a submittable object and returns the converted value (or NO_VALUE if there is nothing to convert).
+        :param attribute_info: mapping entry of the attribute
+        :return: function or None if the attribute has no path or conversion method
         """
-        if len(path) == 1:
-            return json_object.get(path[0])
-        else:
-            return self.interpret_path(path[1:], json_object.get(path[0], {}))
+        # Get information how to convert
+        convert_function = None
+        mapping_info = attribute_info.get("import", {}).get(self.import_key, {})
+        path = mapping_info.get("path", [])
+        method = mapping_info.get("method", "")
+        translation = mapping_info.get("translation", {})
+        if method:
+            # Retrieve function by name
+            convert_function = getattr(self, method)
+        if not (path and convert_function):
+            return None
+
+        # Find the target object in the input JSON using the directions in path
+        get_target = compile_path(path)
+        take_first = attribute_info.get("type") in ("string", "attribute")
+
+        def convert(submittable_object):
+            target_object = get_target(submittable_object)
+            # For lists
+            if isinstance(target_object, list):
+                if take_first:
+                    # Take the first entry (or empty dict for empty lists)
+                    if target_object:
+                        return convert_function(target_object[0], translation)
+                    return {}
+                # Apply the conversion on each element of the list
+                return [convert_function(o, translation) for o in target_object]
+            elif target_object:
+                return convert_function(target_object, translation)
+            return NO_VALUE
+
+        return convert
 
     # The following are converting functions that do the conversion from JSON sub-elements
     # For each data object the function in the mapping file (under import > method) is called
@@ -172,7 +360,7 @@ class JSONConverter:
             # We only take the first term
             term = next(iter(terms))
             term_accession = get_term_from_url(term.get("url"))
-            term_source = get_ontology_from_term_url(term.get("url"))
+            term_source = self.get_term_source(term.get("url"))
         unit_value = element.get("units")
         if unit_value:
             # Generate unit type as this is not a field in USI's unit model, also remove "derived" from the label
@@ -190,14 +378,61 @@ class JSONConverter:
 
     def get_unit_type(self, unit_value):
         """Look up a unit term in EFO and return the parent term as 'unit type'.
-        Units which have already been looked up previously are stored in the converter's unit_types dictionary,
-        to reduce number of requests being made."""
-        if unit_value not in self.unit_types:
-            unit_type = re.sub("\\s*derived\\s*", "", get_term_parent("efo", unit_value), 1)
-            self.unit_types[unit_value] = unit_type
-            return unit_type
+        Units which have already been looked up previously are stored in the shared unit_types cache,
+        to reduce number of requests being made. If the look-up was started by prefetch_unit_types,
+        wait for its result instead of making a new request."""
+        if unit_value in self.unit_types:
+            return self.unit_types.get(unit_value)
+        future = self.pending_unit_types.pop(unit_value, None)
+        if future:
+            unit_type = future.result()
         else:
-            return self.unit_types[unit_value]
+            unit_type = lookup_unit_type(unit_value)
+        if unit_type:
+            self.unit_types.set(unit_value, unit_type)
+        return unit_type
+
+    def prefetch_unit_types(self, envelope_json):
+        """Collect the distinct unit values of all attributes in the envelope and start the look-up
+        of the ones that are not in the cache yet in a thread pool. The results are picked up by get_unit_type."""
+        units = {a.get("units") for a in iter_envelope_attributes(envelope_json)}
+        new_units = [u for u in units if u and u not in self.unit_types and u not in self.pending_unit_types]
+        if not new_units:
+            return
+        # Other processes may have looked them up in the meantime
+        self.unit_types.load()
+        new_units = [u for u in new_units if u not in self.unit_types]
+        if not new_units:
+            return
+        executor = ThreadPoolExecutor(max_workers=min(PREFETCH_WORKERS, len(new_units)))
+        for unit_value in new_units:
+            self.pending_unit_types[unit_value] = executor.submit(lookup_unit_type, unit_value)
+        # Don't wait here, the running look-ups still finish after shutdown
+        executor.shutdown(wait=False)
+
+    def get_term_source(self, term_url):
+        """Return the ontology of a term URL. If the URL can't be assigned by its namespace,
+        wait for the batch look-up started by prefetch_term_sources, which stores the results in the cache."""
+        if not term_url:
+            return None
+        ontology = guess_ontology_from_term_url(term_url)
+        if ontology:
+            return ontology
+        if self.pending_term_sources:
+            self.pending_term_sources.result()
+            self.pending_term_sources = None
+        return get_ontology_from_term_url(term_url)
+
+    def prefetch_term_sources(self, envelope_json):
+        """Collect the term URLs of all attributes in the envelope and start resolving their ontologies
+        as one batch in the background."""
+        term_urls = {t.get("url") for a in iter_envelope_attributes(envelope_json)
+                     for t in a.get("terms", []) if isinstance(t, dict)}
+        if not term_urls:
+            return
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.pending_term_sources = executor.submit(resolve_term_url_ontologies, term_urls, PREFETCH_WORKERS)
+        executor.shutdown(wait=False)
 
     @staticmethod
     def get_reference_value_from_json(element, translation={}):
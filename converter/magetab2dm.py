@@ -15,7 +15,10 @@ from datamodel.data import AssayData, Analysis
 from datamodel.assay import SeqAssay, SingleCellAssay, MicroarrayAssay
 from utils.common_utils import create_logger
 from utils.converter_utils import get_controlled_vocabulary, get_name, get_value, read_sdrf_file, read_idf_file, \
-    get_sdrf_path, strip_extension, guess_submission_type, is_accession, get_taxon, remove_duplicates
+    strip_extension, is_accession, get_taxon, remove_duplicates
+from utils.magetab_document import MageTabDocument
+from utils.profiling import timed
+from utils.sdrf_view import SDRFView
 
 
 def get_protocol_refs(sdrf_row, header_dict, node_map, node2_index):
@@ -93,7 +96,23 @@ def get_node_positions(nodes, header):
     return node_breakpoints
 
 
-def parse_sdrf(sdrf_file):
+def get_last_parsed_column(node_map, header_dict):
+    """Return the index of the last SDRF column that is read by parse_sdrf: the end of the last node,
+    or the last factor value (and its unit) or label column."""
+    last_column = 0
+    for node_ranges in node_map.values():
+        for node_range in node_ranges:
+            last_column = max([last_column, node_range[1] or 0] + node_range[2])
+    for field in ("factorvalue", "label"):
+        last_column = max([last_column] + header_dict.get(field, []))
+    for i in header_dict.get("factorvalue", []):
+        if i + 1 in header_dict.get("unit", []):
+            last_column = max(last_column, i + 1)
+    return last_column
+
+
+@timed()
+def parse_sdrf(sdrf_file, sdrf_table=None):
     """
     Read SDRF data table and return dictionaries for the different nodes
 
@@ -102,6 +121,7 @@ def parse_sdrf(sdrf_file):
     links to other nodes.
 
     :param sdrf_file: string, path to SDRF file
+    :param sdrf_table: (optional) the SDRF rows, header and header dictionary if the file has already been read
     """
     sample_nodes = ("sourcename",)
     le_nodes = ("labeledextractname",)
@@ -113,11 +133,17 @@ def parse_sdrf(sdrf_file):
     nodes = sample_nodes + extract_nodes + le_nodes + assay_nodes + raw_data_nodes + processed_data_nodes
 
     # Read in the file and get data (separated from header), the header row, and a breakdown of header nodes/attributes
-    sdrf_data, header, header_dict = read_sdrf_file(sdrf_file)
+    if sdrf_table is None:
+        sdrf_table = read_sdrf_file(sdrf_file)
+    sdrf_data, header, header_dict = sdrf_table
 
     # A map of the start, end and protocol refs of each node
     node_map = get_node_positions(nodes, header)
 
+    # With a (memory-mapped) SDRFView the rows only need to be split up to the last column that is parsed
+    if isinstance(sdrf_data, SDRFView):
+        sdrf_data = sdrf_data.rows(last_column=get_last_parsed_column(node_map, header_dict))
+
     samples = OrderedDict()
     extracts = OrderedDict()
     le = OrderedDict()
@@ -389,10 +415,13 @@ def parse_data_file_columns(data_nodes, header_dict, header, node_map, row, data
                         data_dict[file_name]["sample_ref"].append(sample_name)
 
 
-def parse_idf(idf_file):
-    """This parses the raw IDF dictionary and puts the fields and values into a sub-category dictionary."""
+@timed()
+def parse_idf(idf_file, idf_dict=None):
+    """This parses the raw IDF dictionary and puts the fields and values into a sub-category dictionary.
+    The IDF file is only read if the IDF dictionary is not given."""
 
-    idf_dict = read_idf_file(idf_file)
+    if idf_dict is None:
+        idf_dict = read_idf_file(idf_file)
 
     study_info = {
         "title": "",
@@ -495,26 +524,29 @@ def mtab2usi_conversion(idf_file_path):
     current_dir, idf_file_name = os.path.split(idf_file_path)
     logger = create_logger(current_dir, process_name, idf_file_name)
 
-    sdrf_file_path = get_sdrf_path(idf_file_path, logger)
-    submission_type, idf_data = guess_submission_type(idf_file_path, sdrf_file_path, logger)
-
-    sub = data_objects_from_magetab(idf_file_path, sdrf_file_path, submission_type)
+    with MageTabDocument(idf_file_path, logger=logger) as document:
+        sub = data_objects_from_magetab(idf_file_path, document.sdrf_file, document.submission_type, document)
 
     datamodel2json_conversion(sub, current_dir, logger)
 
 
-def data_objects_from_magetab(idf_file_path, sdrf_file_path, submission_type):
+@timed()
+def data_objects_from_magetab(idf_file_path, sdrf_file_path, submission_type, document=None):
     """
     Parse IDF/SDRF files and transform metadata to common datamodel
 
     :param idf_file_path: string, path to IDF file
     :param sdrf_file_path: string, path to SDRF file
     :param submission_type: string, microarray, sequencing or singlecell
+    :param document: (optional) MageTabDocument with the content of the files, if they have already been read
     :return: Submission class object
     """
 
-    study_info, protocols = parse_idf(idf_file_path)
-    samples, extracts, le, assays, raw_data, processed_data = parse_sdrf(sdrf_file_path)
+    if document is None:
+        with MageTabDocument(idf_file_path, sdrf_file_path) as document:
+            return data_objects_from_magetab(idf_file_path, sdrf_file_path, submission_type, document)
+    study_info, protocols = parse_idf(idf_file_path, document.idf_dict)
+    samples, extracts, le, assays, raw_data, processed_data = parse_sdrf(sdrf_file_path, document.sdrf_table)
 
     # For MAGE-TAB files we don't have USI submission info might need to store these somewhere once we get this
     idf_file_name = os.path.basename(idf_file_path)
@@ -6,84 +6,155 @@ and runs metadata conversion from USI-JSON to MAGE-TAB format.
 """
 
 import argparse
+import functools
 import json
+import logging
 import sys
 from os import path
 
-import pkg_resources
-
 from converter import json2dm, dm2magetab
 from validator.json_schema_validation import validate_submission_json
 from utils.common_utils import file_exists, create_logger
+from utils.compression import COMPRESSION_METHODS
+from utils.logging_utils import experiment_logger, start_async_logging, stop_async_logging
 from utils.converter_utils import read_json_file, dict_to_vertical_table, new_file_prefix
+from utils.profiling import add_profile_arguments, finish_profiling, start_profiling
+from utils.vocabulary_snapshot import add_offline_argument, start_offline_mode
 
 
 def parse_args():
     parser = argparse.ArgumentParser()
-    parser.add_argument('json',
-                        help="Path to the USI-JSON file")
+    parser.add_argument('json', nargs='+',
+                        help="Path to the USI-JSON file. If more than one file is given, "
+                             "the files are converted in batch mode.")
     parser.add_argument('-o', "--outdir",
                         help="Path where to write the MAGE-TAB files")
     parser.add_argument('-v', '--verbose', action='store_const', const=10, default=20,
                         help="Option to output detailed logging (debug level).")
     parser.add_argument('-k', '--key', default='ae',
                         help="The import key used to determine the conversion rules (default is 'ae')")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="Number of worker processes in batch mode (default is 1)")
+    parser.add_argument('-s', '--summary',
+                        help="Path of the summary file with latencies and failures in batch mode "
+                             "(default is json2mtab_summary.json in the output directory or current directory)")
+    parser.add_argument('-z', '--compression', choices=COMPRESSION_METHODS,
+                        help="Write compressed IDF and SDRF files with the given method")
+    add_profile_arguments(parser)
+    add_offline_argument(parser)
     args = parser.parse_args()
 
     return args
 
 
-def main():
-    process_name = "json2mtab"
+def write_magetab(sub, json_file, outdir=None, logger=None, compression=None):
+    """Generate IDF and SDRF from the submission object and write the files to the output directory
+    (default is the directory of the JSON file), optionally compressed."""
+
+    if not logger:
+        logger = logging.getLogger("Converter")
+
+    # Generate IDF dictionary
+    logger.debug("Generating IDF file")
+    idf = dm2magetab.generate_idf(sub)
+    # Generate SDRF: Output is a pandas dataframe
+    logger.debug("Generating SDRF file")
+    sdrf = dm2magetab.generate_sdrf(sub)
+
+    # New file paths
+    prefix = new_file_prefix(sub)
+    if not outdir:
+        outdir = path.dirname(json_file)
+    new_idf_file = path.join(outdir, prefix + ".idf.txt")
+    new_sdrf_file = path.join(outdir, prefix + ".sdrf.txt")
+
+    # Write out a new IDF file
+    dict_to_vertical_table(idf, new_idf_file, logger, compression=compression)
+
+    # Rename the columns to the new header list, created by applying a function
+    # to "de-uniquify" the header fields, and write new SDRF file
+    dm2magetab.write_sdrf_file(sdrf, new_sdrf_file, logger, compression=compression)
+
+
+def validate_json(json_file, json_data):
+    """Validate the submission JSON against the full ArrayExpress submission schema (used in batch mode)."""
+    logger = experiment_logger(logging.getLogger("JSON"), path.basename(json_file))
+    validate_submission_json(json_file, logger=logger, json_data=json_data)
 
-    args = parse_args()
-    json_file = args.json
+
+def convert_single_file(json_file, args):
+    process_name = "json2mtab"
 
     logger = create_logger(path.dirname(json_file), process_name, path.basename(json_file),
-                           logger_name="Converter")
+                           log_level=args.verbose, logger_name="Converter")
 
     # Exit if IDF file doesn't exist
     file_exists(json_file)
 
     # Create logger for JSON errors
     json_logger = create_logger(path.dirname(json_file), process_name, path.basename(json_file),
-                                logger_name="JSON")
-    # Validate the submission JSON against the full ArrayExpress submission schema
+                                log_level=args.verbose, logger_name="JSON")
+    # Read the JSON (once) and validate it against the full ArrayExpress submission schema
     try:
-        validate_submission_json(json_file, logger=json_logger)
+        json_data = read_json_file(json_file)
+        validate_submission_json(json_file, logger=json_logger, json_data=json_data)
     except Exception as e:
         logger.error("Cannot read or validate the JSON input\n{}".format(e))
         sys.exit()
 
-    json_data = read_json_file(json_file)
-
-    mapping = json.loads(pkg_resources.resource_string('datamodel',
-                                                            path.join("config", "datamodel_mapping_config.json")))
+    mapping = json2dm.load_mapping_config()
     ae_converter = json2dm.JSONConverter(mapping, import_key=args.key)
     sub = ae_converter.convert_submission(json_data, source_file_name=json_file)
 
-    # Generate IDF dictionary
-    logger.debug("Generating IDF file")
-    idf = dm2magetab.generate_idf(sub)
-    # Generate SDRF: Output is a pandas dataframe
-    logger.debug("Generating SDRF file")
-    sdrf = dm2magetab.generate_sdrf(sub)
+    write_magetab(sub, json_file, args.outdir, logger, compression=args.compression)
 
-    # New file paths
-    prefix = new_file_prefix(sub)
-    if args.outdir:
-        new_idf_file = path.join(args.outdir, prefix + ".idf.txt")
-        new_sdrf_file = path.join(args.outdir, prefix + ".sdrf.txt")
-    else:
-        new_idf_file = path.join(path.dirname(json_file), prefix + ".idf.txt")
-        new_sdrf_file = path.join(path.dirname(json_file), prefix + ".sdrf.txt")
 
-    # Write out a new IDF file
-    dict_to_vertical_table(idf, new_idf_file, logger)
+def convert_batch(json_files, args):
+    """Convert all envelope files with a pool of workers and write a summary file with latencies and failures."""
+    process_name = "json2mtab"
+    log_dir = args.outdir or "."
+
+    # The loggers are set up once here and used by all workers
+    logger = create_logger(log_dir, process_name, "batch", log_level=args.verbose, logger_name="Converter")
+    create_logger(log_dir, process_name, "batch", log_level=args.verbose, logger_name="JSON")
+    # Worker processes would inherit the queue but not the listener thread, so only log asynchronously
+    # when the files are converted in this process
+    if args.jobs <= 1:
+        start_async_logging()
+
+    for json_file in json_files:
+        file_exists(json_file)
+
+    mapping = json2dm.load_mapping_config()
+    handler = functools.partial(write_magetab, outdir=args.outdir, compression=args.compression)
+    results = []
+    for result in json2dm.convert_envelope_files(json_files, mapping, import_key=args.key, workers=args.jobs,
+                                                 pre_check=validate_json, handler=handler):
+        if result["status"] == "failed":
+            logger.error("Failed to convert {}: {}".format(result["file"], result["error"]))
+        else:
+            logger.info("Converted {} in {:.2f} s".format(result["file"], result["latency"]))
+        results.append(result)
+
+    summary = json2dm.summarise_batch_results(results)
+    summary_file = args.summary or path.join(log_dir, process_name + "_summary.json")
+    with open(summary_file, "w", encoding="utf-8") as sf:
+        json.dump(summary, sf, indent=2)
+    logger.info("Converted {} of {} envelopes. Summary written to {}".format(
+        summary["converted"], summary["envelopes"], summary_file))
+    stop_async_logging()
 
-    # Rename the columns to the new header list, created by applying a function
-    # to "de-uniquify" the header fields, and write new SDRF file
-    dm2magetab.write_sdrf_file(sdrf, new_sdrf_file, logger)
+
+def main():
+    args = parse_args()
+
+    start_offline_mode(args)
+    start_profiling(args)
+    if len(args.json) == 1:
+        convert_single_file(args.json[0], args)
+    else:
+        convert_batch(args.json, args)
+    finish_profiling(args)
 
 
 if __name__ == '__main__':
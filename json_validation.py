@@ -9,6 +9,8 @@ import argparse
 
 from validator.json_schema_validation import validate_submission_json
 from utils.common_utils import file_exists
+from utils.profiling import add_profile_arguments, finish_profiling, start_profiling
+from utils.vocabulary_snapshot import add_offline_argument, start_offline_mode
 
 
 def parse_args():
@@ -18,6 +20,8 @@ def parse_args():
     parser.add_argument('-s', '--schema',
                         help="Path to the JSON schema file")
 
+    add_profile_arguments(parser)
+    add_offline_argument(parser)
     args = parser.parse_args()
 
     return args
@@ -29,6 +33,8 @@ def main():
     json_file = args.json
     file_exists(json_file)
 
+    start_offline_mode(args)
+    start_profiling(args)
     try:
         if args.schema:
             schema_file = args.schema
@@ -40,6 +46,7 @@ def main():
             validate_submission_json(json_file)
     except Exception as e:
         print("ERROR: Cannot read or validate the JSON input\n{}".format(e))
+    finish_profiling(args)
 
 
 if __name__ == '__main__':
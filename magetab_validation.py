@@ -8,12 +8,17 @@ import argparse
 import os
 
 from utils.common_utils import create_logger, file_exists
-from utils.converter_utils import get_sdrf_path, guess_submission_type_from_sdrf, guess_submission_type_from_idf, \
-    read_sdrf_file, read_idf_file
+from utils.data_directory import DataDirectoryIndex
+from utils.magetab_document import MageTabDocument
+from utils.profiling import add_profile_arguments, finish_profiling, start_profiling
+from utils.vocabulary_snapshot import add_offline_argument, start_offline_mode
 from converter.magetab2dm import data_objects_from_magetab
 
 import validator.magetab_prevalidation as pre
 import validator.metadata_validation as mv
+from validator.fastq_inspection import DEFAULT_RECORDS
+from validator.file_verification import DEFAULT_WORKERS, create_checksum_cache
+from validator.validation_results import ValidationResults, LoggerSink, JSONLinesSink
 
 
 def parse_args():
@@ -24,6 +29,25 @@ def parse_args():
                         help="Path to the directory with SDRF and data files")
     parser.add_argument('-v', '--verbose', action='store_const', const=10, default=20,
                         help="Option to output detailed logging (debug level).")
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help="Only re-run the checks of objects that have changed since the last validation run "
+                             "(results are stored in the cache directory)")
+    parser.add_argument('-r', '--results',
+                        help="Path to a file to write the validation findings to (one JSON object per line)")
+    parser.add_argument('-f', '--files', action='store_true',
+                        help="Check that the data files named in the SDRF are in the data directory and not empty, "
+                             "and list files that are not named in the SDRF")
+    parser.add_argument('-c', '--checksums', action='store_true',
+                        help="Verify the data files in the data directory against the checksums given in the SDRF")
+    parser.add_argument('-fq', '--fastq', type=int, nargs='?', const=DEFAULT_RECORDS, metavar='N',
+                        help="Inspect the first N records (default {}) of the FASTQ files and compare read lengths "
+                             "and library layout with the assay attributes".format(DEFAULT_RECORDS))
+    parser.add_argument('--interned', action='store_true',
+                        help="Load the SDRF into a dictionary-encoded column store, which keeps each distinct "
+                             "cell value once (less memory for large SDRFs with repetitive columns)")
+    parser.add_argument('-j', '--jobs', type=int, default=DEFAULT_WORKERS,
+                        help="Number of data files to verify or inspect in parallel (default is {})".format(
+                            DEFAULT_WORKERS))
     group = parser.add_mutually_exclusive_group(required=False)
     group.add_argument('-sc', '--singlecell', action='store_const', const="singlecell", dest='submission_type',
                        help="Force submission type to be 'singlecell'")
@@ -32,72 +56,131 @@ def parse_args():
     group.add_argument('-ma', '--microarray', action='store_const', const="microarray", dest='submission_type',
                        help="Force submission type to be 'microarray'")
 
+    add_profile_arguments(parser)
+    add_offline_argument(parser)
     args = parser.parse_args()
 
     return args
 
 
+def validate_magetab(idf_file, logger, mtab_logger, metadata_logger, data_dir="", submission_type=None, cache=None,
+                     check_files=False, checksums=False, checksum_cache=None, fastq_records=None,
+                     workers=DEFAULT_WORKERS, interned=False):
+    """Run the MAGE-TAB prevalidation and the metadata checks of a submission.
+    The prevalidation findings are logged, the findings of the metadata checks are returned.
+
+    :param idf_file: string, path to the IDF file
+    :param logger: log handler for general messages
+    :param mtab_logger: log handler for the MAGE-TAB prevalidation
+    :param metadata_logger: log handler passed to the metadata checks (e.g. for remote look-ups)
+    :param data_dir: (optional) path to the directory with SDRF and data files
+    :param submission_type: (optional) microarray, sequencing or singlecell, detected from the files if not given
+    :param cache: (optional) ValidationCache for incremental validation
+    :param check_files: boolean, flag to check the data directory for missing, empty and unreferenced files
+    :param checksums: boolean, flag to verify the data files against their checksums
+    :param checksum_cache: (optional) cache of file digests (see file_verification.create_checksum_cache)
+    :param fastq_records: (optional) number of records to inspect in each FASTQ file
+    :param workers: number of data files to verify or inspect in parallel
+    :param interned: boolean, flag to load the SDRF into a dictionary-encoded column store
+    :return: ValidationResults object
+    """
+
+    # Read IDF/SDRF (once, the content is shared by prevalidation and conversion)
+    with MageTabDocument(idf_file, data_dir=data_dir, logger=logger, interned=interned) as document:
+
+        # Set submission type
+        if not submission_type:
+            submission_type = document.submission_type
+            logger.info("Detected submission type: {}".format(submission_type))
+        else:
+            logger.info("Setting submission type to \"{}\"".format(submission_type))
+
+        # Perform prevalidation checks on MAGE-TAB format
+        pre.idf_prevalidation(document.idf_dict, mtab_logger)
+        pre.sdrf_prevalidation(document.sdrf_data, document.header, document.header_dict, submission_type,
+                               mtab_logger)
+
+        # Convert MAGE-TAB to common data model
+        sub = data_objects_from_magetab(idf_file, document.sdrf_file, submission_type, document)
+
+    # Collect the findings of all checks
+    results = ValidationResults(metadata_logger)
+
+    # Validate metadata in common data model
+    mv.run_project_checks(sub, metadata_logger, cache, results)
+    mv.run_study_checks(sub, metadata_logger, cache, results)
+    mv.run_protocol_checks(sub, metadata_logger, cache, results)
+    mv.run_sample_checks(sub, metadata_logger, cache, results)
+    mv.run_assay_checks(sub, metadata_logger, cache, results)
+    mv.run_file_checks(sub, metadata_logger, cache, results)
+    if submission_type == "singlecell":
+        mv.run_singlecell_checks(sub, metadata_logger, cache, results)
+    # The data files are expected in the same directory as the SDRF
+    sdrf_dir, sdrf_file_name = os.path.split(document.sdrf_file)
+    sdrf_dir = sdrf_dir or "."
+    index = None
+    if check_files:
+        index = DataDirectoryIndex(sdrf_dir)
+        # The MAGE-TAB files and log files may be in the same directory
+        ignore = {sdrf_file_name, os.path.basename(idf_file)}.union(
+            name for name in index.files if name.endswith(".log"))
+        mv.run_data_directory_checks(sub, index, metadata_logger, ignore=ignore, results=results)
+    if checksums:
+        mv.run_checksum_checks(sub, sdrf_dir, metadata_logger, workers=workers, checksum_cache=checksum_cache,
+                               index=index, results=results)
+    if fastq_records:
+        mv.run_fastq_checks(sub, sdrf_dir, metadata_logger, max_records=fastq_records, workers=workers, index=index,
+                            results=results)
+
+    return results
+
+
 def main():
     process_name = "magetab_validation"
 
     args = parse_args()
-    idf_file, data_dir, logging_level = args.idf, args.data_dir, args.verbose
-    submission_type = args.submission_type
+    idf_file, logging_level = args.idf, args.verbose
 
     # Exit if IDF file doesn't exist
     file_exists(idf_file)
 
-    # Create logger
+    start_offline_mode(args)
+    start_profiling(args)
+
+    # Create loggers (different names to show different styling for prevalidation and metadata validation)
     current_dir, idf_file_name = os.path.split(idf_file)
     logger = create_logger(current_dir, process_name, idf_file_name, logger_name="Validation", log_level=logging_level)
-
-    # Get path to SDRF file
-    sdrf_file_path = get_sdrf_path(idf_file, logger, data_dir)
-
-    # Read IDF/SDRF and get submission type
-    idf_dict = read_idf_file(idf_file)
-    sdrf_data, header, header_dict = read_sdrf_file(sdrf_file_path)
-
-    # Set submission type
-    if not submission_type:
-        submission_type = guess_submission_type_from_sdrf(sdrf_data, header, header_dict)
-        if not submission_type:
-            submission_type = guess_submission_type_from_idf(idf_dict)
-        logger.info("Detected submission type: {}".format(submission_type))
-    else:
-        logger.info("Setting submission type to \"{}\"".format(submission_type))
-
-    # Logger for prevalidation (create new to show different styling)
     mtab_logger = create_logger(current_dir, process_name, idf_file_name, logger_name="MAGE-TAB", log_level=logging_level)
+    metadata_logger = create_logger(current_dir, process_name, idf_file_name, logger_name="Metadata", log_level=logging_level)
 
-    # Perform prevalidation checks on MAGE-TAB format
-    pre.idf_prevalidation(idf_dict, mtab_logger)
-    pre.sdrf_prevalidation(sdrf_data, header, header_dict, submission_type, mtab_logger)
-
-    # Read in MAGE-TAB and convert to common data model
-    sub = data_objects_from_magetab(idf_file, sdrf_file_path, submission_type)
+    # Results of previous runs for incremental validation
+    cache = mv.create_validation_cache() if args.incremental else None
+    checksum_cache = create_checksum_cache() if args.checksums else None
 
-    # Collect error codes
-    error_codes = []
+    results = validate_magetab(idf_file, logger, mtab_logger, metadata_logger, data_dir=args.data_dir,
+                               submission_type=args.submission_type, cache=cache, check_files=args.files,
+                               checksums=args.checksums, checksum_cache=checksum_cache, fastq_records=args.fastq,
+                               workers=args.jobs, interned=args.interned)
 
-    # Logger for metadata validation output
-    metadata_logger = create_logger(current_dir, process_name, idf_file_name, logger_name="Metadata", log_level=logging_level)
+    results.write(LoggerSink(metadata_logger))
+    if args.results:
+        with open(args.results, "w") as fh:
+            results.write(JSONLinesSink(fh))
 
-    # Validate metadata in common data model
-    error_codes.extend(mv.run_project_checks(sub, metadata_logger))
-    error_codes.extend(mv.run_study_checks(sub, metadata_logger))
-    error_codes.extend(mv.run_protocol_checks(sub, metadata_logger))
-    error_codes.extend(mv.run_sample_checks(sub, metadata_logger))
-    error_codes.extend(mv.run_assay_checks(sub, metadata_logger))
-    error_codes.extend(mv.run_file_checks(sub, metadata_logger))
-    if submission_type == "singlecell":
-        error_codes.extend(mv.run_singlecell_checks(sub, metadata_logger))
+    if cache is not None:
+        logger.debug("Reused {} of {} cached check results".format(cache.hits, cache.hits + cache.misses))
+        cache.save()
+    if checksum_cache is not None:
+        checksum_cache.save()
 
+    error_codes = results.unique_codes()
     if error_codes:
-        logger.info("Validation finished with the following error codes: \n{}".format("\n".join(set(error_codes))))
+        logger.info("Validation finished with the following error codes: \n{}".format("\n".join(error_codes)))
     else:
         logger.info("Validation was successful!")
 
+    finish_profiling(args)
+
 
 if __name__ == '__main__':
     main()
@@ -5,34 +5,89 @@ This script takes an IDF file as input and runs metadata conversion from MAGE-TA
 """
 
 import argparse
-from os.path import isdir, split
+import functools
+import json
+import logging
+from os.path import isdir, join, split
 
 from utils.common_utils import create_logger, file_exists
-from utils.converter_utils import get_sdrf_path, guess_submission_type
+from utils.compression import COMPRESSION_METHODS
+from utils.logging_utils import experiment_logger
+from utils.magetab_document import MageTabDocument
+from utils.pipeline import Pipeline, Stage
+from utils.profiling import add_profile_arguments, finish_profiling, start_profiling
+from utils.vocabulary_snapshot import add_offline_argument, start_offline_mode
+from converter import json2dm
 from converter.dm2json import datamodel2json_conversion
 from converter.magetab2dm import data_objects_from_magetab
+from validator import metadata_validation as mv
+from validator.validation_results import ValidationResults, LoggerSink
 
 
 def parse_args():
     parser = argparse.ArgumentParser()
-    parser.add_argument('idf',
-                        help="name of MAGE-TAB IDF file")
+    parser.add_argument('idf', nargs='+',
+                        help="name of MAGE-TAB IDF file. If more than one file is given, the files are converted "
+                             "in batch mode.")
     parser.add_argument('-o', '--outdir',
                         help="Path where to write the JSON file(s)")
     parser.add_argument('-e', '--envelope', action='store_true',
                         help="Option to output only one submission envelope type JSON file")
-
+    parser.add_argument('-i', '--indent', type=int,
+                        help="Number of spaces to indent the JSON output")
+    parser.add_argument('-c', '--compact', action='store_true',
+                        help="Option to write the JSON without any whitespace")
+    parser.add_argument('-z', '--compression', choices=COMPRESSION_METHODS,
+                        help="Write compressed JSON files with the given method")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="Number of worker processes reading the MAGE-TAB files in batch mode (default is 1)")
+    parser.add_argument('-w', '--writers', type=int, default=2,
+                        help="Number of threads writing JSON files in batch mode (default is 2)")
+    parser.add_argument('-V', '--validate', type=int, nargs='?', const=4, default=0, metavar='THREADS',
+                        help="Run the metadata checks on each experiment in batch mode, with the given number of "
+                             "threads (default is 4)")
+    parser.add_argument('-s', '--summary',
+                        help="Path of the summary file with latencies, failures and stage statistics in batch mode "
+                             "(default is mtab2usi_conversion_summary.json in the output directory or current "
+                             "directory)")
+    parser.add_argument('--interned', action='store_true',
+                        help="Load the SDRF into a dictionary-encoded column store, which keeps each distinct "
+                             "cell value once (less memory for large SDRFs with repetitive columns)")
+
+    add_profile_arguments(parser)
+    add_offline_argument(parser)
     args = parser.parse_args()
 
     return args
 
 
-def main():
-    process_name = "mtab2usi_conversion"
+def read_experiment(idf_file, interned=False):
+    """Read IDF and SDRF and convert the metadata to the common data model (parse stage in batch mode)."""
+    with MageTabDocument(idf_file, logger=logging.getLogger(), interned=interned) as document:
+        return data_objects_from_magetab(idf_file, document.sdrf_file, document.submission_type, document)
+
+
+def validate_experiment(sub, logger):
+    """Run the metadata checks and log the findings with the name of the experiment (validate stage)."""
+    results = ValidationResults(logger)
+    for run_checks in (mv.run_project_checks, mv.run_study_checks, mv.run_protocol_checks, mv.run_sample_checks,
+                       mv.run_assay_checks, mv.run_file_checks):
+        run_checks(sub, logger, results=results)
+    if sub.info.get("submission_type") == "singlecell":
+        mv.run_singlecell_checks(sub, logger, results=results)
+    results.write(LoggerSink(experiment_logger(logger, sub.info.get("alias"))))
+    return sub
+
+
+def write_experiment(sub, outdir, logger, args):
+    """Write the USI-JSON files of the experiment to the output directory or the directory of the IDF (write stage)."""
+    working_dir = outdir or split(sub.info["metadata"])[0]
+    datamodel2json_conversion(sub, working_dir, experiment_logger(logger, sub.info.get("alias")),
+                              write_envelope=args.envelope, indent=args.indent, compact=args.compact,
+                              compression=args.compression)
 
-    args = parse_args()
-    idf_file = args.idf
-    file_exists(idf_file)
+
+def convert_single_file(idf_file, args, process_name):
 
     # Output directory
     current_dir, idf_file_name = split(idf_file)
@@ -43,17 +98,66 @@ def main():
     # Create logger
     logger = create_logger(current_dir, process_name, idf_file_name)
 
-    # Get path to SDRF file
-    sdrf_file_path = get_sdrf_path(idf_file, logger)
-
-    # Get submission type
-    submission_type, idf_data = guess_submission_type(idf_file, sdrf_file_path, logger)
+    # Read IDF and SDRF (once) and get submission type
+    with MageTabDocument(idf_file, logger=logger, interned=args.interned) as document:
+        submission_type = document.submission_type
 
-    # Read in MAGE-TAB and convert to common data model
-    sub = data_objects_from_magetab(idf_file, sdrf_file_path, submission_type)
+        # Convert MAGE-TAB to common data model
+        sub = data_objects_from_magetab(idf_file, document.sdrf_file, submission_type, document)
 
     # Dump data in common data model as USI-JSON files
-    datamodel2json_conversion(sub, outdir, logger, write_envelope=args.envelope)
+    datamodel2json_conversion(sub, outdir, logger, write_envelope=args.envelope,
+                              indent=args.indent, compact=args.compact, compression=args.compression)
+
+
+def convert_batch(idf_files, args, process_name):
+    """Convert the experiments in a pipeline, so that reading, validating and writing of different experiments
+    overlap, and write a summary file with latencies, failures and statistics of the stages."""
+    outdir = args.outdir if args.outdir and isdir(args.outdir) else None
+    log_dir = outdir or "."
+    logger = create_logger(log_dir, process_name, "batch")
+
+    stages = [Stage("parse", functools.partial(read_experiment, interned=args.interned), workers=args.jobs,
+                    processes=args.jobs > 1)]
+    if args.validate:
+        stages.append(Stage("validate", functools.partial(validate_experiment, logger=logger), workers=args.validate))
+    stages.append(Stage("write", functools.partial(write_experiment, outdir=outdir, logger=logger, args=args),
+                        workers=args.writers))
+    pipeline = Pipeline(stages)
+
+    results = []
+    for result in pipeline.run(idf_files):
+        if result["status"] == "failed":
+            logger.error("Failed to convert {} in {} stage: {}".format(result["item"], result["stage"],
+                                                                      result["error"]))
+        else:
+            logger.info("Converted {} in {:.2f} s".format(result["item"], sum(result["seconds"].values())))
+        results.append({"file": result["item"], "status": "converted" if result["status"] == "completed" else "failed",
+                        "latency": sum(result["seconds"].values()), "error": result["error"]})
+
+    summary = json2dm.summarise_batch_results(results)
+    summary["stages"] = pipeline.stats()
+    summary_file = args.summary or join(log_dir, process_name + "_summary.json")
+    with open(summary_file, "w", encoding="utf-8") as sf:
+        json.dump(summary, sf, indent=2)
+    logger.info("Converted {} of {} experiments in {:.2f} s. Summary written to {}".format(
+        summary["converted"], len(results), pipeline.elapsed, summary_file))
+
+
+def main():
+    process_name = "mtab2usi_conversion"
+
+    args = parse_args()
+    for idf_file in args.idf:
+        file_exists(idf_file)
+
+    start_offline_mode(args)
+    start_profiling(args)
+    if len(args.idf) == 1:
+        convert_single_file(args.idf[0], args, process_name)
+    else:
+        convert_batch(args.idf, args, process_name)
+    finish_profiling(args)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,228 @@
+""" Script for benchmarking the conversion and validation steps on synthetic experiments of a given size and shape.
+
+For each shape (see tests/synthetic_experiments.py) the IDF, SDRF and submission envelope are generated and
+the following steps are run one after the other: parse_sdrf, data_objects_from_magetab, generate_sdrf,
+datamodel2json_conversion, JSONConverter.convert_submission, the MAGE-TAB prevalidation, the metadata checks
+and the JSON schema validation. The time and the peak of the Python heap (measured with tracemalloc, which
+also makes the steps slower) are recorded for each step. If a step fails, the steps that need its output
+are skipped.
+
+The metadata checks and the JSON conversion look up ontology terms, units and taxa remotely. The results of
+the look-ups are kept in the look-up cache, so the first run after the cache has been cleared is slower.
+For reproducible times, the responses can be recorded once and then replayed (see utils/http_transport.py), e.g.
+USI_AE_HTTP_MODE=record python tests/run_benchmark_suite.py -n 10
+USI_AE_HTTP_MODE=replay python tests/run_benchmark_suite.py -n 5000 -o baseline.json
+
+The results can be written to a baseline file and later runs compared with it, e.g.
+python tests/run_benchmark_suite.py -n 5000 -o baseline.json
+python tests/run_benchmark_suite.py -n 5000 -b baseline.json
+Steps that take longer or need more memory than the baseline by more than the tolerance (-t) are reported
+as regressions and the script exits with status 1.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from converter.dm2json import datamodel2json_conversion
+from converter.dm2magetab import generate_sdrf
+from converter.json2dm import JSONConverter, load_mapping_config
+from converter.magetab2dm import data_objects_from_magetab, parse_sdrf
+from tests.synthetic_experiments import SHAPES, SyntheticExperiment, write_envelope, write_magetab
+from utils.converter_utils import read_json_file
+from utils.magetab_document import MageTabDocument
+from validator import magetab_prevalidation as pre
+from validator import metadata_validation as mv
+from validator.json_schema_validation import validate_submission_json
+from validator.validation_results import ValidationResults
+
+
+DEFAULT_TOLERANCE = 0.2
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--shapes', nargs='+', choices=SHAPES, default=list(SHAPES),
+                        help="Shapes of the synthetic experiments (default is all)")
+    parser.add_argument('-n', '--samples', type=int, default=1000,
+                        help="Number of samples of each experiment (default is 1000)")
+    parser.add_argument('-c', '--characteristics', type=int,
+                        help="Number of extra sample characteristics (default depends on the shape)")
+    parser.add_argument('-p', '--processed', type=int,
+                        help="Number of processed files per assay (default depends on the shape)")
+    parser.add_argument('-k', '--key', default='ae',
+                        help="The import key used for the JSON conversion (default is 'ae')")
+    parser.add_argument('-o', '--output',
+                        help="Path to write the results to (JSON), e.g. to use as baseline for later runs")
+    parser.add_argument('-b', '--baseline',
+                        help="Path to the results of an earlier run to compare with")
+    parser.add_argument('-t', '--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Relative increase in time or memory over the baseline that is reported as regression "
+                             "(default is {})".format(DEFAULT_TOLERANCE))
+    parser.add_argument('--keep', action='store_true',
+                        help="Keep the generated files (the directory is printed)")
+
+    return parser.parse_args()
+
+
+def measure(function, *args):
+    """Run the function and return its result, the time in seconds and the peak heap size in bytes."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = function(*args)
+    finally:
+        duration = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, duration, peak
+
+
+def run_prevalidation(idf_file, submission_type, logger):
+    with MageTabDocument(idf_file, logger=logger) as document:
+        pre.idf_prevalidation(document.idf_dict, logger)
+        pre.sdrf_prevalidation(document.sdrf_data, document.header, document.header_dict, submission_type, logger)
+
+
+def run_metadata_checks(sub, submission_type, logger):
+    results = ValidationResults(logger)
+    for checks in (mv.run_project_checks, mv.run_study_checks, mv.run_protocol_checks, mv.run_sample_checks,
+                   mv.run_assay_checks, mv.run_file_checks):
+        checks(sub, logger, None, results)
+    if submission_type == "singlecell":
+        mv.run_singlecell_checks(sub, logger, None, results)
+    return results
+
+
+def benchmark_steps(experiment, wd, converter, logger):
+    """Return the steps of the benchmark as list of (name, function, names of the steps whose output it needs).
+    The functions take the outputs of the previous steps as a dictionary."""
+    idf_file = write_magetab(experiment, wd)
+    sdrf_file = os.path.join(wd, experiment.name + ".sdrf.txt")
+    json_file = write_envelope(experiment, wd)
+    json_dir = os.path.join(wd, "json")
+    os.makedirs(json_dir, exist_ok=True)
+    submission_type = experiment.submission_type
+
+    return [
+        ("parse_sdrf", lambda out: parse_sdrf(sdrf_file), ()),
+        ("data_objects_from_magetab",
+         lambda out: data_objects_from_magetab(idf_file, sdrf_file, submission_type), ()),
+        ("generate_sdrf", lambda out: generate_sdrf(out["data_objects_from_magetab"]),
+         ("data_objects_from_magetab",)),
+        ("datamodel2json_conversion",
+         lambda out: datamodel2json_conversion(out["data_objects_from_magetab"], json_dir, logger,
+                                               write_envelope=True),
+         ("data_objects_from_magetab",)),
+        ("convert_submission", lambda out: converter.convert_submission(read_json_file(json_file)), ()),
+        ("magetab_prevalidation", lambda out: run_prevalidation(idf_file, submission_type, logger), ()),
+        ("metadata_validation", lambda out: run_metadata_checks(out["data_objects_from_magetab"], submission_type,
+                                                                logger),
+         ("data_objects_from_magetab",)),
+        ("json_schema_validation", lambda out: validate_submission_json(json_file, logger=logger), ())
+    ]
+
+
+def run_benchmark(experiment, converter, logger, keep=False):
+    """Generate the files of the experiment, run all steps and return a list of result dictionaries."""
+    wd = tempfile.mkdtemp(prefix="{}_".format(experiment.name))
+    results = []
+    outputs = {}
+    try:
+        steps = benchmark_steps(experiment, wd, converter, logger)
+        sdrf_size = os.path.getsize(os.path.join(wd, experiment.name + ".sdrf.txt"))
+        for name, function, requires in steps:
+            result = OrderedDict([("shape", experiment.shape), ("step", name), ("status", "completed"),
+                                  ("seconds", None), ("peak_bytes", None), ("error", None)])
+            missing = [r for r in requires if r not in outputs]
+            if missing:
+                result["status"] = "skipped"
+                result["error"] = "Needs the output of {}".format(", ".join(missing))
+            else:
+                try:
+                    outputs[name], result["seconds"], result["peak_bytes"] = measure(function, outputs)
+                except Exception as e:
+                    result["status"] = "failed"
+                    result["error"] = "{}: {}".format(type(e).__name__, e)
+            results.append(result)
+            print_result(result, sdrf_size)
+    finally:
+        if keep:
+            print("Files of {} kept in {}".format(experiment.name, wd))
+        else:
+            shutil.rmtree(wd)
+    return results
+
+
+def print_result(result, sdrf_size):
+    if result["status"] == "completed":
+        print("{:<12} {:<28} {:>9.3f} {:>10.1f} {:>8.2f}".format(
+            result["shape"], result["step"], result["seconds"], result["peak_bytes"] / 1e6,
+            result["peak_bytes"] / sdrf_size))
+    else:
+        print("{:<12} {:<28} {} ({})".format(result["shape"], result["step"], result["status"], result["error"]))
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Print the change in time and memory of each step relative to the baseline results.
+    Return the number of steps that are slower or need more memory than the tolerance allows."""
+    baseline_results = {(r["shape"], r["step"]): r for r in baseline["results"]}
+    regressions = 0
+    print("\nComparison with baseline from {}".format(baseline.get("date", "unknown date")))
+    print("{:<12} {:<28} {:>10} {:>10}".format("shape", "step", "time", "memory"))
+    for result in results:
+        base = baseline_results.get((result["shape"], result["step"]))
+        if not base or result["status"] != "completed" or base["status"] != "completed":
+            continue
+        time_ratio = result["seconds"] / base["seconds"] if base["seconds"] else 1.0
+        memory_ratio = result["peak_bytes"] / base["peak_bytes"] if base["peak_bytes"] else 1.0
+        regression = time_ratio > 1 + tolerance or memory_ratio > 1 + tolerance
+        regressions += regression
+        print("{:<12} {:<28} {:>+9.0%} {:>+9.0%}{}".format(result["shape"], result["step"], time_ratio - 1,
+                                                         memory_ratio - 1, "  regression" if regression else ""))
+    return regressions
+
+
+def main():
+    args = parse_args()
+
+    # The log messages of the steps (e.g. validation errors of the synthetic data) are not of interest here
+    logger = logging.getLogger("Benchmark")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    converter = JSONConverter(load_mapping_config(), import_key=args.key)
+
+    print("{:<12} {:<28} {:>9} {:>10} {:>8}".format("shape", "step", "time (s)", "peak (MB)", "x SDRF"))
+    results = []
+    for shape in args.shapes:
+        experiment = SyntheticExperiment(shape, samples=args.samples, characteristics=args.characteristics,
+                                         processed_files=args.processed)
+        results.extend(run_benchmark(experiment, converter, logger, keep=args.keep))
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(OrderedDict([("date", time.strftime("%Y-%m-%d %H:%M:%S")),
+                                   ("python", platform.python_version()),
+                                   ("parameters", {"samples": args.samples, "characteristics": args.characteristics,
+                                                   "processed": args.processed, "key": args.key}),
+                                   ("results", results)]), fh, indent=2)
+
+    if args.baseline:
+        baseline = read_json_file(args.baseline)
+        if baseline.get("parameters", {}).get("samples") != args.samples:
+            print("Warning: the baseline was run with {} samples.".format(baseline.get("parameters", {}).get(
+                "samples")))
+        if compare_with_baseline(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+""" Script for benchmarking reading compressed SDRF files directly against decompressing them to a temporary file first.
+
+A synthetic SDRF with the requested number of rows is written compressed with every available method.
+For each method the time, the throughput (uncompressed MB/s) and the bytes read and written by the process
+are reported for both workflows. The I/O counters are taken from /proc/self/io and are only available on Linux.
+
+Optional parameter is the number of SDRF rows (-n), e.g.
+python tests/run_compression_benchmark.py -n 200000
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from utils.compression import COMPRESSION_METHODS, compressed_file_name, open_file, zstandard
+from utils.converter_utils import read_sdrf_file
+
+
+SDRF_HEADER = ["Source Name", "Characteristics[organism]", "Characteristics[organism part]", "Characteristics[age]",
+               "Unit[time unit]", "Protocol REF", "Extract Name", "Comment[LIBRARY_LAYOUT]", "Protocol REF",
+               "Assay Name", "Technology Type", "Comment[read1 file]", "Comment[read2 file]", "Factor Value[age]"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--rows', type=int, default=100000,
+                        help="Number of rows in the synthetic SDRF (default is 100000)")
+
+    return parser.parse_args()
+
+
+def write_synthetic_sdrf(file_name, rows):
+    with open(file_name, "w", encoding="utf-8") as fh:
+        fh.write("\t".join(SDRF_HEADER) + "\n")
+        for i in range(rows):
+            fh.write("\t".join([
+                "sample {}".format(i), "Mus musculus", "liver", str(i % 20), "week", "P-BENCH-1",
+                "extract {}".format(i), "PAIRED", "P-BENCH-2", "assay {}".format(i), "sequencing assay",
+                "run_{}_1.fastq.gz".format(i), "run_{}_2.fastq.gz".format(i), str(i % 20)]) + "\n")
+
+
+def io_counters():
+    """Return the number of bytes read and written by this process (or None if not available)."""
+    try:
+        with open("/proc/self/io") as fh:
+            counters = dict(line.split(": ") for line in fh.read().splitlines())
+        return int(counters["rchar"]), int(counters["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def measure(function, *args):
+    """Run the function and return the time in seconds and the bytes read and written."""
+    counters_before = io_counters()
+    start = time.perf_counter()
+    function(*args)
+    duration = time.perf_counter() - start
+    counters_after = io_counters()
+    if counters_before and counters_after:
+        return duration, counters_after[0] - counters_before[0], counters_after[1] - counters_before[1]
+    return duration, None, None
+
+
+def decompress_first(compressed_file, wd):
+    temp_file = os.path.join(wd, "decompressed.sdrf.txt")
+    with open_file(compressed_file, "rb") as fi, open(temp_file, "wb") as fo:
+        shutil.copyfileobj(fi, fo)
+    read_sdrf_file(temp_file)
+    os.remove(temp_file)
+
+
+def format_bytes(number):
+    return "{:.1f}".format(number / 1e6) if number is not None else "n/a"
+
+
+def main():
+    args = parse_args()
+
+    wd = tempfile.mkdtemp()
+    plain_file = os.path.join(wd, "benchmark.sdrf.txt")
+    write_synthetic_sdrf(plain_file, args.rows)
+    size = os.path.getsize(plain_file)
+    print("SDRF with {} rows ({:.1f} MB uncompressed)".format(args.rows, size / 1e6))
+    print("{:<6} {:<18} {:>10} {:>8} {:>10} {:>9} {:>12}".format(
+        "method", "workflow", "size (MB)", "time (s)", "MB/s", "read (MB)", "written (MB)"))
+
+    for method in COMPRESSION_METHODS:
+        if method == "zstd" and zstandard is None:
+            continue
+        compressed_file = compressed_file_name(plain_file, method)
+        with open(plain_file, "rb") as fi, open_file(compressed_file, "wb", compression=method) as fo:
+            shutil.copyfileobj(fi, fo)
+        for workflow, function, function_args in (
+                ("decompress first", decompress_first, (compressed_file, wd)),
+                ("direct", read_sdrf_file, (compressed_file,))):
+            duration, read_bytes, written_bytes = measure(function, *function_args)
+            print("{:<6} {:<18} {:>10.1f} {:>8.2f} {:>10.1f} {:>9} {:>12}".format(
+                method, workflow, os.path.getsize(compressed_file) / 1e6, duration, size / 1e6 / duration,
+                format_bytes(read_bytes), format_bytes(written_bytes)))
+
+    shutil.rmtree(wd)
+
+
+if __name__ == '__main__':
+    main()
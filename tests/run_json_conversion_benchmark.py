@@ -0,0 +1,76 @@
+""" Script for benchmarking the mapping guided USI-JSON to data model conversion.
+
+The samples of a submission envelope are multiplied to the requested number and converted with the compiled
+mapping plans of the JSONConverter. For comparison, the same samples are converted with the plan being
+recompiled for every object, which corresponds to reading the mapping instructions again for each object.
+
+Mandatory input is the path to a submission envelope JSON file, e.g.
+python tests/run_json_conversion_benchmark.py tests/test_data/submission_envelope/dummy_sequencing_submission_envelope.json
+Optional parameters are the number of samples (-n) and the import key (-k).
+"""
+
+import argparse
+import time
+
+from converter.json2dm import JSONConverter, load_mapping_config
+from utils.common_utils import file_exists
+from utils.converter_utils import read_json_file
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('json',
+                        help="Path to the submission envelope JSON file")
+    parser.add_argument('-n', '--samples', type=int, default=100000,
+                        help="Number of samples to convert (default is 100000)")
+    parser.add_argument('-k', '--key', default='ae',
+                        help="The import key used to determine the conversion rules (default is 'ae')")
+
+    return parser.parse_args()
+
+
+def scale_samples(envelope_json, number):
+    """Return a list with the given number of samples, made by copying the samples of the envelope with new aliases."""
+    samples = envelope_json.get("samples", [])
+    if not samples:
+        raise Exception("The envelope has no samples to multiply.")
+    return [dict(samples[i % len(samples)], alias="sample_{}".format(i)) for i in range(number)]
+
+
+def time_conversion(converter, samples, recompile=False):
+    """Convert all samples and return the time it took in seconds."""
+    start = time.perf_counter()
+    for s in samples:
+        if recompile:
+            converter.mapping_plans.clear()
+        converter.convert_submittable(s, "sample")
+    return time.perf_counter() - start
+
+
+def main():
+    args = parse_args()
+
+    json_file = args.json
+    file_exists(json_file)
+
+    envelope_json = read_json_file(json_file)
+    mapping = load_mapping_config()
+    converter = JSONConverter(mapping, import_key=args.key)
+    samples = scale_samples(envelope_json, args.samples)
+
+    # Resolve units and ontology terms before timing, so that only the conversion itself is measured
+    converter.prefetch_unit_types(envelope_json)
+    converter.prefetch_term_sources(envelope_json)
+    converter.convert_submittable(samples[0], "sample")
+
+    recompiled = time_conversion(converter, samples, recompile=True)
+    compiled = time_conversion(converter, samples)
+
+    print("Converted {} samples".format(len(samples)))
+    print("Mapping read per object: {:.2f} s ({:.0f} samples/s)".format(recompiled, len(samples) / recompiled))
+    print("Compiled mapping plan:   {:.2f} s ({:.0f} samples/s)".format(compiled, len(samples) / compiled))
+    print("Speed-up: {:.2f}x".format(recompiled / compiled))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+""" Script for benchmarking writing and reading USI-JSON submission envelopes with the available JSON libraries.
+
+A synthetic envelope with the requested number of samples (and one assay and one assay data object per sample)
+is written with write_json_file and read back with read_json_file, for every installed JSON backend.
+The backends only differ in writing with -c, other output is always written by the standard library.
+
+Optional parameters are the number of samples (-n), the number of repeats (-r) and the output format (-i/-c), e.g.
+python tests/run_json_roundtrip_benchmark.py -n 50000 -c
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from collections import OrderedDict
+
+from utils.converter_utils import read_json_file, write_json_file, usi_object_file_name
+from utils.json_backend import available_backends, set_json_backend
+
+
+SUB_INFO = {"alias": "E-BENCH-1", "team": "my-super-test-team"}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--samples', type=int, default=10000,
+                        help="Number of samples in the synthetic envelope (default is 10000)")
+    parser.add_argument('-r', '--repeats', type=int, default=3,
+                        help="Number of times to repeat the round-trip, the fastest time is reported (default is 3)")
+    parser.add_argument('-i', '--indent', type=int,
+                        help="Number of spaces to indent the JSON output")
+    parser.add_argument('-c', '--compact', action='store_true',
+                        help="Write the JSON without any whitespace")
+
+    return parser.parse_args()
+
+
+def attribute(value, units=None, term=None):
+    entry = OrderedDict([("value", value)])
+    if units:
+        entry["units"] = units
+    if term:
+        entry["terms"] = [{"url": term}]
+    return [entry]
+
+
+def ref(alias):
+    return {"alias": alias, "team": SUB_INFO["team"]}
+
+
+def synthetic_envelope(number):
+    """Return a submission envelope with the given number of samples, assays and assay data objects."""
+    samples, assays, assay_data = [], [], []
+    for i in range(number):
+        samples.append(OrderedDict([
+            ("alias", "sample_{}".format(i)),
+            ("taxon", "Mus musculus"),
+            ("taxonId", 10090),
+            ("attributes", OrderedDict([
+                ("organism", attribute("Mus musculus", term="http://purl.obolibrary.org/obo/NCBITaxon_10090")),
+                ("age", attribute(str(i % 20), units="week")),
+                ("genotype", attribute("wild type genotype", term="http://www.ebi.ac.uk/efo/EFO_0005168")),
+                ("organism part", attribute("liver")),
+                ("material_type", attribute("organism part"))
+            ]))
+        ]))
+        assays.append(OrderedDict([
+            ("alias", "assay_{}".format(i)),
+            ("attributes", OrderedDict([("library_layout", attribute("PAIRED")),
+                                        ("library_source", attribute("TRANSCRIPTOMIC"))])),
+            ("studyRef", ref(SUB_INFO["alias"])),
+            ("sampleUses", [{"sampleRef": ref("sample_{}".format(i))}]),
+            ("protocolUses", [{"protocolRef": ref("P-BENCH-{}".format(p))} for p in range(1, 4)])
+        ]))
+        assay_data.append(OrderedDict([
+            ("alias", "run_{}".format(i)),
+            ("files", [OrderedDict([("name", "run_{}_{}.fastq.gz".format(i, r)), ("type", "fastq"),
+                                    ("checksum", "{:032x}".format(i * 2 + r)), ("checksum_method", "MD5")])
+                       for r in (1, 2)]),
+            ("assayRefs", [ref("assay_{}".format(i))]),
+            ("attributes", OrderedDict([("data_type", attribute("raw"))]))
+        ]))
+    return OrderedDict([("submission", {}), ("samples", samples), ("assays", assays), ("assayData", assay_data)])
+
+
+def time_round_trip(envelope, wd, repeats, indent=None, compact=False):
+    """Write and read the envelope and return the fastest write and read times in seconds and the file size."""
+    json_file = os.path.join(wd, usi_object_file_name("envelope", SUB_INFO))
+    write_times, read_times = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        write_json_file(wd, envelope, "envelope", SUB_INFO, indent=indent, compact=compact)
+        write_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        read_json_file(json_file)
+        read_times.append(time.perf_counter() - start)
+    return min(write_times), min(read_times), os.path.getsize(json_file)
+
+
+def main():
+    args = parse_args()
+
+    envelope = synthetic_envelope(args.samples)
+    wd = tempfile.mkdtemp()
+
+    print("Round-trip of an envelope with {} samples".format(args.samples))
+    print("{:<8} {:>10} {:>10} {:>12}".format("backend", "write (s)", "read (s)", "size (MB)"))
+    for backend in available_backends():
+        set_json_backend(backend)
+        write_time, read_time, size = time_round_trip(envelope, wd, args.repeats, args.indent, args.compact)
+        print("{:<8} {:>10.3f} {:>10.3f} {:>12.1f}".format(backend, write_time, read_time, size / 1e6))
+
+
+if __name__ == '__main__':
+    main()
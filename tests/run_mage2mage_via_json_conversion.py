@@ -7,18 +7,15 @@ Optional parameters are the output directory (-o) and verbose logging (-v).
 """
 
 import argparse
-import json
 import os
 
-import pkg_resources
-
 import validator.metadata_validation as mv
 
 from converter.dm2json import datamodel2json_conversion
-from converter.json2dm import JSONConverter
+from converter.json2dm import JSONConverter, load_mapping_config
 from utils.common_utils import create_logger, file_exists, dir_exists
-from utils.converter_utils import get_sdrf_path, guess_submission_type, read_json_file, usi_object_file_name, \
-    dict_to_vertical_table
+from utils.converter_utils import read_json_file, usi_object_file_name, dict_to_vertical_table
+from utils.magetab_document import MageTabDocument
 from converter.magetab2dm import data_objects_from_magetab
 from converter.dm2magetab import generate_idf, generate_sdrf, write_sdrf_file
 
@@ -63,14 +60,13 @@ def main():
                            log_level=args.verbose, logger_name="MAGE-to-MAGE")
     logger.info("New Experiment: {}".format(idf_file_name))
 
-    # Get path to SDRF file
-    sdrf_file_path = get_sdrf_path(idf_file, logger)
-
-    # Get correct submission type
-    sub_type, idf_dict = guess_submission_type(idf_file, sdrf_file_path, logger)
+    # Read IDF/SDRF and get correct submission type
+    with MageTabDocument(idf_file, logger=logger) as document:
+        sdrf_file_path = document.sdrf_file
+        sub_type = document.submission_type
 
-    # Read in MAGE-TAB and convert to common data model
-    sub = data_objects_from_magetab(idf_file, sdrf_file_path, sub_type)
+        # Convert MAGE-TAB to common data model
+        sub = data_objects_from_magetab(idf_file, sdrf_file_path, sub_type, document)
 
     # Run metadata validation in data model
     error_codes = []
@@ -92,8 +88,7 @@ def main():
     json_data = read_json_file(json_file)
 
     # Convert from JSON to data model
-    mapping = json.loads(pkg_resources.resource_string('datamodel',
-                                                       os.path.join("config", "datamodel_mapping_config.json")))
+    mapping = load_mapping_config()
     ae_converter = JSONConverter(mapping, import_key=args.key)
     sub2 = ae_converter.convert_submission(json_data, source_file_name=json_file)
 
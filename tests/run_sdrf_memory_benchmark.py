@@ -0,0 +1,89 @@
+""" Script for benchmarking the memory needed to read an SDRF file.
+
+A synthetic SDRF with the requested number of rows is read with read_sdrf_file (all cells split into strings),
+with the memory-mapped SDRFView and into the dictionary-encoded SDRFColumnStore. The peak of the Python heap
+and the memory retained by the result (measured with tracemalloc) are reported relative to the file size.
+The mapped file itself is not part of the Python heap, it is paged in by the operating system as needed.
+
+Optional parameter is the number of SDRF rows (-n), e.g.
+python tests/run_sdrf_memory_benchmark.py -n 1000000
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from tests.run_compression_benchmark import write_synthetic_sdrf
+from utils.converter_utils import read_sdrf_file
+from utils.sdrf_columns import read_sdrf_columns
+from utils.sdrf_view import SDRFView
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--rows', type=int, default=200000,
+                        help="Number of rows in the synthetic SDRF (default is 200000)")
+
+    return parser.parse_args()
+
+
+def read_full(sdrf_file):
+    return read_sdrf_file(sdrf_file)
+
+
+def read_view_column(sdrf_file):
+    """Read one column (as the prevalidation does) from the view."""
+    with SDRFView(sdrf_file) as view:
+        return view.column(view.header_dict["sourcename"][0])
+
+
+def read_view_rows(sdrf_file):
+    """Go through all rows of the view (as parse_sdrf does), keeping only one row at a time."""
+    with SDRFView(sdrf_file) as view:
+        return sum(1 for _ in view)
+
+
+def read_columns(sdrf_file):
+    return read_sdrf_columns(sdrf_file)
+
+
+def measure(function, *args):
+    """Run the function and return the time in seconds, the peak heap size and the heap size
+    retained by the result in bytes."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args)
+    duration = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    del result
+    tracemalloc.stop()
+    return duration, peak, retained
+
+
+def main():
+    args = parse_args()
+
+    wd = tempfile.mkdtemp()
+    sdrf_file = os.path.join(wd, "benchmark.sdrf.txt")
+    write_synthetic_sdrf(sdrf_file, args.rows)
+    size = os.path.getsize(sdrf_file)
+    print("SDRF with {} rows ({:.1f} MB)".format(args.rows, size / 1e6))
+    print("{:<24} {:>8} {:>10} {:>8} {:>14} {:>8}".format(
+        "reader", "time (s)", "peak (MB)", "x size", "retained (MB)", "x size"))
+
+    for name, function in (("read_sdrf_file", read_full),
+                           ("SDRFView, one column", read_view_column),
+                           ("SDRFView, all rows", read_view_rows),
+                           ("SDRFColumnStore", read_columns)):
+        duration, peak, retained = measure(function, sdrf_file)
+        print("{:<24} {:>8.2f} {:>10.1f} {:>8.2f} {:>14.1f} {:>8.2f}".format(
+            name, duration, peak / 1e6, peak / size, retained / 1e6, retained / size))
+
+    shutil.rmtree(wd)
+
+
+if __name__ == '__main__':
+    main()
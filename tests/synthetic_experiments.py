@@ -0,0 +1,355 @@
+""" Module for generating synthetic experiments of a given size and shape for benchmarks.
+
+Each shape is written as MAGE-TAB (IDF and SDRF) and as a USI-JSON submission envelope with the same samples,
+assays and files:
+- microarray: two-colour microarray, the Cy3 and Cy5 labelled extracts of two samples are hybridised to one array
+- sequencing: paired-end RNA-seq with two FASTQ files per run
+- droplet: 10x Genomics single-cell RNA-seq with barcode, cDNA and index read files per run
+- wide: single-end RNA-seq with many sample characteristics
+- processed: single-end RNA-seq with many processed files per assay
+
+The values are derived from the row number (no random values), so that the same parameters always give the
+same files.
+"""
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+
+SHAPES = ("microarray", "sequencing", "droplet", "wide", "processed")
+
+SUBMISSION_TYPES = {"microarray": "microarray", "sequencing": "sequencing", "droplet": "singlecell",
+                    "wide": "sequencing", "processed": "sequencing"}
+
+EXPERIMENT_TYPES = {"microarray": "transcription profiling by array",
+                    "singlecell": "RNA-seq of coding RNA from single cells",
+                    "sequencing": "RNA-seq of coding RNA"}
+
+# Default number of extra characteristics and of processed files per assay of each shape
+DEFAULT_CHARACTERISTICS = {"wide": 100}
+DEFAULT_PROCESSED_FILES = {"processed": 20}
+
+TEAM = "benchmark-team"
+
+PROTOCOLS = {
+    "microarray": [("P-BENCH-1", "sample collection protocol", "EFO_0005518"),
+                   ("P-BENCH-2", "nucleic acid extraction protocol", "EFO_0002944"),
+                   ("P-BENCH-3", "nucleic acid labeling protocol", "EFO_0003808"),
+                   ("P-BENCH-4", "nucleic acid hybridization to array protocol", "EFO_0003790"),
+                   ("P-BENCH-5", "array scanning and feature extraction protocol", "EFO_0003814"),
+                   ("P-BENCH-6", "normalization data transformation protocol", "EFO_0003816")],
+    "sequencing": [("P-BENCH-1", "sample collection protocol", "EFO_0005518"),
+                   ("P-BENCH-2", "nucleic acid extraction protocol", "EFO_0002944"),
+                   ("P-BENCH-3", "nucleic acid library construction protocol", "EFO_0004184"),
+                   ("P-BENCH-4", "nucleic acid sequencing protocol", "EFO_0004170"),
+                   ("P-BENCH-5", "normalization data transformation protocol", "EFO_0003816")]
+}
+
+# Characteristics of every shape, with the number of distinct values
+BASE_CHARACTERISTICS = [("organism", ["Homo sapiens"]),
+                        ("organism part", ["liver", "lung", "heart", "kidney", "brain"]),
+                        ("disease", ["normal", "hepatocellular carcinoma"]),
+                        ("individual", None)]
+
+SINGLECELL_ATTRIBUTES = [("library construction", "10xV2"), ("single cell isolation", "10x"),
+                         ("input molecule", "polyA RNA"), ("end bias", "3 prime tag"), ("spike in", "none"),
+                         ("cell barcode read", "read1"), ("cell barcode offset", "0"), ("cell barcode size", "16"),
+                         ("umi barcode read", "read1"), ("umi barcode offset", "16"), ("umi barcode size", "10"),
+                         ("cdna read", "read2"), ("cdna read offset", "0"), ("cdna read size", "98"),
+                         ("sample barcode read", "index1"), ("sample barcode offset", "0"),
+                         ("sample barcode size", "8")]
+
+# Read type, file name suffix and read length of the files of a 10x run
+DROPLET_READS = [("read1", "R1", 26), ("read2", "R2", 98), ("index1", "I1", 8)]
+
+
+class SyntheticExperiment:
+
+    def __init__(self, shape, samples=100, characteristics=None, processed_files=None, name=None):
+        """
+        Description of a synthetic experiment, used to write its MAGE-TAB and USI-JSON files.
+
+        :param shape: string, one of SHAPES
+        :param samples: number of samples (one assay per sample, except for two-colour microarrays)
+        :param characteristics: (optional) number of extra characteristics per sample, default depends on the shape
+        :param processed_files: (optional) number of processed files per assay, default depends on the shape
+        :param name: (optional) name of the experiment used in the file names
+        """
+        if shape not in SHAPES:
+            raise Exception("Unknown experiment shape \"{}\", expected one of {}.".format(shape, ", ".join(SHAPES)))
+        self.shape = shape
+        self.samples = samples
+        self.characteristics = DEFAULT_CHARACTERISTICS.get(shape, 0) if characteristics is None else characteristics
+        self.processed_files = DEFAULT_PROCESSED_FILES.get(shape, 0) if processed_files is None else processed_files
+        self.name = name or "E-BENCH-{}".format(shape)
+        self.submission_type = SUBMISSION_TYPES[shape]
+        self.protocols = PROTOCOLS["microarray" if shape == "microarray" else "sequencing"]
+
+    def characteristic_values(self, i):
+        """Return the characteristics of the ith sample as a list of (category, value, unit) tuples."""
+        values = [(category, options[i % len(options)] if options else "donor {}".format(i // 4), None)
+                  for category, options in BASE_CHARACTERISTICS]
+        values.append(("age", str(20 + i % 50), "year"))
+        values.extend(("attribute {}".format(j), "value {}".format((i + j) % (j + 2)), None)
+                      for j in range(self.characteristics))
+        return values
+
+    def sample_name(self, i):
+        return "sample {}".format(i)
+
+    def assay_name(self, i):
+        """Name of the assay of the ith sample (or labelled extract for two-colour microarrays)."""
+        if self.shape == "microarray":
+            return "hyb {}".format(i // 2)
+        return "assay {}".format(i)
+
+    def raw_files(self, i):
+        """Return the raw data files of the ith sample as a list of (file name, read type) tuples."""
+        if self.shape == "microarray":
+            return [("hyb_{}.txt".format(i // 2), None)]
+        if self.shape == "droplet":
+            return [("run_{}_S1_L001_{}_001.fastq.gz".format(i, suffix), read_type)
+                    for read_type, suffix, _ in DROPLET_READS]
+        if self.shape == "sequencing":
+            return [("run_{}_{}.fastq.gz".format(i, n), None) for n in (1, 2)]
+        return [("run_{}.fastq.gz".format(i), None)]
+
+    def processed_file_names(self, i):
+        return ["assay_{}_processed_{}.txt".format(i, j) for j in range(self.processed_files)]
+
+
+def checksum(file_name):
+    """Return a made-up MD5 checksum for a file name."""
+    return hashlib.md5(file_name.encode("utf-8")).hexdigest()
+
+
+def write_idf(experiment, idf_file, sdrf_file_name):
+    lines = [
+        ["MAGE-TAB Version", "1.1"],
+        ["Investigation Title", "Synthetic {} experiment with {} samples".format(experiment.shape,
+                                                                               experiment.samples)],
+        ["Experiment Description", "Generated for benchmarking the conversion and validation."],
+        ["Experimental Design", "case control design"],
+        ["Experimental Design Term Source REF", "EFO"],
+        ["Experimental Design Term Accession Number", "EFO_0001427"],
+        ["Experimental Factor Name", "disease"],
+        ["Experimental Factor Type", "disease"],
+        ["Person Last Name", "Searcher"],
+        ["Person First Name", "R"],
+        ["Person Email", "fake@test.com"],
+        ["Person Affiliation", "EMBL-EBI"],
+        ["Person Address", "Wellcome Genome Campus"],
+        ["Person Roles", "submitter"],
+        ["Public Release Date", "2079-12-25"],
+        ["Protocol Name"] + [p[0] for p in experiment.protocols],
+        ["Protocol Type"] + [p[1] for p in experiment.protocols],
+        ["Protocol Term Source REF"] + ["EFO" for _ in experiment.protocols],
+        ["Protocol Term Accession Number"] + [p[2] for p in experiment.protocols],
+        ["Protocol Description"] + ["Description of {}".format(p[1]) for p in experiment.protocols],
+        ["Protocol Hardware"] + ["Illumina HiSeq 2500" if p[1] == "nucleic acid sequencing protocol" else ""
+                                 for p in experiment.protocols],
+        ["Term Source Name", "EFO"],
+        ["Term Source File", "http://www.ebi.ac.uk/efo/"],
+        ["SDRF File", sdrf_file_name],
+        ["Comment[AEExperimentType]", EXPERIMENT_TYPES[experiment.submission_type]]
+    ]
+    with open(idf_file, "w", encoding="utf-8") as fh:
+        for line in lines:
+            fh.write("\t".join(line) + "\n")
+
+
+def sdrf_header(experiment):
+    header = ["Source Name"]
+    for category, _, unit in experiment.characteristic_values(0):
+        header.append("Characteristics[{}]".format(category))
+        if unit:
+            header.append("Unit[time unit]")
+    header.extend(["Material Type", "Protocol REF", "Protocol REF", "Extract Name"])
+    if experiment.shape == "microarray":
+        header.extend(["Protocol REF", "Labeled Extract Name", "Label", "Protocol REF", "Assay Name",
+                       "Technology Type", "Array Design REF", "Term Source REF", "Protocol REF", "Array Data File"])
+    else:
+        header.extend(["Comment[LIBRARY_LAYOUT]", "Comment[LIBRARY_SELECTION]", "Comment[LIBRARY_SOURCE]",
+                       "Comment[LIBRARY_STRATEGY]"])
+        if experiment.shape == "droplet":
+            header.extend("Comment[{}]".format(name) for name, _ in SINGLECELL_ATTRIBUTES)
+        header.extend(["Protocol REF", "Protocol REF", "Assay Name", "Technology Type", "Array Data File",
+                       "Comment[MD5]"])
+    if experiment.processed_files:
+        header.extend(["Protocol REF", "Derived Array Data File"])
+    header.append("Factor Value[disease]")
+    return header
+
+
+def sdrf_rows(experiment, i):
+    """Return the SDRF rows of the ith sample (one row per raw and processed file combination)."""
+    p = [protocol[0] for protocol in experiment.protocols]
+    characteristics = experiment.characteristic_values(i)
+    start = [experiment.sample_name(i)]
+    for _, value, unit in characteristics:
+        start.append(value)
+        if unit:
+            start.append(unit)
+    start.extend(["organism part", p[0], p[1], "extract {}".format(i)])
+    rows = []
+    for file_name, _ in experiment.raw_files(i):
+        row = list(start)
+        if experiment.shape == "microarray":
+            label = "Cy3" if i % 2 == 0 else "Cy5"
+            row.extend([p[2], "extract {}:{}".format(i, label), label, p[3], experiment.assay_name(i),
+                        "array assay", "A-MEXP-1038", "ArrayExpress", p[4], file_name])
+        else:
+            layout = "PAIRED" if experiment.shape in ("sequencing", "droplet") else "SINGLE"
+            row.extend([layout, "RANDOM", "TRANSCRIPTOMIC", "RNA-Seq"])
+            if experiment.shape == "droplet":
+                row.extend(value for _, value in SINGLECELL_ATTRIBUTES)
+            row.extend([p[2], p[3], experiment.assay_name(i), "sequencing assay", file_name, checksum(file_name)])
+        processed = experiment.processed_file_names(i)
+        for processed_file in processed or [None]:
+            processed_row = list(row)
+            if processed_file:
+                processed_row.extend([p[-1], processed_file])
+            processed_row.append(characteristics[2][1])
+            rows.append(processed_row)
+    return rows
+
+
+def write_sdrf(experiment, sdrf_file):
+    with open(sdrf_file, "w", encoding="utf-8") as fh:
+        fh.write("\t".join(sdrf_header(experiment)) + "\n")
+        for i in range(experiment.samples):
+            for row in sdrf_rows(experiment, i):
+                fh.write("\t".join(row) + "\n")
+
+
+def write_magetab(experiment, directory):
+    """Write the IDF and SDRF files of the experiment and return the path to the IDF file."""
+    idf_file = os.path.join(directory, experiment.name + ".idf.txt")
+    sdrf_file_name = experiment.name + ".sdrf.txt"
+    write_idf(experiment, idf_file, sdrf_file_name)
+    write_sdrf(experiment, os.path.join(directory, sdrf_file_name))
+    return idf_file
+
+
+def ref(alias):
+    return {"alias": alias, "team": TEAM}
+
+
+def attribute(value, units=None):
+    entry = {"value": value}
+    if units:
+        entry["units"] = units
+    return [entry]
+
+
+def usi_sample(experiment, i):
+    attributes = OrderedDict((category, attribute(value, unit))
+                             for category, value, unit in experiment.characteristic_values(i))
+    attributes["material type"] = attribute("organism part")
+    return {"alias": experiment.sample_name(i), "team": {"name": TEAM}, "title": experiment.sample_name(i),
+            "taxonId": 9606, "taxon": "Homo sapiens", "attributes": attributes}
+
+
+def usi_assay(experiment, i):
+    p = [protocol[0] for protocol in experiment.protocols]
+    if experiment.shape == "microarray":
+        label = "Cy3" if i % 2 == 0 else "Cy5"
+        alias = "extract {}:{}".format(i, label)
+        attributes = {"label": attribute(label), "array_design": attribute("A-MEXP-1038"),
+                      "technology_type": attribute("array assay")}
+        protocol_refs = p[:5]
+    else:
+        alias = experiment.assay_name(i)
+        layout = "PAIRED" if experiment.shape in ("sequencing", "droplet") else "SINGLE"
+        attributes = OrderedDict([("platform_type", attribute("ILLUMINA")),
+                                  ("instrument_model", attribute("Illumina HiSeq 2500")),
+                                  ("library_layout", attribute(layout)),
+                                  ("library_selection", attribute("RANDOM")),
+                                  ("library_source", attribute("TRANSCRIPTOMIC")),
+                                  ("library_strategy", attribute("RNA-Seq")),
+                                  ("library_strand", attribute("not applicable")),
+                                  ("technology_type", attribute("sequencing assay"))])
+        if experiment.shape == "droplet":
+            attributes["library_source"] = attribute("TRANSCRIPTOMIC SINGLE CELL")
+            attributes.update((name.replace(" ", "_").replace("cdna", "cDNA"), attribute(value))
+                              for name, value in SINGLECELL_ATTRIBUTES)
+        protocol_refs = p[:4]
+    return {"alias": alias, "team": {"name": TEAM}, "attributes": attributes, "studyRef": ref(experiment.name),
+            "sampleUses": [{"sampleRef": ref(experiment.sample_name(i))}],
+            "protocolUses": [{"protocolRef": ref(name)} for name in protocol_refs]}
+
+
+def usi_assay_data(experiment, i, assay_aliases):
+    files = []
+    for file_name, read_type in experiment.raw_files(i):
+        f = {"name": file_name, "checksum": checksum(file_name), "checksumMethod": "MD5",
+             "type": "fastq" if file_name.endswith(".fastq.gz") else "txt"}
+        if read_type:
+            f["attributes"] = {"read_type": attribute(read_type)}
+        files.append(f)
+    alias = "run {}".format(i) if experiment.shape != "microarray" else experiment.assay_name(i)
+    return {"alias": alias, "team": {"name": TEAM}, "attributes": {"data_type": attribute("raw")},
+            "assayRefs": [ref(a) for a in assay_aliases], "files": files}
+
+
+def usi_analysis(experiment, i, assay_data_alias):
+    return {"alias": "processed {}".format(i), "team": {"name": TEAM},
+            "files": [{"name": name} for name in experiment.processed_file_names(i)],
+            "protocolUses": [{"protocolRef": ref(experiment.protocols[-1][0])}],
+            "assayDataRefs": [ref(assay_data_alias)], "attributes": {"data_type": attribute("processed")}}
+
+
+def envelope(experiment):
+    """Return the USI-JSON submission envelope of the experiment as dictionary."""
+    project_alias = "project {}".format(experiment.name)
+    samples = [usi_sample(experiment, i) for i in range(experiment.samples)]
+    assays = [usi_assay(experiment, i) for i in range(experiment.samples)]
+    assay_data = []
+    analyses = []
+    for i in range(experiment.samples):
+        if experiment.shape == "microarray":
+            # The Cy3 and Cy5 assays of two samples share the data file of the hybridisation
+            if i % 2:
+                continue
+            assay_aliases = [a["alias"] for a in assays[i:i + 2]]
+        else:
+            assay_aliases = [assays[i]["alias"]]
+        assay_data.append(usi_assay_data(experiment, i, assay_aliases))
+        if experiment.processed_files:
+            analyses.append(usi_analysis(experiment, i, assay_data[-1]["alias"]))
+    protocols = [{"alias": alias, "team": {"name": TEAM}, "description": "Description of {}".format(protocol_type),
+                  "attributes": {"protocol_type": [{"value": protocol_type,
+                                                    "terms": [{"url": "http://www.ebi.ac.uk/efo/" + accession}]}]}}
+                 for alias, protocol_type, accession in experiment.protocols]
+    project = {"alias": project_alias, "title": "Synthetic {} experiment".format(experiment.shape),
+               "description": "Generated for benchmarking the conversion and validation.",
+               "releaseDate": "2079-12-25",
+               "contacts": [{"firstName": "R", "lastName": "Searcher", "email": "fake@test.com",
+                             "affiliation": "EMBL-EBI", "address": "Wellcome Genome Campus",
+                             "roles": ["submitter"]}]}
+    study = {"alias": experiment.name, "team": {"name": TEAM},
+             "title": "Synthetic {} experiment with {} samples".format(experiment.shape, experiment.samples),
+             "description": "Generated for benchmarking the conversion and validation.",
+             "studyType": "FunctionalGenomics",
+             "attributes": {"experimental_factor": attribute("disease"),
+                            "experimental_design": attribute("case control design"),
+                            "submission_type": attribute(experiment.submission_type),
+                            "experiment_type": attribute(EXPERIMENT_TYPES[experiment.submission_type])},
+             "protocolRefs": [ref(p[0]) for p in experiment.protocols], "projectRef": ref(project_alias)}
+    return OrderedDict([("submission", {"id": experiment.name, "submissionDate": "2079-01-01",
+                                        "submitter": {"email": "fake@test.com", "name": "R Searcher"},
+                                        "team": {"name": TEAM}}),
+                        ("projects", [project]), ("studies", [study]), ("protocols", protocols),
+                        ("samples", samples), ("assays", assays), ("assayData", assay_data),
+                        ("analyses", analyses)])
+
+
+def write_envelope(experiment, directory):
+    """Write the USI-JSON submission envelope of the experiment and return the path to the file."""
+    json_file = os.path.join(directory, experiment.name + ".json")
+    with open(json_file, "w", encoding="utf-8") as fh:
+        json.dump(envelope(experiment), fh)
+    return json_file
+
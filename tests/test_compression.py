@@ -0,0 +1,71 @@
+"""Tests for reading and writing compressed MAGE-TAB and JSON files."""
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from utils.compression import compressed_file_name, detect_compression, open_file, zstandard
+from utils.converter_utils import dict_to_vertical_table, get_sdrf_path, read_idf_file, read_json_file, \
+    read_sdrf_file, write_json_file
+
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.test_data = os.path.join(os.path.dirname(os.path.realpath(__file__)), "test_data")
+        self.wd = tempfile.mkdtemp()
+        self.logger = logging.getLogger("test")
+        self.methods = ["gzip", "bz2"]
+        if zstandard:
+            self.methods.append("zstd")
+
+    def tearDown(self):
+        shutil.rmtree(self.wd)
+
+    def compressed_copy(self, file_name, compression):
+        """Write a compressed copy of a test file to the working directory and return its path."""
+        source = os.path.join(self.test_data, file_name)
+        target = os.path.join(self.wd, file_name + "." + compression)
+        with open(source, "rb") as fi, open_file(target, "wb", compression=compression) as fo:
+            shutil.copyfileobj(fi, fo)
+        return target
+
+    def test_read_magetab(self):
+        idf = read_idf_file(os.path.join(self.test_data, "E-MTAB-4250.idf.txt"))
+        sdrf = read_sdrf_file(os.path.join(self.test_data, "E-MTAB-4250.sdrf.txt"))
+        for method in self.methods:
+            idf_file = self.compressed_copy("E-MTAB-4250.idf.txt", method)
+            sdrf_file = self.compressed_copy("E-MTAB-4250.sdrf.txt", method)
+            self.assertEqual(detect_compression(sdrf_file), method)
+            self.assertEqual(read_idf_file(idf_file), idf)
+            self.assertEqual(read_sdrf_file(sdrf_file), sdrf)
+
+    def test_find_compressed_sdrf(self):
+        shutil.copy(os.path.join(self.test_data, "E-TEST-1.idf.txt"), self.wd)
+        sdrf_file = self.compressed_copy("E-TEST-1.sdrf.txt", "gzip")
+        os.rename(sdrf_file, os.path.join(self.wd, "E-TEST-1.sdrf.txt.gz"))
+        sdrf_path = get_sdrf_path(os.path.join(self.wd, "E-TEST-1.idf.txt"), self.logger)
+        self.assertEqual(sdrf_path, os.path.join(self.wd, "E-TEST-1.sdrf.txt.gz"))
+
+    def test_write_and_read(self):
+        idf = {"Investigation Title": "Test", "Protocol Name": ["P-1", "P-2"]}
+        json_object = {"samples": [{"alias": "sample_1", "taxon": "Homo sapiens"}]}
+        for method in self.methods:
+            idf_file = os.path.join(self.wd, "E-TEST-1.idf.txt")
+            dict_to_vertical_table(idf, idf_file, self.logger, compression=method)
+            self.assertEqual(read_idf_file(compressed_file_name(idf_file, method))["investigationtitle"], ["Test"])
+
+            write_json_file(self.wd, json_object, "envelope", {"alias": "E-TEST-1"}, compression=method)
+            json_files = [f for f in os.listdir(self.wd) if f.startswith("E-TEST-1_envelope.json.")]
+            self.assertEqual(len(json_files), 1)
+            self.assertEqual(read_json_file(os.path.join(self.wd, json_files[0])), json_object)
+            os.remove(os.path.join(self.wd, json_files[0]))
+
+    def test_plain_file(self):
+        self.assertIsNone(detect_compression(os.path.join(self.test_data, "E-TEST-1.idf.txt")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+"""Tests for the concurrent look-ups with limits per host."""
+
+import threading
+import time
+import unittest
+from unittest import mock
+
+from utils import common_utils, converter_utils
+from utils.concurrent_lookups import LookupClient
+
+
+class ConcurrencyCounter:
+
+    def __init__(self, result):
+        """Look-up function that records the highest number of calls running at the same time."""
+        self.result = result
+        self.running = 0
+        self.highest = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, *args):
+        with self.lock:
+            self.running += 1
+            self.highest = max(self.highest, self.running)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        return self.result(*args)
+
+
+class TestLookupClient(unittest.TestCase):
+
+    def test_host_limits(self):
+        parents = ConcurrencyCounter(lambda ontology, term: None if term == "unknown" else term + " unit")
+        taxa = ConcurrencyCounter(lambda organism, logger: len(organism))
+        units = ["unit {}".format(i) for i in range(12)] + ["unknown"]
+        organisms = ["organism {}".format(i) for i in range(8)]
+        with mock.patch.object(common_utils, "get_term_parent", parents), \
+                mock.patch.object(converter_utils, "get_taxon", taxa), \
+                LookupClient(host_limit=4) as client:
+            self.assertEqual(client.look_up_all(lambda unit: client.get_term_parent("efo", unit), units),
+                             {unit: unit + " unit" for unit in units[:-1]})
+            self.assertEqual(list(client.look_up_all(lambda organism: client.get_taxon(organism, None), organisms)),
+                             organisms)
+        self.assertEqual(parents.highest, 4)
+        # NCBI eutils has a lower limit
+        self.assertEqual(taxa.highest, 3)
+
+    def test_coroutines(self):
+        parents = ConcurrencyCounter(lambda ontology, term: None if term == "unknown" else term + " unit")
+        units = ["unit {}".format(i) for i in range(12)] + ["unknown"]
+        with mock.patch.object(common_utils, "get_term_parent", parents), LookupClient(host_limit=4) as client:
+            coroutine = client.gather_all(lambda unit: client.get_term_parent_async("efo", unit), units)
+            self.assertEqual(client.run(coroutine), {unit: unit + " unit" for unit in units[:-1]})
+            # The blocking and the coroutine look-ups share the host limit
+            reader = threading.Thread(target=client.look_up_all,
+                                      args=(lambda unit: client.get_term_parent("efo", unit), units))
+            reader.start()
+            client.run(client.gather_all(lambda unit: client.get_term_parent_async("efo", unit), units))
+            reader.join()
+        self.assertEqual(parents.highest, 4)
+
+    def test_offline(self):
+        with mock.patch.object(common_utils, "get_ontology_source_file", side_effect=lambda o: o + ".owl"), \
+                mock.patch("utils.concurrent_lookups.is_offline", return_value=True), LookupClient() as client:
+            # Answered from the snapshot, without waiting for the host limits
+            client._semaphores.clear()
+            self.assertEqual(client.look_up_all(client.get_ontology_source_file, ["efo", "cl"]),
+                             {"efo": "efo.owl", "cl": "cl.owl"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+"""Tests for the request handling of the conversion and validation service."""
+
+import http.client
+import json
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import conversion_service
+from conversion_service import ConversionService, create_server
+
+
+class TestConversionService(unittest.TestCase):
+
+    def setUp(self):
+        with mock.patch.dict("os.environ", {"USI_AE_CACHE_DIR": tempfile.mkdtemp()}), \
+                mock.patch.object(conversion_service.json2dm, "load_mapping_config", return_value={}):
+            self.service = ConversionService(workers=1, queue_size=0, save_interval=0, save_jobs=2)
+        self.server = create_server(self.service, port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.service.shutdown()
+
+    def request(self, method, path, params=None):
+        connection = http.client.HTTPConnection(*self.server.server_address)
+        connection.request(method, path, body=json.dumps(params) if params is not None else None)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read().decode("utf-8"))
+
+    def test_unknown_job(self):
+        status, content = self.request("POST", "/convert", {})
+        self.assertEqual(status, 404)
+
+    def test_failed_job(self):
+        status, content = self.request("POST", "/validate", {"idf": "does_not_exist.idf.txt"})
+        self.assertEqual(status, 200)
+        self.assertEqual(content["status"], "failed")
+        self.assertEqual(self.request("GET", "/status")[1]["failed"], 1)
+
+    def test_busy(self):
+        # A job that blocks the only worker until the event is set
+        started = threading.Event()
+        event = threading.Event()
+        self.service.jobs["wait"] = lambda params, *loggers: {"waited": started.set() or event.wait(10)}
+        first = threading.Thread(target=self.request, args=("POST", "/wait", {}))
+        first.start()
+        # Wait until the first job holds the only slot
+        self.assertTrue(started.wait(10))
+        status, content = self.request("POST", "/wait", {})
+        event.set()
+        first.join()
+        self.assertEqual(status, 503)
+        self.assertEqual(self.request("GET", "/status")[1]["rejected"], 1)
+
+    def test_caches_are_saved_after_jobs(self):
+        self.service.jobs["noop"] = lambda params, *loggers: {}
+        with mock.patch.object(self.service.validation_cache, "save") as save:
+            self.request("POST", "/noop", {})
+            self.assertEqual(save.call_count, 0)
+            self.assertEqual(self.request("GET", "/status")[1]["unsaved_jobs"], 1)
+            self.request("POST", "/noop", {})
+            self.assertEqual(save.call_count, 1)
+            self.request("POST", "/noop", {})
+            self.service.shutdown()
+            self.assertEqual(save.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
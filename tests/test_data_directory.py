@@ -0,0 +1,44 @@
+"""Tests for the single-pass index of the data directory."""
+
+import os
+import tempfile
+import unittest
+
+from utils.data_directory import DataDirectoryIndex
+
+
+class TestDataDirectoryIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        for name, content in (("sample1.fq.gz", b"reads"), ("sample2.fq.gz", b""), ("E-MTAB-1.sdrf.txt", b"sdrf"),
+                              ("md5sums.txt", b"sums")):
+            with open(os.path.join(self.data_dir, name), "wb") as fh:
+                fh.write(content)
+        os.mkdir(os.path.join(self.data_dir, "processed"))
+        with open(os.path.join(self.data_dir, "processed", "counts.txt"), "wb") as fh:
+            fh.write(b"counts")
+
+    def test_index(self):
+        index = DataDirectoryIndex(self.data_dir)
+        self.assertEqual(len(index), 5)
+        self.assertIn("processed/counts.txt", index)
+        self.assertEqual(index.size("sample1.fq.gz"), 5)
+        self.assertIsNone(index.size("sample3.fq.gz"))
+        self.assertNotIn("processed/counts.txt", DataDirectoryIndex(self.data_dir, recursive=False))
+
+    def test_compare(self):
+        index = DataDirectoryIndex(self.data_dir)
+        file_names = ["sample1.fq.gz", "sample2.fq.gz", "sample3.fq.gz", "processed/counts.txt", "sample1.fq.gz"]
+        missing, empty, unreferenced = index.compare(file_names, ignore={"E-MTAB-1.sdrf.txt"})
+        self.assertEqual(missing, ["sample3.fq.gz"])
+        self.assertEqual(empty, ["sample2.fq.gz"])
+        self.assertEqual(unreferenced, ["md5sums.txt"])
+
+    def test_missing_directory(self):
+        index = DataDirectoryIndex(os.path.join(self.data_dir, "unpacked"))
+        self.assertEqual(index.compare(["sample1.fq.gz"]), (["sample1.fq.gz"], [], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
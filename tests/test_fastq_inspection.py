@@ -0,0 +1,57 @@
+"""Tests for the inspection of the first records of FASTQ files."""
+
+import gzip
+import os
+import tempfile
+import unittest
+
+from validator.fastq_inspection import infer_library_layout, inspect_fastq, inspect_fastq_files, is_barcode_read
+
+
+def fastq_records(read_number, length, count):
+    return "".join("@M00123:1:000:1:1101:{}:1331 {}:N:0:1\n{}\n+\n{}\n".format(i, read_number, "A" * length,
+                                                                                 "I" * length)
+                   for i in range(count))
+
+
+class TestFastqInspection(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+
+    def write_fastq(self, name, content):
+        file_path = os.path.join(self.data_dir, name)
+        with gzip.open(file_path, "wt") as fh:
+            fh.write(content)
+        return file_path
+
+    def test_inspect_fastq(self):
+        file_path = self.write_fastq("run_R2.fastq.gz", fastq_records(2, 98, 50))
+        inspection = inspect_fastq(file_path, max_records=10)
+        self.assertIsNone(inspection["error"])
+        self.assertEqual(inspection["records"], 10)
+        self.assertEqual((inspection["min_length"], inspection["max_length"]), (98, 98))
+        self.assertEqual(inspection["read_numbers"], ["2"])
+
+    def test_invalid_fastq(self):
+        file_path = self.write_fastq("run.fastq.gz", ">sequence1\nACGT\n")
+        self.assertIsNotNone(inspect_fastq(file_path)["error"])
+
+    def test_library_layout(self):
+        paths = [self.write_fastq("run_R1.fastq.gz", fastq_records(1, 28, 5)),
+                 self.write_fastq("run_R2.fastq.gz", fastq_records(2, 91, 5)),
+                 self.write_fastq("run_I1.fastq.gz", fastq_records(1, 8, 5))]
+        inspections = inspect_fastq_files(paths, workers=3)
+        self.assertTrue(is_barcode_read(inspections[0]))
+        self.assertFalse(is_barcode_read(inspections[1]))
+        # The barcode read counts as read, the index read doesn't
+        self.assertEqual(infer_library_layout(inspections), "PAIRED")
+        self.assertEqual(infer_library_layout(inspections[1:]), "SINGLE")
+
+    def test_interleaved_pairs(self):
+        file_path = self.write_fastq("run.fastq.gz", fastq_records(1, 50, 1) + fastq_records(2, 50, 1))
+        self.assertEqual(infer_library_layout([inspect_fastq(file_path)]), "PAIRED")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+"""Tests for the verification of data files against their declared checksums."""
+
+import hashlib
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from validator import file_verification
+from validator.file_verification import create_checksum_cache, file_digest, verify_files
+
+
+class TestFileVerification(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.content = b"@read1\nACGT\n+\nIIII\n" * 1000
+        with open(os.path.join(self.data_dir, "reads.fq"), "wb") as fh:
+            fh.write(self.content)
+        self.md5 = hashlib.md5(self.content).hexdigest()
+
+    def test_file_digest(self):
+        # A small buffer, so that the file is read in several blocks
+        digest = file_digest(os.path.join(self.data_dir, "reads.fq"), buffer_size=1000)
+        self.assertEqual(digest, self.md5)
+
+    def test_verify_files(self):
+        files = [("reads.fq", self.md5.upper(), "md5"),
+                 ("reads.fq", "0" * 32, "md5"),
+                 ("missing.fq", self.md5, "md5")]
+        results = verify_files(files, self.data_dir, workers=3)
+        self.assertEqual([r["status"] for r in results], ["verified", "mismatch", "missing"])
+        self.assertEqual(results[0]["size"], len(self.content))
+
+    def test_digests_are_cached(self):
+        files = [("reads.fq", self.md5, "md5")]
+        cache = create_checksum_cache(self.cache_dir)
+        verify_files(files, self.data_dir, cache=cache)
+        cache.save()
+        # A new cache (e.g. in the next run) starts with the saved digests
+        with mock.patch.object(file_verification, "file_digest") as digest:
+            results = verify_files(files, self.data_dir, cache=create_checksum_cache(self.cache_dir))
+            digest.assert_not_called()
+        self.assertEqual(results[0]["status"], "verified")
+
+    def test_changed_file_is_read_again(self):
+        cache = create_checksum_cache(self.cache_dir)
+        verify_files([("reads.fq", self.md5, "md5")], self.data_dir, cache=cache)
+        with open(os.path.join(self.data_dir, "reads.fq"), "ab") as fh:
+            fh.write(b"@read2\n")
+        results = verify_files([("reads.fq", self.md5, "md5")], self.data_dir, cache=cache)
+        self.assertEqual(results[0]["status"], "mismatch")
+
+
+if __name__ == '__main__':
+    unittest.main()
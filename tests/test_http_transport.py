@@ -0,0 +1,103 @@
+"""Tests for recording and replaying the responses of remote look-ups."""
+
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from utils import http_transport, profiling
+from utils.common_utils import download_json
+from utils.eutils import esearch
+
+
+def fake_get(url, params=None):
+    if "esearch" in url:
+        return SimpleNamespace(status_code=200, text='{"esearchresult": {"idlist": ["9606"]}}',
+                               content=b"", url=url)
+    if "broken" in url:
+        return SimpleNamespace(status_code=503, text="Service unavailable", content=b"", url=url)
+    return SimpleNamespace(status_code=200, text='{"term": "%s"}' % params.get("q"), content=b"", url=url)
+
+
+class TestHTTPTransport(unittest.TestCase):
+
+    def setUp(self):
+        http_transport.set_transport_mode("record", tempfile.mkdtemp())
+        self.logger = mock.Mock()
+
+    def tearDown(self):
+        http_transport.set_transport_mode()
+
+    def test_record_and_replay(self):
+        with mock.patch.object(http_transport, "send_request", side_effect=fake_get) as get:
+            self.assertEqual(download_json(self.logger, "https://ols/search", {"q": "liver", "rows": 1}),
+                             {"term": "liver"})
+            self.assertEqual(esearch("taxonomy", "Homo sapiens")["esearchresult"]["idlist"], ["9606"])
+            self.assertEqual(get.call_count, 2)
+        http_transport.set_transport_mode("replay", http_transport.get_store_dir())
+        with mock.patch.object(http_transport, "send_request", side_effect=AssertionError("network access")):
+            # The order of the parameters does not matter
+            self.assertEqual(download_json(self.logger, "https://ols/search", {"rows": 1, "q": "liver"}),
+                             {"term": "liver"})
+            self.assertEqual(esearch("taxonomy", "Homo sapiens")["esearchresult"]["idlist"], ["9606"])
+            self.assertRaises(http_transport.ResponseNotRecorded, download_json, self.logger, "https://ols/search",
+                              {"q": "lung", "rows": 1})
+
+    def test_server_errors_are_not_recorded(self):
+        with mock.patch.object(http_transport, "send_request", side_effect=fake_get):
+            self.assertEqual(http_transport.http_get("https://broken/api").status_code, 503)
+        http_transport.set_transport_mode("replay", http_transport.get_store_dir())
+        self.assertRaises(http_transport.ResponseNotRecorded, http_transport.http_get, "https://broken/api")
+
+    def test_session(self):
+        session = http_transport.get_session()
+        self.assertIs(http_transport.get_session(), session)
+        adapter = session.get_adapter("https://www.ebi.ac.uk/ols/api/")
+        self.assertEqual(adapter.max_retries.total, http_transport.RETRIES)
+        # Worker processes don't use the connections of the parent process
+        with mock.patch.object(http_transport.os, "getpid", return_value=-1):
+            self.assertIsNot(http_transport.get_session(), session)
+
+    def test_host_interval(self):
+        sent = []
+        session = SimpleNamespace(get=lambda url, params, timeout: sent.append(time.monotonic()))
+        with mock.patch.dict(http_transport.HOST_INTERVALS, {"rate.limited": 0.05}), \
+                mock.patch.object(http_transport, "get_session", return_value=session):
+            threads = [threading.Thread(target=http_transport.send_request, args=("https://rate.limited/api",))
+                       for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            http_transport.send_request("https://other.host/api")
+        self.assertEqual(len(sent), 5)
+        # The other host is not delayed by the limited one
+        self.assertLess(sent[4] - max(sent[:4]), 0.04)
+        times = sorted(sent[:4])
+        self.assertGreaterEqual(min(b - a for a, b in zip(times, times[1:])), 0.045)
+
+    def test_request_counters(self):
+        profiling.reset()
+        profiling.enable()
+        try:
+            with mock.patch.object(http_transport, "send_request", side_effect=fake_get):
+                download_json(self.logger, "https://ols/search", {"q": "liver"})
+                esearch("taxonomy", "Homo sapiens")
+            http_transport.set_transport_mode("replay", http_transport.get_store_dir())
+            download_json(self.logger, "https://ols/search", {"q": "liver"})
+        finally:
+            profiling.disable()
+        counters = dict(profiling._counters)
+        profiling.reset()
+        # All services are counted by host
+        self.assertEqual(counters["ols requests"], 2)
+        self.assertEqual(counters["eutils.ncbi.nlm.nih.gov requests"], 1)
+
+    def test_unknown_mode(self):
+        self.assertRaises(Exception, http_transport.set_transport_mode, "offline")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""Tests for writing USI-JSON files incrementally."""
+
+import json
+import os
+import tempfile
+import unittest
+from collections import OrderedDict
+
+from utils.converter_utils import read_json_file, write_json_file, write_json_stream
+from utils.json_backend import available_backends, decode_json, encode_json, get_json_backend, set_json_backend
+
+
+class TestJSONStreamWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.wd = tempfile.mkdtemp()
+        self.sub_info = {"alias": "E-TEST-1"}
+        self.samples = [{"alias": "sample_{}".format(i), "attributes": {"organism": [{"value": "Mus musculus"}]}}
+                        for i in range(3)]
+
+    def read_file(self, object_type):
+        with open(os.path.join(self.wd, "E-TEST-1_{}.json".format(object_type)), encoding="utf-8") as fh:
+            return fh.read()
+
+    def test_array_from_generator(self):
+        write_json_file(self.wd, self.samples, "expected", self.sub_info)
+        write_json_stream(self.wd, (s for s in self.samples), "samples", self.sub_info)
+        self.assertEqual(self.read_file("samples"), self.read_file("expected"))
+
+    def test_envelope_with_generators(self):
+        envelope = OrderedDict([("submission", {}), ("samples", self.samples), ("assays", [])])
+        write_json_file(self.wd, envelope, "expected", self.sub_info)
+        streamed = OrderedDict([("submission", {}), ("samples", iter(self.samples)), ("assays", iter([]))])
+        write_json_stream(self.wd, streamed, "envelope", self.sub_info)
+        self.assertEqual(self.read_file("envelope"), self.read_file("expected"))
+        self.assertEqual(json.loads(self.read_file("envelope"))["samples"], self.samples)
+
+    def test_indented_stream(self):
+        write_json_stream(self.wd, OrderedDict([("submission", {}), ("samples", iter(self.samples))]),
+                          "envelope", self.sub_info, indent=2)
+        expected = json.dumps(OrderedDict([("submission", {}), ("samples", self.samples)]), indent=2)
+        self.assertEqual(self.read_file("envelope"), expected)
+
+
+class TestJSONBackends(unittest.TestCase):
+
+    def setUp(self):
+        self.default_backend = get_json_backend()
+        self.envelope = OrderedDict([
+            ("submission", {}),
+            ("samples", [OrderedDict([("alias", "sample_1"), ("taxonId", 10090),
+                                      ("attributes", {"organism": [{"value": "Mus musculus"}],
+                                                      "age": [{"value": 2.5, "units": "µg"}]})])])
+        ])
+
+    def tearDown(self):
+        set_json_backend(self.default_backend)
+
+    def test_round_trip(self):
+        for backend in available_backends():
+            for options in ({}, {"compact": True}, {"indent": 2}, {"indent": 4}):
+                encoded = encode_json(self.envelope, backend=backend, **options)
+                self.assertEqual(decode_json(encoded, backend=backend), self.envelope)
+                # Key order of the OrderedDicts is kept
+                self.assertEqual(list(json.loads(encoded.decode("utf-8"))), ["submission", "samples"])
+
+    def test_same_output_with_all_backends(self):
+        # Only compact output depends on the library
+        for backend in available_backends():
+            self.assertEqual(encode_json(self.envelope, backend=backend), json.dumps(self.envelope).encode("utf-8"))
+            self.assertEqual(encode_json(self.envelope, backend=backend, indent=2),
+                             json.dumps(self.envelope, indent=2).encode("utf-8"))
+
+    def test_read_and_write_file(self):
+        wd = tempfile.mkdtemp()
+        for backend in available_backends():
+            set_json_backend(backend)
+            write_json_file(wd, self.envelope, backend, {"alias": "E-TEST-1"})
+            self.assertEqual(read_json_file(os.path.join(wd, "E-TEST-1_{}.json".format(backend))), self.envelope)
+
+    def test_unknown_backend(self):
+        self.assertRaises(Exception, set_json_backend, "simplejson")
+
+
+if __name__ == '__main__':
+    unittest.main()
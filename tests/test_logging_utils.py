@@ -0,0 +1,68 @@
+"""Tests for the logger set-up with shared handlers and asynchronous logging."""
+
+import os
+import tempfile
+import unittest
+
+from utils.common_utils import create_logger
+from utils.logging_utils import configure_logger, experiment_logger, get_file_handler, start_async_logging, \
+    stop_async_logging
+
+
+class TestLoggingUtils(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.tmp_dir.name, "test.log")
+
+    def tearDown(self):
+        stop_async_logging()
+        for name in ("test_a", "test_b"):
+            configure_logger(name, console=False)
+        self.tmp_dir.cleanup()
+
+    def read_log(self):
+        with open(self.log_file) as f:
+            return f.read()
+
+    def test_repeated_setup_does_not_add_handlers(self):
+        for _ in range(3):
+            logger = create_logger(self.tmp_dir.name, "testing", "repeat", logger_name="test_a")
+        self.assertEqual(len(logger.handlers), 2)
+
+    def test_loggers_share_file_handler(self):
+        logger_a = configure_logger("test_a", log_file=self.log_file, console=False)
+        logger_b = configure_logger("test_b", log_file=self.log_file, console=False)
+        self.assertIs(logger_a.handlers[0], logger_b.handlers[0])
+        logger_a.info("message a")
+        logger_b.info("message b")
+        log = self.read_log()
+        self.assertEqual(log.count("message a"), 1)
+        self.assertEqual(log.count("message b"), 1)
+
+    def test_unused_file_is_closed(self):
+        old_handler = configure_logger("test_a", log_file=self.log_file, console=False).handlers[0]
+        new_file = os.path.join(self.tmp_dir.name, "new.log")
+        logger = configure_logger("test_a", log_file=new_file, console=False)
+        self.assertEqual(logger.handlers, [get_file_handler(new_file)])
+        self.assertIsNone(old_handler.stream)
+
+    def test_async_logging(self):
+        logger = configure_logger("test_a", log_file=self.log_file, console=False)
+        start_async_logging()
+        for i in range(100):
+            logger.info("message {}".format(i))
+        stop_async_logging()
+        log = self.read_log()
+        self.assertIn("message 0", log)
+        self.assertIn("message 99", log)
+        self.assertEqual(logger.handlers, [get_file_handler(self.log_file)])
+
+    def test_experiment_logger(self):
+        logger = experiment_logger(configure_logger("test_a", log_file=self.log_file, console=False), "E-MTAB-1")
+        logger.warning("missing value")
+        self.assertIn("WARNING: [E-MTAB-1] missing value", self.read_log())
+
+
+if __name__ == '__main__':
+    unittest.main()
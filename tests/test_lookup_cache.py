@@ -0,0 +1,89 @@
+"""Tests for the shared and persistent look-up cache."""
+
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from utils import common_utils
+from utils.common_utils import get_ontology_from_term_url, resolve_term_url_ontologies
+from utils.lookup_cache import LookupCache, get_lookup_cache
+
+
+class TestLookupCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def test_seed_values(self):
+        cache = LookupCache("units", seed={"hour": "time unit"}, cache_dir=self.cache_dir)
+        self.assertIn("hour", cache)
+        self.assertEqual(cache.get("hour"), "time unit")
+        # Nothing new was added, so there should be no cache file
+        cache.save()
+        self.assertFalse(os.path.exists(cache.file_path))
+
+    def test_values_are_shared_between_instances(self):
+        cache = LookupCache("units", cache_dir=self.cache_dir)
+        cache.set("gram", "mass unit")
+        cache.save()
+        # A new cache (e.g. in another process) starts with the saved values
+        new_cache = LookupCache("units", cache_dir=self.cache_dir)
+        self.assertEqual(new_cache.get("gram"), "mass unit")
+
+    def test_save_merges_with_file_content(self):
+        cache1 = LookupCache("units", cache_dir=self.cache_dir)
+        cache2 = LookupCache("units", cache_dir=self.cache_dir)
+        cache1.set("gram", "mass unit")
+        cache2.set("liter", "volume unit")
+        cache1.save()
+        cache2.save()
+        merged = LookupCache("units", cache_dir=self.cache_dir)
+        self.assertEqual(merged.get("gram"), "mass unit")
+        self.assertEqual(merged.get("liter"), "volume unit")
+
+
+    def test_failed_save_keeps_new_values(self):
+        cache = LookupCache("units", cache_dir=self.cache_dir)
+        cache.set("gram", "mass unit")
+        with mock.patch("utils.lookup_cache.os.replace", side_effect=OSError("read-only file system")):
+            cache.save()
+        self.assertEqual(os.listdir(self.cache_dir), [])
+        cache.save()
+        self.assertEqual(LookupCache("units", cache_dir=self.cache_dir).get("gram"), "mass unit")
+
+
+class TestTermSourceLookup(unittest.TestCase):
+
+    def test_efo_url_without_request(self):
+        self.assertEqual(get_ontology_from_term_url("http://www.ebi.ac.uk/efo/EFO_0002218"), "EFO")
+
+    def test_empty_url(self):
+        self.assertIsNone(get_ontology_from_term_url(""))
+
+    def test_resolve_batch_from_cache(self):
+        # Terms that have been looked up before are taken from the cache without new requests
+        get_lookup_cache("term_ontologies").set("http://purl.obolibrary.org/obo/CHEBI_36049", "CHEBI")
+        term_urls = ["http://www.ebi.ac.uk/efo/EFO_0002218",
+                     "http://purl.obolibrary.org/obo/CHEBI_36049",
+                     "http://purl.obolibrary.org/obo/CHEBI_36049",
+                     ""]
+        ontologies = resolve_term_url_ontologies(term_urls)
+        self.assertEqual(ontologies, {"http://www.ebi.ac.uk/efo/EFO_0002218": "EFO",
+                                      "http://purl.obolibrary.org/obo/CHEBI_36049": "CHEBI"})
+
+    def test_guess_after_server_error_is_not_cached(self):
+        term_ontologies = get_lookup_cache("term_ontologies")
+        responses = {"CL_0000001": SimpleNamespace(status_code=503, text="", content=b""),
+                     "CL_0000002": SimpleNamespace(status_code=404, text="", content=b"")}
+        with mock.patch.object(common_utils, "http_get", side_effect=lambda url, params: responses[url[-10:]]):
+            for term in responses:
+                # The prefix of the accession is used if the term is not found in EFO
+                self.assertEqual(get_ontology_from_term_url("http://purl.obolibrary.org/obo/" + term), "CL")
+        self.assertNotIn("http://purl.obolibrary.org/obo/CL_0000001", term_ontologies)
+        self.assertEqual(term_ontologies.get("http://purl.obolibrary.org/obo/CL_0000002"), "CL")
+
+
+if __name__ == '__main__':
+    unittest.main()
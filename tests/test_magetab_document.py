@@ -0,0 +1,59 @@
+"""Tests for the MAGE-TAB loader that reads each file once."""
+
+import logging
+import os
+import unittest
+from unittest import mock
+
+import utils.magetab_document
+from utils.converter_utils import get_sdrf_path, guess_submission_type, read_idf_file, read_sdrf_file
+from utils.magetab_document import MageTabDocument
+from utils.sdrf_view import read_sdrf_view
+
+
+class TestMageTabDocument(unittest.TestCase):
+
+    def setUp(self):
+        self.test_data = os.path.join(os.path.dirname(os.path.realpath(__file__)), "test_data")
+        self.logger = logging.getLogger("test")
+        self.idf_files = [os.path.join(self.test_data, f) for f in sorted(os.listdir(self.test_data))
+                          if f.endswith(".idf.txt")]
+
+    def test_same_content_as_separate_reads(self):
+        for idf_file in self.idf_files:
+            document = MageTabDocument(idf_file, logger=self.logger)
+            sdrf_file = get_sdrf_path(idf_file, self.logger)
+            self.assertEqual(document.sdrf_file, sdrf_file)
+            self.assertEqual(document.idf_dict, read_idf_file(idf_file))
+            sdrf_data, header, header_dict = read_sdrf_file(sdrf_file)
+            self.assertEqual(list(document.sdrf_data), sdrf_data)
+            self.assertEqual(document.header, header)
+            self.assertEqual(document.header_dict, header_dict)
+            self.assertEqual(document.submission_type, guess_submission_type(idf_file, sdrf_file, self.logger)[0])
+            document.close()
+
+    def test_interned(self):
+        idf_file = os.path.join(self.test_data, "E-MTAB-4250.idf.txt")
+        with MageTabDocument(idf_file, logger=self.logger) as document, \
+                MageTabDocument(idf_file, logger=self.logger, interned=True) as interned_document:
+            self.assertEqual(list(interned_document.sdrf_data), list(document.sdrf_data))
+            self.assertEqual(interned_document.header_dict, document.header_dict)
+            self.assertEqual(interned_document.submission_type, document.submission_type)
+
+    def test_files_are_read_once(self):
+        idf_file = os.path.join(self.test_data, "E-MTAB-4250.idf.txt")
+        with mock.patch.object(utils.magetab_document, "read_idf_file", wraps=read_idf_file) as idf_reader, \
+                mock.patch.object(utils.magetab_document, "read_sdrf_view", wraps=read_sdrf_view) as sdrf_reader:
+            document = MageTabDocument(idf_file, logger=self.logger)
+            document.submission_type
+            document.idf_dict
+            document.sdrf_data
+            document.header_dict
+            self.assertEqual(idf_reader.call_count, 1)
+            self.assertEqual(sdrf_reader.call_count, 1)
+            document.close()
+            self.assertRaises(ValueError, document.sdrf_data.__getitem__, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+"""Tests for the MAGE-TAB prevalidation checks."""
+
+import logging
+import unittest
+
+from validator.magetab_prevalidation import edit_distance, get_idf_field_index, idf_prevalidation, \
+    sdrf_prevalidation
+
+
+class TestSDRFPrevalidation(unittest.TestCase):
+
+    def setUp(self):
+        self.header = ["Source Name", "Characteristics[organism]", "Protocol REF", "Extract Name", "Protocol REF",
+                       "Assay Name", "Technology Type", "Protocol REF", "Array Data File"]
+        self.header_dict = {"sourcename": [0], "characteristics": [1], "protocolref": [2, 4, 7], "extractname": [3],
+                            "assayname": [5], "technologytype": [6], "arraydatafile": [8]}
+        self.logger = logging.getLogger("prevalidation")
+
+    def run_checks(self, rows):
+        with self.assertLogs(self.logger, level="INFO") as logs:
+            # Making sure there is at least one message to capture
+            self.logger.info("Start")
+            sdrf_prevalidation(rows, self.header, self.header_dict, "sequencing", self.logger)
+        return logs.output[1:]
+
+    def test_valid_sdrf(self):
+        rows = [["s1", "Mus musculus", "P-1", "e1", "P-2", "a1", "sequencing assay", "P-3", "f1.fq"],
+                ["s1", "Mus musculus", "P-1", "e2", "P-2", "a2", "sequencing assay", "P-3", "f2.fq"]]
+        self.assertEqual(self.run_checks(rows), [])
+
+    def test_pooled_samples(self):
+        rows = [["s1", "Mus musculus", "P-1", "e1", "P-2", "a1", "sequencing assay", "P-3", "f1.fq"],
+                ["s2", "Mus musculus", "P-1", "e1", "P-2", "a1", "sequencing assay", "P-3", "f1.fq"]]
+        self.assertEqual(self.run_checks(rows), [
+            "WARNING:prevalidation:The following Extract Names are pooled from more than one Source Name: e1"])
+
+    def test_assay_with_two_extracts(self):
+        rows = [["s1", "Mus musculus", "P-1", "e1", "P-2", "a1", "sequencing assay", "P-3", "f1.fq"],
+                ["s1", "Mus musculus", "P-1", "e2", "P-2", "a1", "sequencing assay", "P-3", "f2.fq"]]
+        self.assertEqual(self.run_checks(rows), [
+            "ERROR:prevalidation:The following Assay Names are linked to more than one Extract Name: a1"])
+
+    def test_empty_node_names(self):
+        rows = [["s1", "Mus musculus", "P-1", "e1", "P-2", "a1", "sequencing assay", "P-3", "f1.fq"],
+                [" ", "Mus musculus", "P-1", "e2", "P-2", "a2", "sequencing assay", "P-3", "f2.fq"]]
+        self.assertEqual(self.run_checks(rows), ["ERROR:prevalidation:Source Name is empty in 1 row(s), e.g. row 3."])
+        rows.append(["", "Mus musculus", "P-1", "e3", "P-2", "a3", "sequencing assay", "P-3", "f3.fq"])
+        self.assertEqual(self.run_checks(rows),
+                         ["ERROR:prevalidation:Source Name is empty in 2 row(s), e.g. rows 3, 4."])
+
+    def test_missing_protocol(self):
+        self.header[4] = "Comment[library]"
+        self.header_dict["protocolref"] = [2, 7]
+        self.header_dict["comment"] = [4]
+        rows = [["s1", "Mus musculus", "P-1", "e1", "lib", "a1", "sequencing assay", "P-3", "f1.fq"]]
+        self.assertEqual(self.run_checks(rows), [
+            "WARNING:prevalidation:There is no Protocol REF connecting \"Extract Name\" and \"Assay Name\"."])
+
+
+class TestIDFPrevalidation(unittest.TestCase):
+
+    def test_field_index_is_shared(self):
+        self.assertIs(get_idf_field_index(), get_idf_field_index())
+        self.assertIn("investigationtitle", get_idf_field_index())
+        self.assertIn("AEExperimentType", get_idf_field_index())
+
+    def test_suggestions(self):
+        index = get_idf_field_index()
+        self.assertEqual(index.suggest("investigationtitel"), ["Investigation Title"])
+        self.assertEqual(index.suggest("AEExperimentTyp"), ["Comment[AEExperimentType]"])
+        self.assertEqual(index.suggest("xyzzy"), [])
+
+    def test_unknown_field_message(self):
+        logger = logging.getLogger("idf")
+        with self.assertLogs(logger, level="ERROR") as logs:
+            idf_prevalidation({"investigationtitle": ["Test"], "protocolnam": ["P-1"], "xyzzy": ["?"]}, logger)
+        self.assertEqual(logs.output, [
+            "ERROR:idf:Cannot parse IDF field \"protocolnam\". Did you mean \"Protocol Name\"?",
+            "ERROR:idf:Cannot parse IDF field \"xyzzy\"."])
+
+    def test_edit_distance(self):
+        self.assertEqual(edit_distance("kitten", "sitting"), 3)
+        self.assertEqual(edit_distance("", "abc"), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+"""Tests for the pipeline of processing stages."""
+
+import threading
+import time
+import unittest
+
+from utils.pipeline import Pipeline, Stage
+
+
+def square(x):
+    return x * x
+
+
+def fail_on_three(x):
+    if x == 9:
+        raise ValueError("no nines")
+    return x
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_results(self):
+        pipeline = Pipeline([Stage("parse", square, workers=2, processes=True),
+                             Stage("check", fail_on_three, workers=3),
+                             Stage("write", str)])
+        results = list(pipeline.run(range(10)))
+        self.assertEqual(sorted(r["value"] for r in results if r["status"] == "completed"),
+                         sorted(str(x * x) for x in range(10) if x != 3))
+        failed = [r for r in results if r["status"] == "failed"]
+        self.assertEqual(len(failed), 1)
+        self.assertEqual((failed[0]["item"], failed[0]["stage"]), (3, "check"))
+        # The failed experiment skipped the last stage
+        self.assertEqual(list(failed[0]["seconds"]), ["parse", "check"])
+        stats = pipeline.stats()
+        self.assertEqual((stats["parse"]["processed"], stats["check"]["failed"], stats["write"]["processed"]),
+                         (10, 1, 9))
+
+    def test_backpressure(self):
+        # The first stage can't get more than the queue size and one item per worker ahead of the slow stage
+        started = []
+        release = threading.Event()
+
+        def slow(x):
+            release.wait(5)
+            return x
+
+        pipeline = Pipeline([Stage("read", started.append), Stage("slow", slow, queue_size=2)])
+        results = pipeline.run(range(20))
+        reader = threading.Thread(target=list, args=(results,))
+        reader.start()
+        time.sleep(0.2)
+        self.assertLessEqual(len(started), 5)
+        release.set()
+        reader.join()
+        self.assertEqual(len(started), 20)
+        self.assertLessEqual(pipeline.stats()["slow"]["max_queue"], 2)
+
+    def test_failing_items(self):
+        def items():
+            yield 1
+            yield 2
+            raise IOError("can't list the directory")
+
+        pipeline = Pipeline([Stage("square", square, workers=2)])
+        results = []
+        with self.assertRaisesRegex(IOError, "can't list the directory"):
+            for result in pipeline.run(items()):
+                results.append(result)
+        # The items read before the error are still processed
+        self.assertEqual(sorted(r["value"] for r in results), [1, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+"""Tests for the timers and counters of the profiling instrumentation."""
+
+import unittest
+from types import SimpleNamespace
+
+from utils import profiling
+
+
+@profiling.timed()
+def add(a, b):
+    return a + b
+
+
+class TestProfiling(unittest.TestCase):
+
+    def tearDown(self):
+        profiling.disable()
+        profiling.reset()
+
+    def test_disabled(self):
+        self.assertEqual(add(1, 2), 3)
+        with profiling.stage("block"):
+            profiling.count("counter")
+        self.assertEqual(profiling._timers, {})
+        self.assertEqual(profiling._counters, {})
+
+    def test_timers_and_counters(self):
+        profiling.enable()
+        for i in range(3):
+            add(i, 1)
+        with profiling.stage("block"):
+            profiling.count_request("OLS", SimpleNamespace(content=b"12345"))
+            profiling.count_request("OLS", SimpleNamespace(content=b"678"))
+        profiling.disable()
+        self.assertEqual(profiling._timers["test_profiling.add"][0], 3)
+        self.assertEqual(profiling._timers["block"][0], 1)
+        self.assertEqual(profiling._counters, {"OLS requests": 2, "OLS bytes received": 8})
+        report = profiling.report()
+        self.assertIn("test_profiling.add", report)
+        self.assertIn("OLS bytes received", report)
+
+
+if __name__ == '__main__':
+    unittest.main()
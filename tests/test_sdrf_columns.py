@@ -0,0 +1,39 @@
+"""Tests for the dictionary-encoded SDRF column store."""
+
+import os
+import unittest
+
+from utils.converter_utils import read_sdrf_file
+from utils.sdrf_columns import SDRFColumnStore, read_sdrf_columns
+
+
+class TestSDRFColumnStore(unittest.TestCase):
+
+    def setUp(self):
+        self.test_data = os.path.join(os.path.dirname(os.path.realpath(__file__)), "test_data")
+
+    def test_same_rows_as_read_sdrf_file(self):
+        for sdrf_file in [os.path.join(self.test_data, f) for f in os.listdir(self.test_data)
+                          if f.endswith(".sdrf.txt")]:
+            sdrf_data, header, header_dict = read_sdrf_file(sdrf_file)
+            store, store_header, store_header_dict = read_sdrf_columns(sdrf_file)
+            self.assertEqual(list(store), sdrf_data)
+            self.assertEqual(store_header, header)
+            self.assertEqual(store_header_dict, header_dict)
+
+    def test_values_are_shared(self):
+        store = SDRFColumnStore.from_rows([["sample 1", "Homo sapiens"], ["sample 2", "Homo sapiens"]],
+                                          ["Source Name", "Characteristics[organism]"])
+        self.assertIs(store[0][1], store[1][1])
+        self.assertEqual(store.unique_values(1), ["Homo sapiens"])
+        self.assertEqual(store.column(0), ["sample 1", "sample 2"])
+
+    def test_ragged_rows(self):
+        rows = [["a", "b"], ["c"], ["d", "e", "f"]]
+        store = SDRFColumnStore.from_rows(rows, ["Source Name", "Description"])
+        self.assertEqual(list(store), rows)
+        self.assertEqual(store.column(1), ["b", "", "e"])
+
+
+if __name__ == '__main__':
+    unittest.main()
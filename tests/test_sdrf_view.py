@@ -0,0 +1,79 @@
+"""Tests for the memory-mapped SDRF view."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from utils.compression import open_file
+from utils.converter_utils import read_sdrf_file
+from utils.sdrf_view import SDRFView, get_column
+
+
+class TestSDRFView(unittest.TestCase):
+
+    def setUp(self):
+        self.test_data = os.path.join(os.path.dirname(os.path.realpath(__file__)), "test_data")
+        self.sdrf_files = [os.path.join(self.test_data, f) for f in sorted(os.listdir(self.test_data))
+                           if f.endswith(".sdrf.txt")]
+        self.wd = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.wd)
+
+    def test_same_rows_as_read_sdrf_file(self):
+        for sdrf_file in self.sdrf_files:
+            sdrf_data, header, header_dict = read_sdrf_file(sdrf_file)
+            with SDRFView(sdrf_file) as view:
+                self.assertEqual(len(view), len(sdrf_data))
+                self.assertEqual(list(view), sdrf_data)
+                self.assertEqual(view.header, header)
+                self.assertEqual(view.header_dict, header_dict)
+                self.assertEqual(view[-1], sdrf_data[-1])
+                self.assertEqual(view[1:3], sdrf_data[1:3])
+
+    def test_column_projection(self):
+        sdrf_file = os.path.join(self.test_data, "E-MTAB-4250.sdrf.txt")
+        sdrf_data, header, header_dict = read_sdrf_file(sdrf_file)
+        with SDRFView(sdrf_file) as view:
+            source_index = header_dict["sourcename"][0]
+            self.assertEqual(get_column(view, source_index), get_column(sdrf_data, source_index))
+            selected = list(view.select([source_index, 2]))
+            self.assertEqual(selected, [(row[source_index], row[2]) for row in sdrf_data])
+            for row, full_row in zip(view.rows(last_column=2), sdrf_data):
+                self.assertEqual(row[:3], full_row[:3])
+
+    def test_compressed_file(self):
+        sdrf_file = os.path.join(self.test_data, "E-TEST-1.sdrf.txt")
+        compressed_file = os.path.join(self.wd, "E-TEST-1.sdrf.txt.gz")
+        with open(sdrf_file, "rb") as fi, open_file(compressed_file, "wb", compression="gzip") as fo:
+            shutil.copyfileobj(fi, fo)
+        with SDRFView(compressed_file) as view:
+            self.assertEqual(list(view), read_sdrf_file(sdrf_file)[0])
+
+    def test_line_breaks(self):
+        # Files with CR+LF or only CR (old Mac/Excel exports) as line breaks
+        with open(os.path.join(self.test_data, "E-MTAB-4250.sdrf.txt"), "rb") as fh:
+            content = fh.read()
+        for name, line_break in (("crlf", b"\r\n"), ("cr", b"\r")):
+            sdrf_file = os.path.join(self.wd, "{}.sdrf.txt".format(name))
+            with open(sdrf_file, "wb") as fh:
+                fh.write(content.replace(b"\n", line_break))
+            sdrf_data, header, header_dict = read_sdrf_file(sdrf_file)
+            with SDRFView(sdrf_file) as view:
+                self.assertEqual(len(view), 8)
+                self.assertEqual(list(view), sdrf_data)
+                self.assertEqual(view.header, header)
+                self.assertEqual(view.column(0), [row[0] for row in sdrf_data])
+
+    def test_header_only(self):
+        sdrf_file = os.path.join(self.wd, "empty.sdrf.txt")
+        with open(sdrf_file, "w") as fh:
+            fh.write("Source Name\tCharacteristics[organism]\n")
+        with SDRFView(sdrf_file) as view:
+            self.assertEqual(len(view), 0)
+            self.assertEqual(view.header, ["Source Name", "Characteristics[organism]"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+"""Tests for the generator of synthetic experiments used by the benchmark suite."""
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from tests.synthetic_experiments import SHAPES, SyntheticExperiment, write_envelope, write_magetab
+from utils.converter_utils import guess_submission_type_from_sdrf, read_sdrf_file
+from validator.json_schema_validation import validate_submission_json
+
+
+class TestSyntheticExperiments(unittest.TestCase):
+
+    def setUp(self):
+        self.wd = tempfile.mkdtemp()
+        self.logger = logging.getLogger("test_synthetic_experiments")
+        self.logger.addHandler(logging.NullHandler())
+        self.logger.propagate = False
+
+    def tearDown(self):
+        shutil.rmtree(self.wd)
+
+    def test_sdrf_shapes(self):
+        expected_rows = {"microarray": 6, "sequencing": 12, "droplet": 18, "wide": 6, "processed": 6 * 20}
+        for shape in SHAPES:
+            experiment = SyntheticExperiment(shape, samples=6)
+            write_magetab(experiment, self.wd)
+            sdrf_data, header, header_dict = read_sdrf_file(os.path.join(self.wd, experiment.name + ".sdrf.txt"))
+            self.assertEqual(len(sdrf_data), expected_rows[shape], shape)
+            self.assertEqual(guess_submission_type_from_sdrf(sdrf_data, header, header_dict),
+                             experiment.submission_type)
+            self.assertTrue(all(len(row) == len(header) for row in sdrf_data))
+        wide = SyntheticExperiment("wide", samples=1, characteristics=10)
+        self.assertEqual(len(wide.characteristic_values(0)), 15)
+
+    def test_envelopes_are_valid(self):
+        for shape in SHAPES:
+            json_file = write_envelope(SyntheticExperiment(shape, samples=4), self.wd)
+            self.assertEqual(validate_submission_json(json_file, logger=self.logger), [], shape)
+
+    def test_unknown_shape(self):
+        self.assertRaises(Exception, SyntheticExperiment, "bulk")
+
+
+if __name__ == '__main__':
+    unittest.main()
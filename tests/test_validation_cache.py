@@ -0,0 +1,140 @@
+"""Tests for the content-addressed cache of validation results."""
+
+import logging
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from validator import validation_cache
+from validator.validation_cache import ValidationCache, fingerprint, run_check
+from validator.validation_results import ValidationResults
+
+
+class Item:
+
+    def __init__(self, alias, values):
+        self.alias = alias
+        self.values = values
+
+
+def check_item(item, results):
+    if not item.alias:
+        results.error("ITEM-E01", "Item {} has no name.", item.values)
+
+
+class TestValidationCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.logger = logging.getLogger("validation_cache")
+        self.calls = 0
+
+    def check(self, item):
+        def check_function(results):
+            self.calls += 1
+            check_item(item, results)
+        return check_function
+
+    def run_item_check(self, cache, item):
+        results = ValidationResults(self.logger)
+        run_check(cache, "item", item, self.check(item), results)
+        return results
+
+    def test_fingerprint_depends_on_content(self):
+        self.assertEqual(fingerprint(Item("a", {"x": 1, "y": {2, 1}})), fingerprint(Item("a", {"y": {1, 2}, "x": 1})))
+        self.assertNotEqual(fingerprint(Item("a", {"x": 1})), fingerprint(Item("b", {"x": 1})))
+        self.assertNotEqual(fingerprint("check1", Item("a", {})), fingerprint("check2", Item("a", {})))
+
+    def test_results_are_replayed(self):
+        item = Item("", [1, 2])
+        cache = ValidationCache(cache_dir=self.cache_dir)
+        results = self.run_item_check(cache, item)
+        self.assertEqual(results.codes(), ["ITEM-E01"])
+        cache.save()
+        # A new cache (e.g. in the next run) returns the records without running the check
+        new_cache = ValidationCache(cache_dir=self.cache_dir)
+        replayed = self.run_item_check(new_cache, item)
+        self.assertEqual([r.to_dict() for r in replayed], [r.to_dict() for r in results])
+        self.assertEqual(replayed.records[0].message, "Item [1, 2] has no name.")
+        self.assertEqual(self.calls, 1)
+        self.assertEqual((new_cache.hits, new_cache.misses), (1, 0))
+
+    def test_changed_object_is_checked_again(self):
+        item = Item("a", [])
+        cache = ValidationCache(cache_dir=self.cache_dir)
+        self.run_item_check(cache, item)
+        item.alias = ""
+        self.assertEqual(self.run_item_check(cache, item).codes(), ["ITEM-E01"])
+        self.assertEqual(self.calls, 2)
+
+    def test_other_version_is_not_used(self):
+        item = Item("a", [])
+        cache = ValidationCache(version="1", cache_dir=self.cache_dir)
+        self.run_item_check(cache, item)
+        cache.save()
+        self.run_item_check(ValidationCache(version="2", cache_dir=self.cache_dir), item)
+        self.assertEqual(self.calls, 2)
+
+    def test_old_and_other_version_entries_are_dropped(self):
+        old_cache = ValidationCache(version="1", cache_dir=self.cache_dir)
+        self.run_item_check(old_cache, Item("a", []))
+        old_cache.save()
+        cache = ValidationCache(version="2", cache_dir=self.cache_dir, max_entries=2)
+        for alias in ("b", "c", "d"):
+            self.run_item_check(cache, Item(alias, []))
+        cache.save()
+        # Only the two newest records of the current version are kept
+        self.assertEqual(len(ValidationCache(version="2", cache_dir=self.cache_dir).store), 2)
+        self.run_item_check(cache, Item("d", []))
+        self.assertEqual(self.calls, 4)
+        self.run_item_check(cache, Item("b", []))
+        self.assertEqual(self.calls, 5)
+
+    def test_failed_lookups_are_not_cached(self):
+        def check_with_lookup(results):
+            self.calls += 1
+            results.lookup_failed("Could not retrieve the allowed terms.")
+
+        cache = ValidationCache(cache_dir=self.cache_dir)
+        for _ in range(2):
+            results = ValidationResults(self.logger)
+            with self.assertLogs(self.logger, "WARNING"):
+                run_check(cache, "lookup", Item("a", []), check_with_lookup, results, lookups=True)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(len(cache.store), 0)
+
+    def test_vocabulary_version(self):
+        item = Item("a", [])
+        cache = ValidationCache(cache_dir=self.cache_dir)
+        for version in ("online", "snapshot 2020-01", "snapshot 2020-01", "snapshot 2020-02"):
+            with mock.patch.object(validation_cache, "get_vocabulary_version", return_value=version):
+                run_check(cache, "item", item, self.check(item), ValidationResults(self.logger), lookups=True)
+        # Checks with look-ups are run again with another snapshot
+        self.assertEqual(self.calls, 3)
+        with mock.patch.object(validation_cache, "get_vocabulary_version", return_value="snapshot 2020-03"):
+            # Checks without look-ups don't depend on the snapshot
+            self.run_item_check(cache, item)
+            self.run_item_check(cache, item)
+        self.assertEqual(self.calls, 4)
+
+    def test_counts_from_several_threads(self):
+        cache = ValidationCache(cache_dir=self.cache_dir)
+        items = [Item(str(i), []) for i in range(50)]
+        threads = [threading.Thread(target=lambda: [self.run_item_check(cache, item) for item in items])
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(cache.hits + cache.misses, 400)
+
+    def test_without_cache(self):
+        item = Item("a", [])
+        self.run_item_check(None, item)
+        self.run_item_check(None, item)
+        self.assertEqual(self.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
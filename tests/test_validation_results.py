@@ -0,0 +1,67 @@
+"""Tests for the structured collection of validation findings."""
+
+import io
+import json
+import logging
+import unittest
+
+from validator.validation_results import ValidationResults, LoggerSink, JSONLinesSink, SummarySink
+
+
+class FormatCounter:
+    """Value that counts how often it is formatted into a message."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __format__(self, format_spec):
+        self.count += 1
+        return "value"
+
+
+class TestValidationResults(unittest.TestCase):
+
+    def setUp(self):
+        self.results = ValidationResults()
+        self.results.error("PROT-E04", "Protocol name \"{}\" is not unique.", "P-1", ref="P-1")
+        self.results.warning("DATA-W01", "Experiment does not have processed data.")
+        self.results.info("Found factor \"immunoprecipitate\". This doesn't need to vary.")
+        self.results.error("PROT-E04", "Protocol name \"{}\" is not unique.", "P-2", ref="P-2")
+
+    def test_codes(self):
+        self.assertEqual(self.results.codes(), ["PROT-E04", "DATA-W01", "PROT-E04"])
+        self.assertEqual(self.results.codes(start=1), ["DATA-W01", "PROT-E04"])
+        self.assertEqual(self.results.unique_codes(), ["PROT-E04", "DATA-W01"])
+
+    def test_messages_are_only_formatted_for_enabled_levels(self):
+        value = FormatCounter()
+        results = ValidationResults()
+        results.debug("Found taxon ID: {}", value)
+        results.error("SAMP-E08", "Organism \"{}\" was not found in NCBI taxonomy.", value)
+        logger = logging.getLogger("validation_results")
+        logger.setLevel(logging.INFO)
+        with self.assertLogs(logger, level="INFO") as logs:
+            results.write(LoggerSink(logger))
+        self.assertEqual(logs.output, ["ERROR:validation_results:Organism \"value\" was not found in NCBI taxonomy."])
+        self.assertEqual(value.count, 1)
+        # Counting the codes does not format any message
+        results.write(SummarySink())
+        self.assertEqual(value.count, 1)
+
+    def test_json_lines_sink(self):
+        fh = io.StringIO()
+        self.results.write(JSONLinesSink(fh, min_severity=logging.WARNING))
+        lines = [json.loads(line) for line in fh.getvalue().splitlines()]
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[0], {"code": "PROT-E04", "severity": "ERROR", "ref": "P-1",
+                                    "message": "Protocol name \"P-1\" is not unique."})
+
+    def test_summary_sink(self):
+        summary = SummarySink()
+        self.results.write(summary)
+        self.assertEqual(summary.summary()["codes"], {"DATA-W01": 1, "PROT-E04": 2})
+        self.assertEqual(summary.summary()["severities"], {"ERROR": 2, "WARNING": 1, "INFO": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
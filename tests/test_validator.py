@@ -1,10 +1,14 @@
 import os
+import tempfile
 import unittest
 import logging
 
 import datamodel
 from converter.magetab2dm import data_objects_from_magetab
 from validator import metadata_validation
+from validator.validation_results import ValidationResults
+import build_vocabulary_snapshot
+from utils import vocabulary_snapshot
 from utils.converter_utils import guess_submission_type_from_sdrf, guess_submission_type_from_idf, \
     read_sdrf_file, read_idf_file
 
@@ -174,6 +178,48 @@ class TestMetaDataValidation(unittest.TestCase):
         error_codes = metadata_validation.run_file_checks(self.sub, self.logger)
         self.assertIn('DATA-E07', error_codes)
 
+    def test_incremental_validation(self):
+        cache = metadata_validation.create_validation_cache(tempfile.mkdtemp())
+        error_codes = metadata_validation.run_protocol_checks(self.sub, self.logger, cache)
+        self.assertEqual(error_codes, [])
+        # Second run takes all results from the cache
+        misses = cache.misses
+        self.assertEqual(metadata_validation.run_protocol_checks(self.sub, self.logger, cache), [])
+        self.assertEqual(cache.misses, misses)
+        # Only the changed protocol is checked again
+        self.sub.protocol[1].protocol_type.value = "nonexiting protocol"
+        error_codes = metadata_validation.run_protocol_checks(self.sub, self.logger, cache)
+        self.assertEqual(error_codes, ["PROT-E05"])
+        self.assertEqual(cache.misses, misses + 1)
+        # Cross-object checks are done for all protocols
+        self.sub.protocol[0].alias = "P-MTAB-48204"
+        error_codes = metadata_validation.run_protocol_checks(self.sub, self.logger, cache)
+        self.assertIn("PROT-E04", error_codes)
+
+
+class TestOfflineValidation(unittest.TestCase):
+
+    def setUp(self):
+        # Snapshot without the descendants of the unit term
+        self.snapshot_file = os.path.join(tempfile.mkdtemp(), "snapshot.json.gz")
+        build_vocabulary_snapshot.write_snapshot({
+            "format_version": vocabulary_snapshot.FORMAT_VERSION, "version": "test", "created": "",
+            "term_descendants": {}, "term_parents": {}, "taxa": {}, "term_ontologies": {},
+            "ontology_source_files": {}, "ena_library_terms": {}, "ena_instrument_models": []}, self.snapshot_file)
+        vocabulary_snapshot.set_offline(self.snapshot_file)
+        self.logger = logging.getLogger("test_validator")
+
+    def tearDown(self):
+        vocabulary_snapshot.set_online()
+
+    def test_term_missing_from_snapshot(self):
+        # The unit check is skipped with a warning
+        results = ValidationResults(self.logger)
+        with self.assertLogs(self.logger, "WARNING") as logs:
+            metadata_validation.check_units(["kilogram", "xxx"], results)
+        self.assertEqual(results.codes(), [])
+        self.assertTrue(any("skipping the check of the unit terms" in line for line in logs.output))
+
 
 if __name__ == '__main__':
     unittest.main()
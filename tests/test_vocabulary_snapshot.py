@@ -0,0 +1,94 @@
+"""Tests for the offline mode with a vocabulary snapshot."""
+
+import logging
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import build_vocabulary_snapshot as builder
+from utils import common_utils, converter_utils, http_transport, vocabulary_snapshot
+from utils.converter_utils import ontology_term
+
+
+def snapshot_content():
+    unit_term = ontology_term("unit")
+    design_term = ontology_term("study_design")
+    return {"format_version": vocabulary_snapshot.FORMAT_VERSION, "version": "test", "created": "",
+            "term_descendants": {
+                vocabulary_snapshot.term_key(unit_term["ontology"], unit_term["uri"]): ["hour", "day", "kilogram"],
+                vocabulary_snapshot.term_key(design_term["ontology"], design_term["uri"]): ["case control design"]},
+            "term_parents": {vocabulary_snapshot.term_key("efo", "kilogram"): "mass unit"},
+            "taxa": {"Offline test organism": 12345},
+            "term_ontologies": {"http://purl.obolibrary.org/obo/UBERON_0002107": "UBERON"},
+            "ontology_source_files": {"UBERON": "http://purl.obolibrary.org/obo/uberon.owl"},
+            "ena_library_terms": {"library_layout": ["SINGLE", "PAIRED"]},
+            "ena_instrument_models": ["Illumina HiSeq 2500"]}
+
+
+class TestOfflineMode(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshot_file = os.path.join(tempfile.mkdtemp(), "snapshot.json.gz")
+        builder.write_snapshot(snapshot_content(), self.snapshot_file)
+        self.logger = logging.getLogger("test_vocabulary_snapshot")
+
+    def tearDown(self):
+        vocabulary_snapshot.set_online()
+
+    def test_lookups_from_snapshot(self):
+        vocabulary_snapshot.set_offline(self.snapshot_file)
+        unit_term = ontology_term("unit")
+        self.assertEqual(common_utils.get_term_descendants(unit_term["ontology"], unit_term["uri"], self.logger),
+                         {"hour", "day", "kilogram"})
+        self.assertEqual(common_utils.get_term_parent("efo", "kilogram"), "mass unit")
+        self.assertEqual(converter_utils.get_taxon("offline test organism", self.logger), 12345)
+        self.assertIsNone(converter_utils.get_taxon("Offline unknown organism", self.logger))
+        self.assertEqual(common_utils.lookup_ontology_from_term_url("http://purl.obolibrary.org/obo/UBERON_0002107"),
+                         "UBERON")
+        # Term URLs that are not in the snapshot get the prefix of the accession
+        self.assertEqual(common_utils.lookup_ontology_from_term_url("http://purl.obolibrary.org/obo/CL_0000312"),
+                         "CL")
+        self.assertEqual(common_utils.get_ontology_source_file("uberon"), "http://purl.obolibrary.org/obo/uberon.owl")
+        self.assertIn("PAIRED", common_utils.get_ena_library_terms_via_usi(self.logger)["library_layout"])
+        self.assertEqual(common_utils.get_ena_instrument_terms_via_usi(self.logger), ["Illumina HiSeq 2500"])
+        self.assertRaises(http_transport.OfflineError, common_utils.download_json, self.logger, "https://www.ebi.ac.uk")
+
+    def test_missing_terms(self):
+        vocabulary_snapshot.set_offline(self.snapshot_file)
+        role_term = ontology_term("role")
+        with self.assertLogs(self.logger, "ERROR") as logs:
+            self.assertIsNone(common_utils.get_term_descendants(role_term["ontology"], role_term["uri"], self.logger))
+        self.assertIn("build_vocabulary_snapshot.py", logs.output[0])
+        with self.assertLogs(level="WARNING") as logs:
+            self.assertIsNone(common_utils.get_term_parent("efo", "gram"))
+        self.assertIn("build_vocabulary_snapshot.py", logs.output[0])
+
+    def test_outdated_snapshot(self):
+        content = snapshot_content()
+        content["format_version"] = 0
+        builder.write_snapshot(content, self.snapshot_file + ".old")
+        self.assertRaises(Exception, vocabulary_snapshot.set_offline, self.snapshot_file + ".old")
+        self.assertFalse(vocabulary_snapshot.is_offline())
+
+    def test_build_snapshot(self):
+        library_terms = {"library_layout": ["SINGLE"]}
+        with mock.patch.object(common_utils, "get_term_descendants", return_value={"day", "hour"}), \
+                mock.patch.object(common_utils, "get_term_parent", return_value="time unit"), \
+                mock.patch.object(common_utils, "get_ena_library_terms_via_usi", return_value=library_terms), \
+                mock.patch.object(common_utils, "get_ena_instrument_terms_via_usi",
+                                  return_value=["Illumina HiSeq 2500"]), \
+                mock.patch.object(converter_utils, "get_taxon",
+                                  side_effect=lambda o, _: 9606 if o == "Homo sapiens" else None), \
+                mock.patch.object(common_utils, "get_ontology_source_file", side_effect=lambda o: o.lower() + ".owl"):
+            content = builder.build_snapshot("1", ["Homo sapiens", "Unknown organism"], ["EFO"], self.logger)
+        snapshot = vocabulary_snapshot.VocabularySnapshot(content)
+        self.assertEqual(snapshot.taxa, {"homo sapiens": 9606})
+        self.assertEqual(snapshot.parent("EFO", "day"), "time unit")
+        self.assertEqual(snapshot.ontology_source_file("efo"), "efo.owl")
+        unit_term = ontology_term("unit")
+        self.assertEqual(snapshot.descendants(unit_term["ontology"], unit_term["uri"]), {"day", "hour"})
+
+
+if __name__ == '__main__':
+    unittest.main()
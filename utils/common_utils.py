@@ -1,46 +1,43 @@
 import logging
 import os.path
 import urllib
-import requests
 import json
 import sys
 
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 from utils.converter_utils import get_term_from_url, get_ontology_from_term
+from utils.http_transport import http_get
+from utils.logging_utils import configure_logger, log_file_path
+from utils.lookup_cache import get_lookup_cache
+from utils.profiling import timed
+from utils.vocabulary_snapshot import get_snapshot
 
 
-def create_logger(working_dir, process_name, object_name, log_level=20, logger_name=""):
-
-    # Need to give getLogger file_path (name) argument - so that it creates a unique logger for a given file_path
-    log_file_name = "{}_{}_{}.log".format(process_name, object_name, datetime.now().strftime('%Y-%m-%d'))
-    log_file_path = os.path.join(working_dir, log_file_name)
-    logger = logging.getLogger(logger_name)
+# Term URLs in these namespaces can be assigned to an ontology without looking them up in OLS
+TERM_URL_NAMESPACES = {
+    "http://www.ebi.ac.uk/efo/": "EFO",
+    "https://www.ebi.ac.uk/efo/": "EFO"
+}
 
-    # Logger level: 10=DEBUG, 20=INFO, 30=WARNING, 40=ERROR, 50=CRITICAL)
-    # If not specified, default is INFO
-    logger.setLevel(log_level)
+OLS_API_URL = "https://www.ebi.ac.uk/ols/api/"
+USI_SEQUENCING_EXPERIMENTS_URL = "https://submission-dev.ebi.ac.uk/api/dataTypes/sequencingExperiments"
 
-    # This handler is for writing to the log file
-    hdlr = logging.FileHandler(log_file_path)
-    formatter = logging.Formatter('%(asctime)s %(name)s %(levelname)s: %(message)s')
-    hdlr.setFormatter(formatter)
-    logger.addHandler(hdlr)
 
-    # Create second handler for simultaneous console logging (with shorter prompt)
-    stream_hdlr = logging.StreamHandler()
-    formatter = logging.Formatter('%(name)s %(levelname)-8s %(message)s')
-    stream_hdlr.setFormatter(formatter)
-    logger.addHandler(stream_hdlr)
+def create_logger(working_dir, process_name, object_name, log_level=20, logger_name=""):
+    """Return the logger with the given name, writing to the console and a log file in the working directory.
+    The handlers are shared (see utils.logging_utils), so calling this again for the same logger (e.g. for
+    each experiment in a batch) does not add more handlers. The logger then writes to the new log file."""
 
-    return logger
+    log_file = log_file_path(working_dir, process_name, object_name)
+    return configure_logger(logger_name, log_level, log_file=log_file)
 
 
+@timed()
 def query_ols(api_url, param, logger):
     """Basic function to query OLS API"""
 
-    base_url = "https://www.ebi.ac.uk/ols/api/"
-    url = base_url + api_url
+    url = OLS_API_URL + api_url
     data = download_json(logger, url, param)
     return data
 
@@ -55,6 +52,10 @@ def url_encode_for_ols(term_url):
 def get_ontology_source_file(ontology_acronym):
     """Look up OLS to find the source file for a given ontology"""
 
+    snapshot = get_snapshot()
+    if snapshot:
+        return snapshot.ontology_source_file(ontology_acronym)
+
     api_url = "ontologies/{}".format(ontology_acronym)
     data = query_ols(api_url, {}, logging.getLogger())
     if data:
@@ -68,25 +69,91 @@ def get_ontology_source_file(ontology_acronym):
 def get_ontology_from_term_url(term_url):
     """Return the ontology for a given ontology term URL
 
-    First try finding the term in EFO, if it is not there,
-    use the first bit of the term accession
+    First try to infer the ontology from the URL namespace. Otherwise look up the term in EFO,
+    if it is not there, use the first bit of the term accession.
+    Results of the look-ups are stored in the "term_ontologies" cache.
 
     :param term_url: URL for an ontology term in OLS
     :return: the name of the ontology that the term comes from
     """
 
+    if not term_url:
+        return None
+    ontology = guess_ontology_from_term_url(term_url)
+    if ontology:
+        return ontology
+    term_ontologies = get_lookup_cache("term_ontologies")
+    if term_url in term_ontologies:
+        return term_ontologies.get(term_url)
+    ontology, answered = query_term_ontology(term_url)
+    # The prefix guessed after a server error is not stored, so the term is looked up again in the next run
+    if ontology and answered:
+        term_ontologies.set(term_url, ontology)
+    return ontology
+
+
+def guess_ontology_from_term_url(term_url):
+    """Return the ontology for term URLs from a known namespace (see TERM_URL_NAMESPACES), otherwise None.
+    Other OBO term URLs can't be assigned by prefix, as they may be imported into EFO."""
+    for namespace, ontology in TERM_URL_NAMESPACES.items():
+        if term_url.startswith(namespace):
+            return ontology
+
+
+def lookup_ontology_from_term_url(term_url):
+    """Look up a term URL in EFO and return the ontology prefix,
+    or if it is not found in EFO, generate the prefix of the term accession."""
+    return query_term_ontology(term_url)[0]
+
+
+@timed()
+def query_term_ontology(term_url):
+    """Like lookup_ontology_from_term_url, but also return whether the ontology is the answer of OLS
+    (the term was found in EFO or OLS reported that it is not there), rather than a guess after an error.
+
+    :param term_url: URL for an ontology term in OLS
+    :return: tuple of the ontology and a boolean, True if the result can be cached
+    """
+
+    snapshot = get_snapshot()
+    if snapshot:
+        ontology = snapshot.term_ontology(term_url)
+        if ontology:
+            return ontology, True
+        return get_ontology_from_term(get_term_from_url(term_url)), False
+
     # Try first to look up term in EFO
     url_encoded = url_encode_for_ols(term_url)
-    api_url = "ontologies/efo/terms/{}".format(url_encoded)
-    data = query_ols(api_url, {}, logging.getLogger())
+    url = OLS_API_URL + "ontologies/efo/terms/{}".format(url_encoded)
+    status_code, data = download_json_with_status(logging.getLogger(), url)
     if data:
-        try:
-            return data.get("ontology_prefix")
-        except KeyError:
-            logging.error("Failed to receive valid response from OLS searching for {}.".format(term_url))
+        return data.get("ontology_prefix"), True
     # If we haven't found anything in EFO, generate the prefix of the term accession
-    else:
-        return get_ontology_from_term(get_term_from_url(term_url))
+    return get_ontology_from_term(get_term_from_url(term_url)), status_code == 404
+
+
+def resolve_term_url_ontologies(term_urls, max_workers=8):
+    """Find the ontologies for a collection of term URLs in one go.
+    The URLs are deduplicated and only the ones that can't be inferred from the URL or found in the cache
+    are looked up in OLS (in parallel). The results are stored in the "term_ontologies" cache.
+
+    :param term_urls: iterable of ontology term URLs
+    :param max_workers: maximum number of parallel requests
+    :return: dictionary with the term URLs as keys and ontology names as values
+    """
+    term_ontologies = get_lookup_cache("term_ontologies")
+    unique_urls = {url for url in term_urls if url}
+    unresolved = [url for url in unique_urls
+                  if not guess_ontology_from_term_url(url) and url not in term_ontologies]
+    if unresolved:
+        # Other processes may have looked them up in the meantime
+        term_ontologies.load()
+        unresolved = [url for url in unresolved if url not in term_ontologies]
+    if unresolved:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(unresolved))) as executor:
+            # get_ontology_from_term_url adds the results to the cache
+            list(executor.map(get_ontology_from_term_url, unresolved))
+    return {url: get_ontology_from_term_url(url) for url in unique_urls}
 
 
 def get_term_descendants(ontology, term_url, logger):
@@ -101,6 +168,14 @@ def get_term_descendants(ontology, term_url, logger):
     """
 
     logger.propagate = True
+    snapshot = get_snapshot()
+    if snapshot:
+        terms = snapshot.descendants(ontology, term_url)
+        if terms is None:
+            logger.error("The descendants of {} are not in the vocabulary snapshot {}. The snapshot is incomplete, "
+                         "please build it again with build_vocabulary_snapshot.py.".format(term_url, snapshot.path))
+        return terms
+
     efo_children = set()
 
     url_encoded = url_encode_for_ols(term_url)
@@ -121,10 +196,20 @@ def get_term_descendants(ontology, term_url, logger):
 def get_term_parent(ontology, term):
     """Return the label of the parent term of a given ontology (EFO) term."""
 
+    logger = logging.getLogger()
+    snapshot = get_snapshot()
+    if snapshot:
+        parent = snapshot.parent(ontology, term)
+        if parent is None:
+            logger.warning("The parent of \"{}\" is not in the vocabulary snapshot {}. If it is a {} term, "
+                           "please build the snapshot again with build_vocabulary_snapshot.py.".format(
+                            term, snapshot.path, ontology.upper()))
+        return parent
+
     term_url = ols_lookup(ontology, term)
     url_encoded = url_encode_for_ols(term_url)
     api_url = "ontologies/{}/terms/{}/parents".format(ontology, url_encoded)
-    data = query_ols(api_url, {}, logging.getLogger())
+    data = query_ols(api_url, {}, logger)
     if data:
         try:
             for d in data["_embedded"]["terms"]:
@@ -154,8 +239,11 @@ def get_ena_library_terms_via_usi(logger):
     """Read ENA's controlled vocabulary using USI's API and
     return dictionary of the field names that have a set of allowed values (enum)."""
 
-    url = "https://submission-dev.ebi.ac.uk/api/dataTypes/sequencingExperiments"
-    data = download_json(logger, url)
+    snapshot = get_snapshot()
+    if snapshot:
+        return snapshot.ena_library_terms
+
+    data = download_json(logger, USI_SEQUENCING_EXPERIMENTS_URL)
     if data:
         return {field: description["items"]["properties"]["value"]["enum"]
                 for field, description in data["validationSchema"]["properties"]["attributes"]["properties"].items()
@@ -166,8 +254,11 @@ def get_ena_instrument_terms_via_usi(logger):
     """Read ENA's controlled vocabulary using USI's API and
     return list of the instrument models that are allowed (enum)."""
 
-    url = "https://submission-dev.ebi.ac.uk/api/dataTypes/sequencingExperiments"
-    data = download_json(logger, url)
+    snapshot = get_snapshot()
+    if snapshot:
+        return snapshot.ena_instrument_models
+
+    data = download_json(logger, USI_SEQUENCING_EXPERIMENTS_URL)
     instruments = []
     if data:
         for x in data["validationSchema"]["properties"]["attributes"]["oneOf"]:
@@ -177,13 +268,18 @@ def get_ena_instrument_terms_via_usi(logger):
 
 def download_json(logger, url, parameters=None):
     """Basic function to retrieve URL and return JSON object."""
+    return download_json_with_status(logger, url, parameters)[1]
+
+
+def download_json_with_status(logger, url, parameters=None):
+    """Retrieve URL and return the status code and the JSON object (None if the status is not 200)."""
 
     logger.debug("Calling: " + url)
-    r = requests.get(url, params=parameters)
+    r = http_get(url, params=parameters)
     if r.status_code != 200:
         logger.error("Failed to receive response from {}. Got error: {}.".format(url, r.status_code))
-    else:
-        return json.loads(r.text)
+        return r.status_code, None
+    return r.status_code, json.loads(r.text)
 
 
 def file_exists(input_file):
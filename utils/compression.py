@@ -0,0 +1,109 @@
+"""Module for reading and writing compressed files.
+
+Compressed input is detected from the first bytes of the file (not the file extension), so gzip, bzip2 and
+zstandard compressed MAGE-TAB and JSON files can be read directly, without decompressing them to a temporary file.
+Support for zstandard requires the optional zstandard package.
+"""
+
+import bz2
+import gzip
+import io
+import os
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Magic numbers at the start of the compressed file formats
+MAGIC_NUMBERS = (
+    ("gzip", b"\x1f\x8b"),
+    ("bz2", b"BZh"),
+    ("zstd", b"\x28\xb5\x2f\xfd")
+)
+
+FILE_EXTENSIONS = {
+    "gzip": ".gz",
+    "bz2": ".bz2",
+    "zstd": ".zst"
+}
+
+COMPRESSION_METHODS = tuple(FILE_EXTENSIONS)
+
+
+def detect_compression(filename):
+    """Return the compression method of a file (gzip, bz2 or zstd) or None if the file is not compressed."""
+    with open(filename, "rb") as fh:
+        start = fh.read(4)
+    for method, magic_number in MAGIC_NUMBERS:
+        if start.startswith(magic_number):
+            return method
+
+
+def compressed_file_name(filename, compression=None):
+    """Return the file name with the extension of the compression method added (if it does not have it yet)."""
+    if not compression:
+        return filename
+    check_compression_method(compression)
+    extension = FILE_EXTENSIONS[compression]
+    if filename.endswith(extension):
+        return filename
+    return filename + extension
+
+
+def find_file(filename):
+    """Return the path of the file, or of a compressed version of it (e.g. with .gz extension) if the file itself
+    does not exist. If neither exists, the original path is returned."""
+    if not filename or os.path.exists(filename):
+        return filename
+    for extension in FILE_EXTENSIONS.values():
+        if os.path.exists(filename + extension):
+            return filename + extension
+    return filename
+
+
+def check_compression_method(compression):
+    if compression not in COMPRESSION_METHODS:
+        raise Exception("Unknown compression method \"{}\". Options are: {}".format(
+            compression, ", ".join(COMPRESSION_METHODS)))
+    if compression == "zstd" and zstandard is None:
+        raise Exception("The zstandard package is required for zstd compressed files.")
+
+
+def open_file(filename, mode="r", compression=None, encoding="utf-8", newline=None):
+    """
+    Open a plain or compressed file for streaming reading or writing.
+
+    :param filename: string, path to the file
+    :param mode: string, "r" or "w" for text, "rb" or "wb" for bytes
+    :param compression: (optional) compression method for writing: gzip, bz2 or zstd.
+        When reading, the compression is detected from the file content.
+    :param encoding: string, encoding of text files
+    :param newline: (optional) controls line endings of text files as in the built-in open()
+    :return: file object
+    """
+    reading = mode.startswith("r")
+    binary = "b" in mode
+    if reading:
+        compression = detect_compression(filename)
+    if not compression:
+        if binary:
+            return open(filename, mode)
+        return open(filename, mode, encoding=encoding, newline=newline)
+
+    check_compression_method(compression)
+    binary_mode = "rb" if reading else "wb"
+    if compression == "gzip":
+        stream = gzip.open(filename, binary_mode)
+    elif compression == "bz2":
+        stream = bz2.open(filename, binary_mode)
+    else:
+        fh = open(filename, binary_mode)
+        if reading:
+            stream = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(fh, closefd=True))
+        else:
+            stream = zstandard.ZstdCompressor().stream_writer(fh, closefd=True)
+    if binary:
+        return stream
+    return io.TextIOWrapper(stream, encoding=encoding, newline=newline)
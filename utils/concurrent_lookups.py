@@ -0,0 +1,171 @@
+"""Module for running many remote look-ups (OLS, NCBI taxonomy, USI vocabularies) at the same time.
+
+The look-ups run the functions of utils.common_utils, utils.converter_utils and utils.eutils in a thread pool,
+so they send their requests with the connection pool, time-outs, retries and rate limits of utils.http_transport,
+and the record/replay and offline modes and the look-up caches work as before. The number of requests that
+are sent to a host at the same time is limited per host.
+
+The existing functions keep working as before. To resolve many values in one go, e.g.
+with LookupClient() as client:
+    unit_types = client.look_up_all(lambda unit: client.get_term_parent("efo", unit), units)
+
+Each look-up also has a coroutine version (ending in _async) for code that runs in an asyncio event loop, e.g.
+    unit_types = await client.gather_all(lambda unit: client.get_term_parent_async("efo", unit), units)
+The coroutines wait for a per-host asyncio semaphore and then run the look-up in the same thread pool, so the
+host limits are shared with the blocking methods.
+"""
+
+import asyncio
+import threading
+import weakref
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import common_utils, converter_utils, eutils
+from utils.vocabulary_snapshot import is_offline
+
+
+OLS_HOST = urllib.parse.urlparse(common_utils.OLS_API_URL).netloc
+USI_HOST = urllib.parse.urlparse(common_utils.USI_SEQUENCING_EXPERIMENTS_URL).netloc
+EUTILS_HOST = urllib.parse.urlparse(eutils.BASE_URL).netloc
+
+DEFAULT_HOST_LIMIT = 8
+# Hosts that allow fewer requests at the same time than the default limit
+HOST_LIMITS = {EUTILS_HOST: 3}
+
+
+class LookupClient:
+
+    def __init__(self, host_limit=DEFAULT_HOST_LIMIT, host_limits=None):
+        """
+        Runs look-ups in a thread pool, with a limit on the number of requests that are sent to each host at the
+        same time. Use it as context manager (or call close) so that the threads are stopped when done.
+
+        :param host_limit: maximum number of requests sent to a host at the same time
+        :param host_limits: (optional) dictionary with lower limits of specific hosts, default is HOST_LIMITS
+        """
+        self.host_limit = host_limit
+        self.host_limits = HOST_LIMITS if host_limits is None else host_limits
+        hosts = (OLS_HOST, USI_HOST, EUTILS_HOST)
+        self._semaphores = {host: threading.BoundedSemaphore(self.get_limit(host)) for host in hosts}
+        # The asyncio semaphores of each event loop, by host
+        self._async_semaphores = weakref.WeakKeyDictionary()
+        self._executor = ThreadPoolExecutor(max_workers=sum(self.get_limit(host) for host in hosts))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown()
+
+    def get_limit(self, host):
+        return min(self.host_limit, self.host_limits.get(host, self.host_limit))
+
+    def call(self, host, function, *args):
+        """Run a look-up function once a request to the host can be sent."""
+        if is_offline():
+            # The answers come from the vocabulary snapshot in memory
+            return function(*args)
+        with self._semaphores[host]:
+            return function(*args)
+
+    async def call_async(self, host, function, *args):
+        """Run a look-up function in the thread pool once a request to the host can be sent, without blocking
+        the event loop while waiting."""
+        if is_offline():
+            # The answers come from the vocabulary snapshot in memory
+            return function(*args)
+        # asyncio.get_running_loop is not available in Python 3.6
+        loop = asyncio.get_event_loop()
+        semaphores = self._async_semaphores.setdefault(loop, {})
+        if host not in semaphores:
+            semaphores[host] = asyncio.Semaphore(self.get_limit(host))
+        async with semaphores[host]:
+            return await loop.run_in_executor(self._executor, self.call, host, function, *args)
+
+    def run(self, coroutine):
+        """Run a coroutine of this client in a new event loop and return its result.
+        (asyncio.run is not available in Python 3.6.)"""
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+    async def gather_all(self, lookup, values):
+        """Run the look-up coroutine for all values concurrently and return a dictionary of the values
+        with a result (not None).
+
+        :param lookup: function that takes a value and returns a coroutine of this client
+        :param values: list of values to look up
+        """
+        results = await asyncio.gather(*(lookup(value) for value in values))
+        return OrderedDict((value, result) for value, result in zip(values, results) if result is not None)
+
+    def look_up_all(self, lookup, values):
+        """Run the look-up for all values in the thread pool and return a dictionary of the values
+        with a result (not None).
+
+        :param lookup: function that takes a value and calls a look-up method of this client
+        :param values: list of values to look up
+        """
+        results = list(self._executor.map(lookup, values))
+        return OrderedDict((value, result) for value, result in zip(values, results) if result is not None)
+
+    def query_ols(self, api_url, param, logger):
+        return self.call(OLS_HOST, common_utils.query_ols, api_url, param, logger)
+
+    def ols_lookup(self, ontology, term):
+        return self.call(OLS_HOST, common_utils.ols_lookup, ontology, term)
+
+    def get_term_descendants(self, ontology, term_url, logger):
+        return self.call(OLS_HOST, common_utils.get_term_descendants, ontology, term_url, logger)
+
+    def get_term_parent(self, ontology, term):
+        return self.call(OLS_HOST, common_utils.get_term_parent, ontology, term)
+
+    def get_ontology_source_file(self, ontology):
+        return self.call(OLS_HOST, common_utils.get_ontology_source_file, ontology)
+
+    def esearch(self, db, term):
+        return self.call(EUTILS_HOST, eutils.esearch, db, term)
+
+    def get_taxon(self, organism, logger):
+        return self.call(EUTILS_HOST, converter_utils.get_taxon, organism, logger)
+
+    def get_ena_library_terms(self, logger):
+        return self.call(USI_HOST, common_utils.get_ena_library_terms_via_usi, logger)
+
+    def get_ena_instrument_terms(self, logger):
+        return self.call(USI_HOST, common_utils.get_ena_instrument_terms_via_usi, logger)
+
+    async def query_ols_async(self, api_url, param, logger):
+        return await self.call_async(OLS_HOST, common_utils.query_ols, api_url, param, logger)
+
+    async def ols_lookup_async(self, ontology, term):
+        return await self.call_async(OLS_HOST, common_utils.ols_lookup, ontology, term)
+
+    async def get_term_descendants_async(self, ontology, term_url, logger):
+        return await self.call_async(OLS_HOST, common_utils.get_term_descendants, ontology, term_url, logger)
+
+    async def get_term_parent_async(self, ontology, term):
+        return await self.call_async(OLS_HOST, common_utils.get_term_parent, ontology, term)
+
+    async def get_ontology_source_file_async(self, ontology):
+        return await self.call_async(OLS_HOST, common_utils.get_ontology_source_file, ontology)
+
+    async def esearch_async(self, db, term):
+        return await self.call_async(EUTILS_HOST, eutils.esearch, db, term)
+
+    async def get_taxon_async(self, organism, logger):
+        return await self.call_async(EUTILS_HOST, converter_utils.get_taxon, organism, logger)
+
+    async def get_ena_library_terms_async(self, logger):
+        return await self.call_async(USI_HOST, common_utils.get_ena_library_terms_via_usi, logger)
+
+    async def get_ena_instrument_terms_async(self, logger):
+        return await self.call_async(USI_HOST, common_utils.get_ena_instrument_terms_via_usi, logger)
@@ -1,4 +1,3 @@
-import codecs
 import csv
 import json
 import logging
@@ -7,18 +6,24 @@ import pkg_resources
 import re
 
 from collections import OrderedDict, defaultdict
+from collections.abc import Iterator
 
+from utils.compression import compressed_file_name, find_file, open_file
 from utils.eutils import esearch
+from utils.json_backend import decode_json, encode_json, get_separators
+from utils.profiling import timed
+from utils.vocabulary_snapshot import get_snapshot
 
 
 SDRF_FILE_NAME_REGEX = r"^\s*SDRF\s*File"
 DEFAULT_DATA_DIRECTORY = "unpacked"
 
 
+@timed()
 def read_json_file(filename):
     try:
-        with open(filename) as fh:
-            data = json.load(fh, encoding="utf-8")
+        with open_file(filename, 'rb') as fh:
+            data = decode_json(fh.read())
             return data
     except IOError as err:
         raise Exception("Cannot import file {}: {}".format(filename, err))
@@ -38,13 +43,56 @@ def usi_object_file_name(object_type, study_info):
         print('ERROR: No study name found in study_info.')
 
 
-def write_json_file(wd, json_object, object_type, sub_info):
+def write_json_file(wd, json_object, object_type, sub_info, indent=None, compact=False, compression=None):
 
-    json_file_name = usi_object_file_name(object_type, sub_info)
+    json_file_name = compressed_file_name(usi_object_file_name(object_type, sub_info), compression)
     json_file_path = os.path.join(wd, json_file_name)
     os.makedirs(os.path.dirname(json_file_path), exist_ok=True)
-    with codecs.open(json_file_path, 'w', encoding='utf-8') as jf:
-        json.dump(json_object, jf)
+    with open_file(json_file_path, 'wb', compression=compression) as jf:
+        jf.write(encode_json(json_object, indent=indent, compact=compact))
+
+
+def write_json_stream(wd, json_object, object_type, sub_info, indent=None, compact=False, compression=None):
+    """Write a JSON file incrementally, so that large arrays don't need to be held in memory.
+    The JSON object can be an iterator/generator of objects (written as array, one object at a time),
+    or a dictionary whose values can be such iterators. Otherwise the output is the same as from write_json_file."""
+
+    json_file_name = compressed_file_name(usi_object_file_name(object_type, sub_info), compression)
+    json_file_path = os.path.join(wd, json_file_name)
+    os.makedirs(os.path.dirname(json_file_path), exist_ok=True)
+    with open_file(json_file_path, 'wb', compression=compression) as jf:
+        _dump_stream(json_object, jf, indent, compact)
+
+
+def _dump_stream(json_object, fh, indent=None, compact=False, level=0):
+    if isinstance(json_object, dict):
+        items = json_object.items()
+        start, end = b"{", b"}"
+    elif isinstance(json_object, Iterator):
+        items = ((None, value) for value in json_object)
+        start, end = b"[", b"]"
+    else:
+        encoded = encode_json(json_object, indent=indent, compact=compact)
+        if indent and level:
+            # Shift the nested lines to the current depth
+            encoded = encoded.replace(b"\n", b"\n" + b" " * indent * level)
+        fh.write(encoded)
+        return
+    item_separator, key_separator = get_separators(indent, compact)
+    fh.write(start)
+    empty = True
+    for key, value in items:
+        if not empty:
+            fh.write(item_separator)
+        if indent:
+            fh.write(b"\n" + b" " * indent * (level + 1))
+        if key is not None:
+            fh.write(encode_json(key, compact=compact and not indent) + key_separator)
+        _dump_stream(value, fh, indent, compact, level + 1)
+        empty = False
+    if indent and not empty:
+        fh.write(b"\n" + b" " * indent * level)
+    fh.write(end)
 
 
 def ontology_term(category):
@@ -101,6 +149,7 @@ def is_accession(accession, archive=None):
 organism_lookup = {}
 
 
+@timed()
 def get_taxon(organism, logger=logging.getLogger()):
     """Return the NCBI taxonomy ID for a given species name."""
 
@@ -109,6 +158,14 @@ def get_taxon(organism, logger=logging.getLogger()):
         # sample' taxon_id (c.f. https://www.ncbi.nlm.nih.gov/Taxonomy/Browser/wwwtax.cgi?id=1427524)
         if re.search(r" and | \+ ", organism):
             return 1427524
+        snapshot = get_snapshot()
+        if snapshot:
+            taxon_id = snapshot.taxon(organism)
+            if taxon_id is None:
+                logger.error("Organism {} is not in the vocabulary snapshot.".format(organism))
+            else:
+                organism_lookup[organism] = taxon_id
+            return taxon_id
         logger.info("Looking up species in NCBI taxonomy. Please wait...")
         db = 'taxonomy'
         a = esearch(db=db, term=organism)
@@ -196,21 +253,40 @@ def get_sdrf_path(idf_file_path, logger, data_dir=None):
     :return: path to SDRF file
     """
 
-    current_dir = os.path.dirname(idf_file_path)
-    sdrf_file_path = ""
-    if not data_dir:
-        data_dir = DEFAULT_DATA_DIRECTORY
+    sdrf_file_name = ""
     # Figure out the name and location of sdrf files
-    with codecs.open(idf_file_path, 'rU', encoding='utf-8') as f:
-        # U flag makes it portable across in unix and windows (\n and \r\n are treated the same)
+    with open_file(idf_file_path) as f:
+        # Universal newlines make it portable across in unix and windows (\n and \r\n are treated the same)
         for line in f:
             if re.search(SDRF_FILE_NAME_REGEX, line):
                 sdrf_file_name = line.split('\t')[1].strip()
-                data_path = os.path.join(current_dir, data_dir)
-                if os.path.exists(data_path):
-                    sdrf_file_path = os.path.join(data_path, sdrf_file_name)
-                else:
-                    sdrf_file_path = os.path.join(current_dir, sdrf_file_name)
+
+    return locate_sdrf_file(idf_file_path, sdrf_file_name, logger, data_dir)
+
+
+def locate_sdrf_file(idf_file_path, sdrf_file_name, logger, data_dir=None):
+    """Look for the SDRF with the name given in the IDF in the data directory (i.e. "unpacked")
+    or in the same directory as the IDF.
+
+    :param idf_file_path: full or relative path to IDF file
+    :param sdrf_file_name: the SDRF file name from the IDF
+    :param logger: log handler
+    :param data_dir: path to folder with SDRF
+    :return: path to SDRF file
+    """
+
+    current_dir = os.path.dirname(idf_file_path)
+    sdrf_file_path = ""
+    if not data_dir:
+        data_dir = DEFAULT_DATA_DIRECTORY
+    if sdrf_file_name:
+        data_path = os.path.join(current_dir, data_dir)
+        if os.path.exists(data_path):
+            sdrf_file_path = os.path.join(data_path, sdrf_file_name)
+        else:
+            sdrf_file_path = os.path.join(current_dir, sdrf_file_name)
+    # The SDRF may be stored compressed, e.g. with .gz extension
+    sdrf_file_path = find_file(sdrf_file_path)
     logger.debug("Generated SDRF file path: {}".format(sdrf_file_path))
     if not os.path.exists(sdrf_file_path):
         logger.error("SDRF file {} does not exist".format(sdrf_file_path))
@@ -293,14 +369,15 @@ def get_value(header_string):
     return field_value.strip(']')
 
 
+@timed()
 def read_sdrf_file(sdrf_file):
     """
     Read SDRF file and return the table content as nested list,
     the header row as list, and a dictionary of the fields and their indexes
-    :param sdrf_file: string, path to SDRF file
+    :param sdrf_file: string, path to SDRF file (can be compressed)
     """
 
-    with codecs.open(sdrf_file, encoding='utf-8') as sf:
+    with open_file(sdrf_file, newline='') as sf:
         header = sf.readline().rstrip().split('\t')
         sdrf_raw = sf.readlines()
 
@@ -313,11 +390,13 @@ def read_sdrf_file(sdrf_file):
     return sdrf_list, header, header_dict
 
 
+@timed()
 def read_idf_file(idf_file):
     """This function reads in an IDF file and determines whether it is a normal or a merged file.
-    It then returns the data as a dictionary with the field names as keys and values as list."""
+    It then returns the data as a dictionary with the field names as keys and values as list.
+    The file can be compressed."""
     idf_dict = OrderedDict()
-    with codecs.open(idf_file, encoding='utf-8') as fi:
+    with open_file(idf_file, newline='') as fi:
         idf_raw = fi.readlines()
 
         for row in idf_raw:
@@ -350,13 +429,16 @@ def read_idf_file(idf_file):
     return idf_dict
 
 
-def dict_to_vertical_table(input_dict, filename, logger, sep='\t'):
+@timed()
+def dict_to_vertical_table(input_dict, filename, logger, sep='\t', compression=None):
     """Take a dictionary (can be ordered) and print the contents in a vertical table:
-     The keys are in the first column, with the values in the rest of the row."""
+     The keys are in the first column, with the values in the rest of the row.
+     With the compression option (gzip, bz2 or zstd) the file is written compressed."""
 
+    filename = compressed_file_name(filename, compression)
     logger.debug("Writing new file: {}".format(filename))
     try:
-        with codecs.open(filename, 'w', encoding='utf-8') as out:
+        with open_file(filename, 'w', compression=compression, newline='') as out:
             writer = csv.writer(out, delimiter=sep, lineterminator='\n')
             for key, value in input_dict.items():
                 if isinstance(value, list):
@@ -0,0 +1,65 @@
+"""Module for indexing the data directory of a submission (i.e. "unpacked") in a single pass.
+
+Checking thousands of data files one by one with os.path.exists is slow on network file systems.
+The index is built with one os.scandir walk, and the file checks are then done on the in-memory map.
+"""
+
+import os
+import time
+
+
+class DataDirectoryIndex:
+
+    def __init__(self, data_dir, recursive=True):
+        """
+        Map of the files in a directory to their size and modification time.
+
+        :param data_dir: string, path to the data directory
+        :param recursive: boolean, flag to include files in sub-directories (named by their relative path)
+        """
+        self.data_dir = data_dir
+        self.files = {}
+        start = time.perf_counter()
+        if os.path.isdir(data_dir):
+            self._scan(data_dir, "", recursive)
+        # Time taken to build the index in seconds
+        self.elapsed = time.perf_counter() - start
+
+    def _scan(self, dir_path, prefix, recursive):
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    self.files[prefix + entry.name] = (stat.st_size, stat.st_mtime_ns)
+                elif recursive and entry.is_dir():
+                    self._scan(entry.path, prefix + entry.name + "/", recursive)
+
+    def __contains__(self, name):
+        return name in self.files
+
+    def __len__(self):
+        return len(self.files)
+
+    def size(self, name):
+        """Return the size of a file in bytes, or None if it is not in the directory."""
+        entry = self.files.get(name)
+        return entry[0] if entry else None
+
+    def compare(self, file_names, ignore=()):
+        """Compare the directory with the file names from the metadata.
+
+        :param file_names: iterable of file names (relative to the data directory)
+        :param ignore: names of other files that are expected in the directory (e.g. the SDRF)
+        :return: sorted lists of the missing files, the empty files and the files in the directory that are not named
+        """
+        referenced = set(file_names)
+        missing = []
+        empty = []
+        for name in referenced:
+            entry = self.files.get(name)
+            if entry is None:
+                missing.append(name)
+            elif entry[0] == 0:
+                empty.append(name)
+        unreferenced = [name for name in self.files if name not in referenced and name not in ignore]
+        return sorted(missing), sorted(empty), sorted(unreferenced)
@@ -1,7 +1,7 @@
 import json
 import time
 
-import requests
+from utils.http_transport import http_get
 
 __author__ = 'Ahmed G. Ali'
 
@@ -25,7 +25,7 @@ def esearch(db, term, history=False):
     data = {'db': db, 'term': term, 'retmode': 'json'}
     if history:
         data['usehistory'] = 'y'
-    r = requests.get(url, params=data)
+    r = http_get(url, params=data)
     if 'Error 503' in r.text:
         print('eutils gave Error 503. Waiting 20 secs then trying again')
         time.sleep(20)
@@ -46,7 +46,7 @@ def efetch(db, ids):
     """
     url = BASE_URL + 'efetch.fcgi'
     data = {'db': db, 'id': ','.join(ids)}
-    r = requests.get(url, params=data)
+    r = http_get(url, params=data)
     if 'Error 503' in r.text:
         print('eutils gave Error 503. Waiting 20 secs then trying again')
         time.sleep(20)
@@ -74,7 +74,7 @@ def esummary(db, query_id, web_env, ret_start=0, ret_max=500):
     url = BASE_URL + 'esummary.fcgi'
     data = {'db': db, 'query_key': query_id, 'WebEnv': web_env, 'retmode': 'json', 'retstart': ret_start,
             'retmax': ret_max}
-    r = requests.get(url, params=data)
+    r = http_get(url, params=data)
     if 'Error 503' in r.text:
         print('eutils gave Error 503. Waiting 20 secs then trying again')
         time.sleep(20)
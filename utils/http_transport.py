@@ -0,0 +1,189 @@
+"""Module for sending the GET requests of the remote look-ups (OLS, NCBI eutils, USI), with record and replay modes.
+
+In "live" mode (the default) the requests are sent to the services. In "record" mode the responses are also
+written to a local store, and in "replay" mode they are only read from the store, without any network access.
+This makes benchmarks reproducible and lets the look-ups run where the services can't be reached.
+Responses with a server error (5xx) are not recorded, as they are usually temporary.
+
+The mode and the store directory are taken from environment variables (so that worker processes use the same
+settings), or can be set with set_transport_mode. In offline mode (see utils.vocabulary_snapshot) no request is
+sent, whatever the mode.
+
+The requests of a process share one session, which keeps the connections to each host open between requests.
+Requests time out after DEFAULT_TIMEOUT seconds, and connection errors and temporary server errors are retried.
+Requests to the hosts in HOST_INTERVALS are spaced out to stay within the rate limit of the service (per process,
+batch worker processes each keep their own spacing).
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.lookup_cache import get_cache_dir
+from utils.profiling import count, count_request
+from utils.vocabulary_snapshot import is_offline
+
+
+MODE_VARIABLE = "USI_AE_HTTP_MODE"
+STORE_VARIABLE = "USI_AE_HTTP_STORE"
+MODES = ("live", "record", "replay")
+
+# Seconds to wait for the connection and for each read of the response
+DEFAULT_TIMEOUT = 60
+# Failed requests are sent again up to RETRIES times, waiting 0.5, 1, 2... seconds in between
+RETRIES = 3
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# Number of open connections that are kept per host
+POOL_SIZE = 16
+# Minimum seconds between the requests to a host, NCBI eutils allows 3 requests per second without an API key
+HOST_INTERVALS = {"eutils.ncbi.nlm.nih.gov": 1 / 3}
+
+_settings = {}
+_session = {}
+# Time (time.monotonic) from which the next request can be sent, by host
+_next_request = {}
+_lock = threading.Lock()
+
+
+class ResponseNotRecorded(Exception):
+    pass
+
+
+class OfflineError(Exception):
+    pass
+
+
+class RecordedResponse:
+
+    def __init__(self, url, status_code, text):
+        """Response read from the store, with the attributes of a requests.Response that are used here."""
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+
+    @property
+    def content(self):
+        return self.text.encode("utf-8")
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def set_transport_mode(mode=None, store_dir=None):
+    """Set the mode and the store directory for this process. None resets them to the environment variables.
+
+    :param mode: string, "live", "record" or "replay"
+    :param store_dir: (optional) directory of the recorded responses, default is "http" in the cache directory
+    """
+    if mode is not None and mode not in MODES:
+        raise Exception("Unknown HTTP transport mode \"{}\", expected one of {}.".format(mode, ", ".join(MODES)))
+    with _lock:
+        _settings["mode"] = mode
+        _settings["store_dir"] = store_dir
+
+
+def get_transport_mode():
+    mode = _settings.get("mode") or os.environ.get(MODE_VARIABLE) or "live"
+    if mode not in MODES:
+        raise Exception("Unknown HTTP transport mode \"{}\", expected one of {}.".format(mode, ", ".join(MODES)))
+    return mode
+
+
+def get_store_dir():
+    return _settings.get("store_dir") or os.environ.get(STORE_VARIABLE) or os.path.join(get_cache_dir(), "http")
+
+
+def request_key(url, params=None):
+    """Return the name of the stored response of a request (a hash of the URL with the sorted parameters)."""
+    query = urllib.parse.urlencode(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+    return hashlib.sha1("GET {}?{}".format(url, query).encode("utf-8")).hexdigest()
+
+
+def get_session():
+    """Return the session of this process, which is created on first use (also in each worker process,
+    as open connections can't be shared with a forked process)."""
+    with _lock:
+        if _session.get("pid") != os.getpid():
+            session = requests.Session()
+            retries = Retry(total=RETRIES, backoff_factor=0.5, status_forcelist=RETRY_STATUS_CODES,
+                            raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retries)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session.update(pid=os.getpid(), session=session)
+        return _session["session"]
+
+
+def wait_for_host(url):
+    """Wait until the next request to the host of the URL can be sent (see HOST_INTERVALS).
+    Each request reserves its time under the lock, so that concurrent threads are spaced out as well."""
+    host = urllib.parse.urlparse(url).netloc
+    interval = HOST_INTERVALS.get(host)
+    if not interval:
+        return
+    with _lock:
+        now = time.monotonic()
+        start = max(now, _next_request.get(host, now))
+        _next_request[host] = start + interval
+    if start > now:
+        time.sleep(start - now)
+
+
+def send_request(url, params=None):
+    """Send a GET request with the session of this process."""
+    wait_for_host(url)
+    return get_session().get(url, params=params, timeout=DEFAULT_TIMEOUT)
+
+
+def http_get(url, params=None):
+    """Send a GET request, or read its response from the store in replay mode.
+
+    :param url: string, URL of the request
+    :param params: (optional) dictionary with the query parameters
+    :return: requests.Response object (live and record mode) or RecordedResponse object (replay mode)
+    """
+    if is_offline():
+        raise OfflineError("Network access is disabled in offline mode, requested {}.".format(url))
+    mode = get_transport_mode()
+    if mode == "replay":
+        response = read_response(url, params)
+    else:
+        response = send_request(url, params)
+        if mode == "record" and response.status_code < 500:
+            write_response(url, params, response)
+    # All requests are counted by the host of the service, also when they are replayed
+    count_request(urllib.parse.urlparse(url).netloc, response)
+    return response
+
+
+def read_response(url, params=None):
+    """Return the stored response of a request. Raises ResponseNotRecorded if it has not been recorded."""
+    file_path = os.path.join(get_store_dir(), request_key(url, params) + ".json")
+    try:
+        with open(file_path, encoding="utf-8") as fh:
+            stored = json.load(fh)
+    except (OSError, ValueError):
+        raise ResponseNotRecorded("No recorded response for {} with parameters {}.".format(url, params or {}))
+    count("HTTP responses replayed")
+    return RecordedResponse(stored["url"], stored["status_code"], stored["text"])
+
+
+def write_response(url, params, response):
+    """Write the response of a request to the store. The file is replaced in one go, so that concurrent
+    readers never see a partially written response."""
+    store_dir = get_store_dir()
+    os.makedirs(store_dir, exist_ok=True)
+    stored = {"url": url, "params": params or {}, "status_code": response.status_code, "text": response.text}
+    fd, tmp_path = tempfile.mkstemp(dir=store_dir, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as fh:
+        json.dump(stored, fh)
+    os.replace(tmp_path, os.path.join(store_dir, request_key(url, params) + ".json"))
+    count("HTTP responses recorded")
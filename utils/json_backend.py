@@ -0,0 +1,116 @@
+"""Module for encoding and decoding JSON with the fastest available library.
+
+orjson or ujson are used if they are installed, otherwise the standard library json module.
+The backend can be chosen with the environment variable USI_AE_JSON_BACKEND or with set_json_backend().
+
+Output formatting:
+- default: ", " and ": " separators and non-ASCII characters escaped (as json.dump)
+- indent: pretty printed with the given number of spaces, otherwise as the default
+- compact: no whitespace
+The default and indented output is always written by the standard library, so that the files are the same
+whichever libraries are installed. The faster libraries are only used for compact output (which keeps
+non-ASCII characters unescaped) and for decoding.
+"""
+
+import json
+import os
+
+from collections import OrderedDict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+JSON_BACKEND_VARIABLE = "USI_AE_JSON_BACKEND"
+STDLIB_BACKEND = "json"
+
+# In order of preference
+BACKENDS = OrderedDict([
+    ("orjson", orjson),
+    ("ujson", ujson),
+    (STDLIB_BACKEND, json)
+])
+
+_backend = None
+
+
+def available_backends():
+    """Return the names of the JSON libraries that are installed."""
+    return [name for name, module in BACKENDS.items() if module is not None]
+
+
+def get_json_backend():
+    """Return the name of the JSON library in use. On first call this is taken from the environment variable
+    or the fastest available library."""
+    global _backend
+    if _backend is None:
+        set_json_backend(os.environ.get(JSON_BACKEND_VARIABLE))
+    return _backend
+
+
+def set_json_backend(name=None):
+    """Select the JSON library to use, or the fastest available library if no name is given."""
+    global _backend
+    if not name:
+        name = available_backends()[0]
+    if name not in BACKENDS:
+        raise Exception("Unknown JSON backend \"{}\". Options are: {}".format(name, ", ".join(BACKENDS)))
+    if BACKENDS[name] is None:
+        raise Exception("JSON backend \"{}\" is not installed.".format(name))
+    _backend = name
+
+
+def encode_json(json_object, indent=None, compact=False, backend=None):
+    """
+    Serialise an object to UTF-8 encoded JSON.
+
+    :param json_object: the object to serialise, dictionaries (including OrderedDicts) keep their key order
+    :param indent: (optional) number of spaces to indent nested structures
+    :param compact: boolean, flag to write without any whitespace
+    :param backend: (optional) name of the JSON library, default is the one from get_json_backend()
+    :return: bytes
+    """
+    compact = compact and not indent
+    backend = backend or get_json_backend()
+    try:
+        if compact and backend == "orjson":
+            return orjson.dumps(json_object, option=orjson.OPT_NON_STR_KEYS)
+        elif compact and backend == "ujson":
+            return ujson.dumps(json_object, ensure_ascii=False, escape_forward_slashes=False).encode("utf-8")
+    except (TypeError, OverflowError):
+        # The standard library handles some types the other libraries do not support (e.g. very large integers)
+        pass
+    separators = (",", ":") if compact else None
+    return json.dumps(json_object, indent=indent, separators=separators).encode("utf-8")
+
+
+def get_separators(indent=None, compact=False):
+    """Return the item and key separators (as bytes) that encode_json uses for the given formatting."""
+    if indent:
+        return b",", b": "
+    if compact:
+        return b",", b":"
+    return b", ", b": "
+
+
+def decode_json(data, backend=None):
+    """
+    Parse JSON from bytes or a string.
+
+    :param data: bytes or string with the JSON content
+    :param backend: (optional) name of the JSON library, default is the one from get_json_backend()
+    :return: the decoded object
+    """
+    backend = backend or get_json_backend()
+    if backend == "orjson":
+        return orjson.loads(data)
+    elif backend == "ujson":
+        return ujson.loads(data)
+    return json.loads(data)
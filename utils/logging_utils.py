@@ -0,0 +1,199 @@
+"""Module for setting up the loggers of the conversion and validation scripts.
+
+Each configured logger has a list of sinks (handlers): a log file and/or the console. The handlers are shared,
+so loggers writing to the same file use one open file, and configuring a logger again replaces its sinks instead
+of adding more handlers. Log files that are no longer used by any logger are closed.
+
+With asynchronous logging, the loggers only put the records on a queue and a single listener thread writes
+them to the sinks, so that slow file or console output does not hold up the conversion or validation.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime
+
+
+FILE_FORMAT = '%(asctime)s %(name)s %(levelname)s: %(message)s'
+CONSOLE_FORMAT = '%(name)s %(levelname)-8s %(message)s'
+
+_lock = threading.RLock()
+# The sinks of the configured loggers by logger name
+_sinks = {}
+# Shared handlers: one per log file path and one for the console
+_file_handlers = {}
+_console_handler = None
+# Queue, listener thread and a queue handler per logger for asynchronous logging
+_queue = None
+_queue_listener = None
+_queue_handlers = {}
+
+
+def log_file_path(working_dir, process_name, object_name):
+    """Return the path of the log file for a process and the object (e.g. IDF file) it works on."""
+    log_file_name = "{}_{}_{}.log".format(process_name, object_name, datetime.now().strftime('%Y-%m-%d'))
+    return os.path.join(working_dir, log_file_name)
+
+
+def get_file_handler(file_path):
+    """Return the handler writing to the given log file, opening the file on first use."""
+    file_path = os.path.abspath(file_path)
+    with _lock:
+        if file_path not in _file_handlers:
+            handler = logging.FileHandler(file_path)
+            handler.setFormatter(logging.Formatter(FILE_FORMAT))
+            _file_handlers[file_path] = handler
+        return _file_handlers[file_path]
+
+
+def get_console_handler():
+    """Return the handler for console logging (with shorter prompt)."""
+    global _console_handler
+    with _lock:
+        if _console_handler is None:
+            _console_handler = logging.StreamHandler()
+            _console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        return _console_handler
+
+
+def configure_logger(logger_name="", log_level=20, log_file=None, console=True):
+    """Set the level and sinks of a logger. Calling this again for the same logger replaces its sinks.
+
+    :param logger_name: string, name of the logger (empty for the root logger)
+    :param log_level: integer, 10=DEBUG, 20=INFO, 30=WARNING, 40=ERROR, 50=CRITICAL
+    :param log_file: (optional) path of the log file
+    :param console: boolean, flag to also log to the console
+    :return: the logger
+    """
+    sinks = []
+    if log_file:
+        sinks.append(get_file_handler(log_file))
+    if console:
+        sinks.append(get_console_handler())
+    logger = logging.getLogger(logger_name)
+    logger.setLevel(log_level)
+    set_sinks(logger_name, sinks)
+    return logger
+
+
+def set_sinks(logger_name, handlers):
+    """Replace the sinks of a logger with the given handlers."""
+    with _lock:
+        _sinks[logger_name] = list(handlers)
+        _attach(logger_name)
+        _close_unused_files()
+
+
+def _attach(logger_name):
+    """Add the sinks (or the queue handler if logging is asynchronous) to the logger and remove other handlers
+    that were set up by this module."""
+    logger = logging.getLogger(logger_name)
+    managed = set(_file_handlers.values()) | set(_queue_handlers.values()) | {_console_handler}
+    if _queue_listener:
+        if logger_name not in _queue_handlers:
+            _queue_handlers[logger_name] = _SinkQueueHandler(_queue, logger_name)
+        wanted = [_queue_handlers[logger_name]]
+    else:
+        wanted = _sinks.get(logger_name, [])
+    for handler in list(logger.handlers):
+        if handler in managed and handler not in wanted:
+            logger.removeHandler(handler)
+    for handler in wanted:
+        if handler not in logger.handlers:
+            logger.addHandler(handler)
+
+
+def _close_unused_files():
+    used = {h for handlers in _sinks.values() for h in handlers}
+    unused = [file_path for file_path, handler in _file_handlers.items() if handler not in used]
+    handlers = [_file_handlers.pop(file_path) for file_path in unused]
+    if not handlers:
+        return
+    if _queue_listener:
+        # The files are closed by the listener thread, after the records queued before have been written
+        _queue.put(_CloseRequest(handlers))
+    else:
+        for handler in handlers:
+            handler.close()
+
+
+class _CloseRequest:
+
+    def __init__(self, handlers):
+        self.handlers = handlers
+
+
+class _SinkQueueHandler(logging.handlers.QueueHandler):
+
+    def __init__(self, log_queue, logger_name):
+        """Queue handler that adds the current sinks of the logger to the records."""
+        super().__init__(log_queue)
+        self.logger_name = logger_name
+
+    def prepare(self, record):
+        record = super().prepare(record)
+        record.sinks = tuple(_sinks.get(self.logger_name, ()))
+        return record
+
+
+class _SinkRouter(logging.Handler):
+
+    def handle(self, record):
+        """Pass a record from the queue on to the sinks of the logger it was logged to."""
+        if isinstance(record, _CloseRequest):
+            for handler in record.handlers:
+                handler.close()
+            return True
+        for handler in record.sinks:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        return True
+
+
+def start_async_logging():
+    """Log asynchronously: the configured loggers put their records on a queue that is written by a separate thread.
+    Loggers configured later are also set up this way. The queue is emptied at exit (or with stop_async_logging)."""
+    global _queue, _queue_listener
+    with _lock:
+        if _queue_listener:
+            return
+        _queue = queue.Queue(-1)
+        _queue_listener = logging.handlers.QueueListener(_queue, _SinkRouter())
+        _queue_listener.start()
+        for logger_name in _sinks:
+            _attach(logger_name)
+    atexit.register(stop_async_logging)
+
+
+def stop_async_logging():
+    """Write all queued records and go back to logging directly to the sinks."""
+    global _queue, _queue_listener
+    with _lock:
+        if not _queue_listener:
+            return
+        listener = _queue_listener
+        _queue_listener = None
+        for logger_name in _sinks:
+            _attach(logger_name)
+        _queue_handlers.clear()
+    # Records that are still in the queue are written before the thread ends
+    listener.stop()
+    _queue = None
+
+
+class ExperimentLoggerAdapter(logging.LoggerAdapter):
+
+    def process(self, msg, kwargs):
+        return "[{}] {}".format(self.extra["experiment"], msg), kwargs
+
+
+def experiment_logger(logger, experiment):
+    """Return a logger that prefixes all messages with the name of the experiment (e.g. in batch processing).
+
+    :param logger: log handler
+    :param experiment: string, accession or file name of the experiment
+    """
+    return ExperimentLoggerAdapter(logger, {"experiment": experiment})
@@ -0,0 +1,132 @@
+"""Module with a simple key/value store for the results of remote look-ups (e.g. OLS or taxonomy requests).
+
+The caches are kept in memory and shared by everything running in the same process. They can be written
+to a JSON file in the cache directory, so that other processes (or the next run) can start with the
+values that have already been looked up.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+
+
+# The location of the persistent cache files can be changed with this environment variable
+CACHE_DIR_VARIABLE = "USI_AE_CACHE_DIR"
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "usi-arrayexpress")
+
+# Storing the caches by name so that the same object is returned for every call within a process
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache_dir():
+    """Return the directory for persistent cache files."""
+    return os.environ.get(CACHE_DIR_VARIABLE, DEFAULT_CACHE_DIR)
+
+
+def get_lookup_cache(name, seed=None):
+    """Return the process-wide cache with the given name, creating it on first use.
+
+    :param name: string, name of the cache, also used for the name of the cache file
+    :param seed: (optional) dictionary with known values to initialise a new cache with
+    :return: LookupCache object
+    """
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = LookupCache(name, seed=seed)
+        return _caches[name]
+
+
+def save_lookup_caches():
+    """Write the new values of all caches in this process to their cache files."""
+    with _caches_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.save()
+
+
+class LookupCache:
+
+    def __init__(self, name, seed=None, cache_dir=None, prune=None):
+        """
+        Thread-safe dictionary of look-up results that can be persisted to a JSON file.
+        Seed values are never written to the cache file, only values that have been added later.
+
+        :param name: string, name of the cache, the cache file is called "<name>.json"
+        :param seed: (optional) dictionary with known values, e.g. from a bundled resource file
+        :param cache_dir: (optional) directory of the cache file, default is taken from get_cache_dir()
+        :param prune: (optional) function that takes the dictionary of all values and returns the ones to keep,
+            it is applied when the cache is saved
+        """
+        self.name = name
+        self.prune = prune
+        self.cache_dir = cache_dir or get_cache_dir()
+        self.values = dict(seed or {})
+        self.new_values = {}
+        self.lock = threading.Lock()
+        self.load()
+
+    @property
+    def file_path(self):
+        return os.path.join(self.cache_dir, "{}.json".format(self.name))
+
+    def __contains__(self, key):
+        return key in self.values
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def set(self, key, value):
+        """Add a value to the cache. It will be written to the cache file with the next call of save()."""
+        with self.lock:
+            self.values[key] = value
+            self.new_values[key] = value
+
+    def load(self):
+        """Read previously saved values from the cache file (if there is one)."""
+        stored = self._read_file()
+        with self.lock:
+            self.values.update(stored)
+
+    def save(self):
+        """Merge the values added in this process with the content of the cache file and write it back.
+        The file is replaced in one go, so that other processes never read a partially written file."""
+        with self.lock:
+            if not self.new_values:
+                return
+            new_values = dict(self.new_values)
+            self.new_values.clear()
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            stored = self._read_file()
+            stored.update(new_values)
+            if self.prune:
+                stored = self.prune(stored)
+                with self.lock:
+                    self.values = self.prune(self.values)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=self.name, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                    json.dump(stored, fh)
+                os.replace(tmp_path, self.file_path)
+            except Exception:
+                os.remove(tmp_path)
+                raise
+        except (OSError, TypeError, ValueError) as e:
+            # Keep the values for the next call of save(), unless they have been set again in the meantime
+            with self.lock:
+                for key, value in new_values.items():
+                    self.new_values.setdefault(key, value)
+            logging.getLogger().warning("Failed to write cache file {}: {}".format(self.file_path, str(e)))
+
+    def _read_file(self):
+        try:
+            with open(self.file_path, encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {}
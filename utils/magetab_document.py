@@ -0,0 +1,98 @@
+"""Module with a loader that reads the IDF and SDRF of a MAGE-TAB submission only once.
+
+The parsed content is cached in the MageTabDocument object and shared by submission type detection,
+prevalidation and conversion to the common data model.
+"""
+
+import logging
+
+from utils.converter_utils import read_idf_file, locate_sdrf_file, guess_submission_type_from_sdrf, \
+    guess_submission_type_from_idf
+from utils.sdrf_columns import read_sdrf_columns
+from utils.sdrf_view import read_sdrf_view
+
+
+class MageTabDocument:
+
+    def __init__(self, idf_file, sdrf_file=None, data_dir=None, logger=None, interned=False):
+        """
+        Lazy loader for a MAGE-TAB IDF/SDRF pair, each file is read the first time its content is needed.
+        Use it as context manager (or call close) so that the SDRF file is closed when done.
+
+        :param idf_file: string, path to the IDF file
+        :param sdrf_file: (optional) path to the SDRF file, by default the SDRF named in the IDF is used
+        :param data_dir: (optional) directory with the SDRF, relative to the IDF's directory
+        :param logger: (optional) log handler
+        :param interned: boolean, flag to load the SDRF into a dictionary-encoded SDRFColumnStore
+            (instead of the memory-mapped SDRFView), which is faster if the rows are accessed repeatedly
+        """
+        self.idf_file = idf_file
+        self.data_dir = data_dir
+        self.logger = logger or logging.getLogger()
+        self.interned = interned
+        self._sdrf_file = sdrf_file
+        self._idf_dict = None
+        self._sdrf_table = None
+        self._submission_type = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """Close the SDRF file (the memory map of the SDRFView). The rows can't be read afterwards."""
+        sdrf_rows = self._sdrf_table[0] if self._sdrf_table else None
+        if hasattr(sdrf_rows, "close"):
+            sdrf_rows.close()
+
+    @property
+    def idf_dict(self):
+        """The IDF fields and their values as returned by read_idf_file."""
+        if self._idf_dict is None:
+            self.logger.debug("Reading IDF file {}".format(self.idf_file))
+            self._idf_dict = read_idf_file(self.idf_file)
+        return self._idf_dict
+
+    @property
+    def sdrf_file(self):
+        """Path to the SDRF file, taken from the IDF's SDRF File field if not given."""
+        if self._sdrf_file is None:
+            sdrf_file_name = next((name.strip() for name in self.idf_dict.get("sdrffile", []) if name.strip()), "")
+            self._sdrf_file = locate_sdrf_file(self.idf_file, sdrf_file_name, self.logger, self.data_dir)
+        return self._sdrf_file
+
+    @property
+    def sdrf_table(self):
+        """Tuple of the SDRF rows, header and header dictionary. The rows are a memory-mapped SDRFView
+        that is split into strings as rows or columns are accessed (or an SDRFColumnStore if interned)."""
+        if self._sdrf_table is None:
+            self.logger.debug("Reading SDRF file {}".format(self.sdrf_file))
+            if self.interned:
+                self._sdrf_table = read_sdrf_columns(self.sdrf_file)
+            else:
+                self._sdrf_table = read_sdrf_view(self.sdrf_file)
+        return self._sdrf_table
+
+    @property
+    def sdrf_data(self):
+        return self.sdrf_table[0]
+
+    @property
+    def header(self):
+        return self.sdrf_table[1]
+
+    @property
+    def header_dict(self):
+        return self.sdrf_table[2]
+
+    @property
+    def submission_type(self):
+        """The submission type (microarray, sequencing or singlecell) guessed from the SDRF or the IDF."""
+        if self._submission_type is None:
+            self._submission_type = guess_submission_type_from_sdrf(self.sdrf_data, self.header, self.header_dict)
+            if not self._submission_type:
+                self._submission_type = guess_submission_type_from_idf(self.idf_dict)
+            self.logger.debug("Found experiment type: {}".format(self._submission_type))
+        return self._submission_type
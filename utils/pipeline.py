@@ -0,0 +1,186 @@
+"""Module for running a sequence of processing stages (e.g. parse, validate, write) on a queue of experiments.
+
+Each stage has its own workers and a bounded input queue, so the stages overlap: while one experiment is being
+validated (waiting for remote look-ups), the next one can be parsed and the previous one written. When a queue
+is full, the stage before it waits (backpressure), so that a slow stage does not pile up parsed submissions
+in memory. Stages with CPU-bound work can run their function in worker processes.
+
+A failure in a stage only affects the experiment being processed: it is recorded in the experiment's result
+and the experiment skips the remaining stages.
+"""
+
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+
+DEFAULT_QUEUE_SIZE = 4
+
+# Put in the queue of a stage when there are no more items
+_DONE = object()
+
+
+class Stage:
+
+    def __init__(self, name, function, workers=1, processes=False, queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        Step of a pipeline.
+
+        :param name: string, name of the stage used in the results and statistics
+        :param function: function that takes the output of the previous stage (or the input item for the first stage)
+                         and returns the input for the next stage. With processes, it has to be defined at module level.
+        :param workers: number of items that are processed at the same time
+        :param processes: boolean, flag to run the function in a pool of worker processes instead of threads
+        :param queue_size: number of items that can wait for this stage
+        """
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.processes = processes
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.executor = None
+        self.lock = threading.Lock()
+        self.running_workers = 0
+        # Counters
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.max_queue = 0
+
+    def stats(self, elapsed):
+        """Return the counters of the stage, with the throughput over the given wall time in seconds."""
+        return OrderedDict([
+            ("processed", self.processed),
+            ("failed", self.failed),
+            ("busy_seconds", self.busy_seconds),
+            ("throughput_per_second", self.processed / elapsed if elapsed else None),
+            # Busy time relative to the time all workers were available, high values show the bottleneck
+            ("utilisation", self.busy_seconds / (elapsed * self.workers) if elapsed else None),
+            ("max_queue", self.max_queue)
+        ])
+
+
+class Pipeline:
+
+    def __init__(self, stages):
+        """
+        Runs items through a list of stages, see Stage.
+
+        :param stages: list of Stage objects in the order they are applied
+        """
+        self.stages = stages
+        self.output = queue.Queue()
+        self.elapsed = 0.0
+        self.feed_error = None
+
+    def run(self, items):
+        """Process the items and return an iterator of the results, in the order they are completed.
+
+        :param items: iterable of input items (e.g. file paths), read as the first stage has room for them
+        :return: iterator of result dictionaries with the item, status ("completed" or "failed"), the output of the
+                 last stage (value), the name of the stage that failed, the error and the seconds spent in each stage
+        :raises: the error of the items iterable, after the items read before it have been processed
+        """
+        start = time.perf_counter()
+        self.feed_error = None
+        threads = [threading.Thread(target=self._feed, args=(items,), daemon=True)]
+        for i, stage in enumerate(self.stages):
+            if stage.processes:
+                stage.executor = ProcessPoolExecutor(max_workers=stage.workers)
+            next_stage = self.stages[i + 1] if i + 1 < len(self.stages) else None
+            stage.running_workers = stage.workers
+            threads.extend(threading.Thread(target=self._work, args=(stage, next_stage), daemon=True)
+                           for _ in range(stage.workers))
+        for thread in threads:
+            thread.start()
+        finished = False
+        try:
+            while True:
+                result = self.output.get()
+                if result is _DONE:
+                    finished = True
+                    break
+                yield result
+        finally:
+            # If the caller stops reading the results, the items already read are still processed
+            while not finished:
+                finished = self.output.get() is _DONE
+            for thread in threads:
+                thread.join()
+            for stage in self.stages:
+                if stage.executor:
+                    stage.executor.shutdown()
+                    stage.executor = None
+            self.elapsed = time.perf_counter() - start
+        if self.feed_error is not None:
+            raise self.feed_error
+
+    def stats(self):
+        """Return the counters of all stages (after run has finished)."""
+        return OrderedDict((stage.name, stage.stats(self.elapsed)) for stage in self.stages)
+
+    def _feed(self, items):
+        first_stage = self.stages[0]
+        try:
+            for item in items:
+                result = {"item": item, "status": "completed", "value": item, "stage": None, "error": None,
+                          "seconds": OrderedDict()}
+                self._put(first_stage, result)
+        except Exception as e:
+            # Raised by run once the workers have stopped
+            self.feed_error = e
+        finally:
+            for _ in range(first_stage.workers):
+                first_stage.queue.put(_DONE)
+
+    def _put(self, stage, result):
+        # Blocks while the queue of the stage is full
+        stage.queue.put(result)
+        size = stage.queue.qsize()
+        with stage.lock:
+            stage.max_queue = max(stage.max_queue, size)
+
+    def _work(self, stage, next_stage):
+        while True:
+            result = stage.queue.get()
+            if result is _DONE:
+                break
+            if result["status"] == "completed":
+                self._process(stage, result)
+            if next_stage:
+                self._put(next_stage, result)
+            else:
+                self.output.put(result)
+        # The last worker of a stage tells the workers of the next stage that there are no more items
+        with stage.lock:
+            stage.running_workers -= 1
+            last = stage.running_workers == 0
+        if last:
+            if next_stage:
+                for _ in range(next_stage.workers):
+                    next_stage.queue.put(_DONE)
+            else:
+                self.output.put(_DONE)
+
+    def _process(self, stage, result):
+        start = time.perf_counter()
+        try:
+            if stage.executor:
+                result["value"] = stage.executor.submit(stage.function, result["value"]).result()
+            else:
+                result["value"] = stage.function(result["value"])
+        except Exception as e:
+            result["status"] = "failed"
+            result["stage"] = stage.name
+            result["error"] = "{}: {}".format(type(e).__name__, str(e))
+            result["value"] = None
+        seconds = time.perf_counter() - start
+        result["seconds"][stage.name] = seconds
+        with stage.lock:
+            stage.busy_seconds += seconds
+            if result["status"] == "failed":
+                stage.failed += 1
+            else:
+                stage.processed += 1
@@ -0,0 +1,193 @@
+"""Module with lightweight timers and counters to see where the time goes in a conversion or validation.
+
+Functions are timed with the timed decorator and blocks of code with the stage context manager, and network
+requests are counted with count_request. Nothing is recorded until profiling is enabled, so that otherwise the
+instrumentation only costs a flag check per call. The timers are inclusive (a function's time includes the
+time of the timed functions it calls) and only cover the current process (not batch worker processes).
+
+Optionally, a cProfile profile and a tracemalloc snapshot (memory allocations) can be written to files.
+"""
+
+import cProfile
+import functools
+import sys
+import threading
+import time
+import tracemalloc
+
+
+_enabled = False
+_lock = threading.Lock()
+# Number of calls and total seconds by timer name
+_timers = {}
+# Values of the counters by name
+_counters = {}
+_started = None
+_stopped = None
+_profiler = None
+_cprofile_file = None
+_tracemalloc_file = None
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable(cprofile_file=None, tracemalloc_file=None):
+    """Start recording timers and counters.
+
+    :param cprofile_file: (optional) path to write the cProfile statistics to when profiling is stopped
+    :param tracemalloc_file: (optional) path to write a tracemalloc snapshot to when profiling is stopped
+    """
+    global _enabled, _started, _stopped, _profiler, _cprofile_file, _tracemalloc_file
+    reset()
+    _started = time.perf_counter()
+    _stopped = None
+    _cprofile_file = cprofile_file
+    _tracemalloc_file = tracemalloc_file
+    if tracemalloc_file:
+        tracemalloc.start()
+    if cprofile_file:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    _enabled = True
+
+
+def disable():
+    """Stop recording and write the cProfile statistics and tracemalloc snapshot (if they were requested)."""
+    global _enabled, _stopped, _profiler
+    _enabled = False
+    _stopped = time.perf_counter()
+    if _profiler:
+        _profiler.disable()
+        _profiler.dump_stats(_cprofile_file)
+        _profiler = None
+    if tracemalloc.is_tracing() and _tracemalloc_file:
+        tracemalloc.take_snapshot().dump(_tracemalloc_file)
+        tracemalloc.stop()
+
+
+def reset():
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+
+def add_time(name, seconds):
+    with _lock:
+        timer = _timers.setdefault(name, [0, 0.0])
+        timer[0] += 1
+        timer[1] += seconds
+
+
+def count(name, value=1):
+    """Add to a counter (only if profiling is enabled)."""
+    if _enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + value
+
+
+def count_request(service, response):
+    """Count a network request and the size of the response.
+
+    :param service: string, name of the remote service, the host name for the requests of utils.http_transport
+    :param response: requests.Response object
+    """
+    if _enabled:
+        count("{} requests".format(service))
+        count("{} bytes received".format(service), len(response.content))
+
+
+def timed(name=None):
+    """Decorator that records the number of calls and the time spent in a function.
+
+    :param name: (optional) name of the timer, default is the module and name of the function
+    """
+    def decorator(function):
+        timer_name = name or "{}.{}".format(function.__module__.split(".")[-1], function.__name__)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                add_time(timer_name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class _StageTimer:
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        add_time(self.name, time.perf_counter() - self.start)
+
+
+class _NoTimer:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+def stage(name):
+    """Context manager that records the time spent in a block of code, e.g. with stage("read SDRF"): ..."""
+    return _StageTimer(name) if _enabled else _NO_TIMER
+
+
+def report():
+    """Return the timers (sorted by total time) and counters as a printable table."""
+    wall = (_stopped or time.perf_counter()) - _started if _started else 0.0
+    with _lock:
+        timers = sorted(_timers.items(), key=lambda item: item[1][1], reverse=True)
+        counters = sorted(_counters.items())
+    width = max([len(name) for name, _ in timers + counters] + [5])
+    lines = ["{:<{w}}  {:>8}  {:>10}  {:>10}  {:>6}".format("Stage", "Calls", "Total (s)", "Mean (ms)", "Wall %",
+                                                            w=width)]
+    for name, (calls, seconds) in timers:
+        lines.append("{:<{w}}  {:>8}  {:>10.3f}  {:>10.3f}  {:>6.1f}".format(
+            name, calls, seconds, seconds * 1000 / calls, 100 * seconds / wall if wall else 0.0, w=width))
+    lines.append("{:<{w}}  {:>8}  {:>10.3f}".format("Wall time", "", wall, w=width))
+    if counters:
+        lines.append("")
+        lines.append("{:<{w}}  {:>8}".format("Counter", "Value", w=width))
+        lines.extend("{:<{w}}  {:>8}".format(name, value, w=width) for name, value in counters)
+    return "\n".join(lines)
+
+
+def add_profile_arguments(parser):
+    """Add the profiling options to the argument parser of a script."""
+    parser.add_argument('--profile', action='store_true',
+                        help="Print the time spent in each stage and the number of network requests at the end")
+    parser.add_argument('--cprofile', metavar='FILE',
+                        help="With --profile, write cProfile statistics to the file (e.g. for snakeviz or pstats)")
+    parser.add_argument('--tracemalloc', metavar='FILE',
+                        help="With --profile, write a tracemalloc snapshot of the memory allocations to the file")
+
+
+def start_profiling(args):
+    """Enable profiling if the --profile option of the script is set."""
+    if args.profile:
+        enable(cprofile_file=args.cprofile, tracemalloc_file=args.tracemalloc)
+
+
+def finish_profiling(args, output=None):
+    """Stop profiling and print the report (to stderr by default) if the --profile option of the script is set."""
+    if args.profile:
+        disable()
+        print(report(), file=output or sys.stderr)
@@ -0,0 +1,109 @@
+"""Module with a dictionary-encoded column store for parsed SDRF tables.
+
+SDRF columns are very repetitive (organism, protocol refs, units, term sources, technology type...).
+The column store keeps every distinct cell value once in a string table that is shared by all columns,
+and each column as a compact array of integer codes into that table. Rows are returned as lists of the
+shared string objects, so the dictionaries built by the parser don't hold copies of the same values either.
+"""
+
+from array import array
+from collections import defaultdict
+from collections.abc import Sequence
+
+from utils.converter_utils import get_name
+from utils.profiling import timed
+from utils.sdrf_view import SDRFView
+
+
+class SDRFColumnStore(Sequence):
+
+    def __init__(self, header):
+        """
+        Sequence of SDRF data rows (without the header), stored as integer codes per column.
+        Use add_row() or from_rows() to fill the store.
+
+        :param header: list, the SDRF header row
+        """
+        self.header = header
+        self.header_dict = defaultdict(list)
+        for i, field in enumerate(header):
+            self.header_dict[get_name(field)].append(i)
+        # The shared string table and the reverse look-up
+        self.strings = [""]
+        self.codes = {"": 0}
+        self.columns = [array("I") for _ in header]
+        # Number of cells in each row, so that short rows are returned as they were read
+        self.row_lengths = array("I")
+
+    @classmethod
+    def from_rows(cls, rows, header):
+        """Create a column store from an iterable of rows (lists of strings), e.g. an SDRFView.
+        The look-up table for encoding is released afterwards, as the store is not expected to grow."""
+        store = cls(header)
+        for row in rows:
+            store.add_row(row)
+        store.release_lookup()
+        return store
+
+    def encode(self, value):
+        """Return the code of a string, adding it to the string table if it is new."""
+        if self.codes is None:
+            self.codes = {string: code for code, string in enumerate(self.strings)}
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.strings)
+            self.codes[value] = code
+            self.strings.append(value)
+        return code
+
+    def release_lookup(self):
+        """Free the reverse look-up of the string table (it is rebuilt if more rows are added)."""
+        self.codes = None
+
+    def add_row(self, row):
+        row_number = len(self.row_lengths)
+        # Rows can be longer than the header, add empty columns for the previous rows
+        while len(self.columns) < len(row):
+            self.columns.append(array("I", [0]) * row_number)
+        encode = self.encode
+        for column, value in zip(self.columns, row):
+            column.append(encode(value))
+        # Short rows are padded with empty values
+        for column in self.columns[len(row):]:
+            column.append(0)
+        self.row_lengths.append(len(row))
+
+    def __len__(self):
+        return len(self.row_lengths)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("SDRF row index out of range")
+        strings = self.strings
+        return [strings[column[index]] for column in self.columns[:self.row_lengths[index]]]
+
+    def column(self, column_index):
+        """Return the values of one column as a list of strings."""
+        strings = self.strings
+        return [strings[code] for code in self.columns[column_index]]
+
+    def unique_values(self, column_index):
+        """Return the distinct values of a column, in order of first occurrence."""
+        strings = self.strings
+        return [strings[code] for code in dict.fromkeys(self.columns[column_index])]
+
+
+@timed()
+def read_sdrf_columns(sdrf_file):
+    """Like read_sdrf_file, but return the rows in a dictionary-encoded SDRFColumnStore.
+
+    :param sdrf_file: string, path to SDRF file (can be compressed)
+    :return: SDRFColumnStore, the header row as list, and a dictionary of the fields and their indexes
+    """
+    with SDRFView(sdrf_file) as view:
+        store = SDRFColumnStore.from_rows(view, view.header)
+    return store, store.header, store.header_dict
@@ -0,0 +1,140 @@
+"""Module with a memory-mapped, read-only view of an SDRF file.
+
+Instead of splitting every line into Python strings up front (as read_sdrf_file does), the view only indexes
+the line offsets and splits a row when it is accessed. Single columns can be read without splitting the rest
+of the line. Compressed files cannot be memory-mapped, in that case the decompressed bytes are kept in memory.
+"""
+
+import mmap
+import re
+from array import array
+from collections import defaultdict
+from collections.abc import Sequence
+
+from utils.compression import detect_compression, open_file
+from utils.converter_utils import get_name
+from utils.profiling import timed
+
+
+# Line breaks recognised like the universal newlines of read_sdrf_file (e.g. CR only in old Mac/Excel exports)
+LINE_BREAK = re.compile(rb"\r\n?|\n")
+
+
+class SDRFView(Sequence):
+
+    def __init__(self, sdrf_file):
+        """
+        Sequence of the SDRF data rows (without the header), each row is returned as list of strings
+        like the rows from read_sdrf_file.
+
+        :param sdrf_file: string, path to SDRF file (can be compressed)
+        """
+        self.sdrf_file = sdrf_file
+        self._file = None
+        if detect_compression(sdrf_file):
+            with open_file(sdrf_file, "rb") as fh:
+                self._buffer = fh.read()
+        else:
+            self._file = open(sdrf_file, "rb")
+            try:
+                self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files cannot be mapped
+                self._buffer = b""
+        self._offsets = self._index_lines()
+        header_end = self._offsets[1] if len(self._offsets) > 1 else len(self._buffer)
+        self.header = self._buffer[:header_end].decode("utf-8").rstrip().split("\t")
+        self.header_dict = defaultdict(list)
+        for i, field in enumerate(self.header):
+            self.header_dict[get_name(field)].append(i)
+
+    def _index_lines(self):
+        """Return the start offsets of all lines (the first one being the header) and the end of the buffer.
+        Lines end with LF, CR+LF or CR, files without CR are indexed with the faster search for LF only."""
+        offsets = array("q", [0])
+        buffer = self._buffer
+        end = len(buffer)
+        if buffer.find(b"\r") == -1:
+            position = buffer.find(b"\n")
+            while position != -1 and position + 1 < end:
+                offsets.append(position + 1)
+                position = buffer.find(b"\n", position + 1)
+        else:
+            offsets.extend(m.end() for m in LINE_BREAK.finditer(buffer) if m.end() < end)
+        offsets.append(end)
+        return offsets
+
+    def __len__(self):
+        return max(len(self._offsets) - 2, 0)
+
+    def _line(self, index):
+        # Data row i is line i + 1 of the file
+        start = self._offsets[index + 1]
+        end = self._offsets[index + 2]
+        return self._buffer[start:end].decode("utf-8").rstrip("\n")
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("SDRF row index out of range")
+        return self._line(index).split("\t")
+
+    def __iter__(self):
+        return self.rows()
+
+    def rows(self, last_column=None):
+        """Iterate over the rows. With last_column, the lines are only split up to that column
+        (the remainder of the line is the last list item), for readers that don't need the columns after it."""
+        max_split = last_column + 1 if last_column is not None else -1
+        for i in range(len(self)):
+            yield self._line(i).split("\t", max_split)
+
+    def column(self, column_index):
+        """Return the values of one column, only splitting the lines up to that column.
+        Rows that are too short give an empty value."""
+        values = []
+        for i in range(len(self)):
+            cells = self._line(i).split("\t", column_index + 1)
+            values.append(cells[column_index] if len(cells) > column_index else "")
+        return values
+
+    def select(self, column_indexes):
+        """Iterate over the rows, returning only the values of the given columns (as tuples)."""
+        column_indexes = list(column_indexes)
+        max_split = max(column_indexes) + 1 if column_indexes else 0
+        for i in range(len(self)):
+            cells = self._line(i).split("\t", max_split)
+            yield tuple(cells[c] if len(cells) > c else "" for c in column_indexes)
+
+    def close(self):
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        if self._file:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+@timed()
+def read_sdrf_view(sdrf_file):
+    """Like read_sdrf_file, but return a lazy SDRFView instead of the nested list of rows.
+
+    :param sdrf_file: string, path to SDRF file
+    :return: SDRFView, the header row as list, and a dictionary of the fields and their indexes
+    """
+    view = SDRFView(sdrf_file)
+    return view, view.header, view.header_dict
+
+
+def get_column(sdrf_rows, column_index):
+    """Return the values of one column from an SDRFView (or other column based reader) or a nested list of rows."""
+    if hasattr(sdrf_rows, "column"):
+        return sdrf_rows.column(column_index)
+    return [row[column_index] for row in sdrf_rows]
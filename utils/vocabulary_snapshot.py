@@ -0,0 +1,142 @@
+"""Module for the offline mode, in which the remote look-ups are answered from a local snapshot of the vocabularies.
+
+The snapshot is built with build_vocabulary_snapshot.py while the services can be reached. It contains the
+descendants of the EFO terms used by the checks (units, study designs, contact roles), the parents of the unit
+terms (for the unit types), ENA's library and instrument vocabularies from USI, the NCBI taxonomy IDs of
+organisms, the ontologies of term URLs and the source files of ontologies. It is read once and kept in memory
+as dictionaries, so every look-up is a single dictionary access. In offline mode no requests are sent at all
+(see utils.http_transport).
+
+The offline mode is stored in an environment variable, so that batch worker processes use it as well.
+"""
+
+import json
+import os
+import threading
+
+from utils.compression import open_file
+from utils.lookup_cache import get_cache_dir
+
+
+# Version of the structure of the snapshot file, snapshots of other versions have to be built again
+FORMAT_VERSION = 1
+OFFLINE_VARIABLE = "USI_AE_OFFLINE_SNAPSHOT"
+DEFAULT_SNAPSHOT_NAME = "vocabulary_snapshot.json.gz"
+
+_snapshots = {}
+_lock = threading.Lock()
+
+
+def get_default_snapshot_path():
+    return os.path.join(get_cache_dir(), DEFAULT_SNAPSHOT_NAME)
+
+
+def term_key(ontology, term):
+    """Return the key of a term (URL or label) of an ontology in the snapshot."""
+    return "{}|{}".format(ontology.lower(), term)
+
+
+class VocabularySnapshot:
+
+    def __init__(self, content, path=None):
+        """
+        Look-up results from a snapshot file, indexed in memory.
+
+        :param content: dictionary with the sections of the snapshot (see build_vocabulary_snapshot.py)
+        :param path: (optional) path of the snapshot file, used in messages
+        """
+        self.path = path
+        if content.get("format_version") != FORMAT_VERSION:
+            raise Exception("The vocabulary snapshot has format version {}, expected {}. Please build it again.".format(
+                content.get("format_version"), FORMAT_VERSION))
+        self.version = content.get("version")
+        self.created = content.get("created")
+        self.term_descendants = {key: frozenset(labels) for key, labels in content["term_descendants"].items()}
+        self.term_parents = content["term_parents"]
+        # Organism names are matched regardless of case
+        self.taxa = {organism.lower(): taxon_id for organism, taxon_id in content["taxa"].items()}
+        self.term_ontologies = content["term_ontologies"]
+        self.ontology_source_files = {o.lower(): source for o, source in content["ontology_source_files"].items()}
+        self.ena_library_terms = content["ena_library_terms"]
+        self.ena_instrument_models = content["ena_instrument_models"]
+
+    @classmethod
+    def load(cls, file_path):
+        """Read a (compressed) snapshot file. Raises an exception if it can't be read or has another format."""
+        try:
+            with open_file(file_path) as fh:
+                return cls(json.load(fh), file_path)
+        except (OSError, ValueError, KeyError) as e:
+            raise Exception("Failed to read vocabulary snapshot {}: {}".format(file_path, str(e)))
+
+    def descendants(self, ontology, term_url):
+        """Return the labels of the descendants of a term, or None if the term is not in the snapshot."""
+        return self.term_descendants.get(term_key(ontology, term_url))
+
+    def parent(self, ontology, term_label):
+        return self.term_parents.get(term_key(ontology, term_label))
+
+    def taxon(self, organism):
+        return self.taxa.get(organism.lower())
+
+    def term_ontology(self, term_url):
+        return self.term_ontologies.get(term_url)
+
+    def ontology_source_file(self, ontology):
+        return self.ontology_source_files.get(ontology.lower())
+
+
+def set_offline(snapshot_path=None):
+    """Switch to offline mode for this process and the worker processes it starts.
+    The snapshot is read right away, so that a missing or outdated snapshot is reported before any work is done.
+
+    :param snapshot_path: (optional) path to the snapshot file, default is the snapshot in the cache directory
+    """
+    snapshot_path = os.path.abspath(snapshot_path or get_default_snapshot_path())
+    load_snapshot(snapshot_path)
+    os.environ[OFFLINE_VARIABLE] = snapshot_path
+
+
+def set_online():
+    os.environ.pop(OFFLINE_VARIABLE, None)
+
+
+def is_offline():
+    return bool(os.environ.get(OFFLINE_VARIABLE))
+
+
+def load_snapshot(snapshot_path):
+    """Return the snapshot read from the file, which is only read the first time."""
+    with _lock:
+        if snapshot_path not in _snapshots:
+            _snapshots[snapshot_path] = VocabularySnapshot.load(snapshot_path)
+        return _snapshots[snapshot_path]
+
+
+def get_snapshot():
+    """Return the snapshot in offline mode, otherwise None."""
+    snapshot_path = os.environ.get(OFFLINE_VARIABLE)
+    if snapshot_path:
+        return load_snapshot(snapshot_path)
+
+
+def get_vocabulary_version():
+    """Return an identifier of the vocabularies the remote look-ups are answered from: the version and creation
+    time of the snapshot in offline mode, otherwise "online"."""
+    snapshot = get_snapshot()
+    if snapshot:
+        return "snapshot {} {}".format(snapshot.version, snapshot.created)
+    return "online"
+
+
+def add_offline_argument(parser):
+    """Add the offline option to the argument parser of a script."""
+    parser.add_argument('--offline', nargs='?', const="", metavar='SNAPSHOT',
+                        help="Answer all remote look-ups from a vocabulary snapshot (see build_vocabulary_snapshot.py) "
+                             "without network access, default snapshot is {}".format(get_default_snapshot_path()))
+
+
+def start_offline_mode(args):
+    """Switch to offline mode if the --offline option of the script is set."""
+    if args.offline is not None:
+        set_offline(args.offline or None)
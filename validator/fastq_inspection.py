@@ -0,0 +1,104 @@
+"""Module for inspecting the first records of FASTQ files without reading the whole files.
+
+Only the first records of each file are read (compressed files are decompressed as a stream, so only the
+first blocks are decompressed). The read lengths and the read numbers from the Illumina headers are used to
+infer the library layout and the reads containing barcodes, which can be compared with the assay attributes.
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.compression import open_file
+
+
+DEFAULT_RECORDS = 1000
+REGEX_FASTQ_FILE_NAME = re.compile(r"\.(fastq|fq)(\.(gz|bz2|zst))?$", re.IGNORECASE)
+# Read number in headers from CASAVA 1.8 on (e.g. "@M00123:1:000:1:1101:15589:1331 1:N:0:1")
+# and in older headers ending with "/1" or "/2"
+REGEX_READ_NUMBER = re.compile(r"^@\S+\s+([1-4]):[YN]:|^@\S+/([1-4])(\s|$)")
+# Reads of this length or shorter are assumed to contain only barcodes/UMIs (e.g. 10x Genomics read 1 with 26-28 bp)
+MAX_BARCODE_READ_LENGTH = 30
+# Reads of this length or shorter are assumed to be index reads, which do not count for the library layout
+MAX_INDEX_READ_LENGTH = 12
+
+
+def is_fastq_file(file_name):
+    return bool(REGEX_FASTQ_FILE_NAME.search(file_name))
+
+
+def read_fastq_records(file_handle, max_records=DEFAULT_RECORDS):
+    """Return the header and sequence of the first records of an open FASTQ file (in binary mode).
+    Raises an exception if the file is not in FASTQ format."""
+    records = []
+    lines = iter(file_handle)
+    for header in lines:
+        sequence, separator, quality = next(lines, b""), next(lines, b""), next(lines, b"")
+        sequence, quality = sequence.rstrip(b"\r\n"), quality.rstrip(b"\r\n")
+        if not header.startswith(b"@") or not separator.startswith(b"+") or len(sequence) != len(quality):
+            raise Exception("Record {} is not a valid FASTQ record.".format(len(records) + 1))
+        records.append((header.decode("ascii", "replace").rstrip(), sequence))
+        if len(records) == max_records:
+            break
+    return records
+
+
+def inspect_fastq(file_path, max_records=DEFAULT_RECORDS):
+    """Summarise the first records of a FASTQ file.
+
+    :param file_path: string, path to a plain or compressed FASTQ file
+    :param max_records: integer, maximum number of records to read
+    :return: dictionary with the number of records read, minimum and maximum read length, the read numbers found
+             in the headers (e.g. ["1", "2"] for interleaved paired reads) and the error if the file could not be read
+    """
+    result = {"path": file_path, "records": 0, "min_length": None, "max_length": None, "read_numbers": [],
+              "error": None}
+    try:
+        with open_file(file_path, "rb") as fh:
+            records = read_fastq_records(fh, max_records)
+    except Exception as e:
+        result["error"] = str(e)
+        return result
+    if not records:
+        result["error"] = "The file does not contain any records."
+        return result
+    lengths = [len(sequence) for _, sequence in records]
+    read_numbers = set()
+    for header, _ in records:
+        match = REGEX_READ_NUMBER.match(header)
+        if match:
+            read_numbers.add(match.group(1) or match.group(2))
+    result["records"] = len(records)
+    result["min_length"] = min(lengths)
+    result["max_length"] = max(lengths)
+    result["read_numbers"] = sorted(read_numbers)
+    return result
+
+
+def inspect_fastq_files(file_paths, max_records=DEFAULT_RECORDS, workers=1):
+    """Inspect several FASTQ files in parallel and return the results (see inspect_fastq) in the same order."""
+    if workers > 1 and len(file_paths) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda file_path: inspect_fastq(file_path, max_records), file_paths))
+    return [inspect_fastq(file_path, max_records) for file_path in file_paths]
+
+
+def is_barcode_read(inspection):
+    """Return True if the reads of a FASTQ file are too short to be biological reads."""
+    return inspection["max_length"] is not None and inspection["max_length"] <= MAX_BARCODE_READ_LENGTH
+
+
+def infer_library_layout(inspections):
+    """Infer the library layout from the inspections of the files of one run (assay_data object).
+    Barcode reads count as reads, e.g. droplet single-cell libraries are paired.
+
+    :param inspections: list of inspection results (see inspect_fastq)
+    :return: "PAIRED", "SINGLE" or None if the files could not be read
+    """
+    reads = [i for i in inspections if not i["error"] and i["max_length"] > MAX_INDEX_READ_LENGTH]
+    if not reads:
+        return None
+    if all(i["read_numbers"] for i in reads):
+        # Files of several lanes have the same read number, read pairs can also be interleaved in one file
+        read_numbers = {n for i in reads for n in i["read_numbers"]}
+        return "PAIRED" if len(read_numbers) > 1 else "SINGLE"
+    return "PAIRED" if len(reads) > 1 else "SINGLE"
@@ -0,0 +1,102 @@
+"""Module for verifying data files against the checksums declared in the SDRF (e.g. Comment[MD5]).
+
+The files are read in large blocks and hashed in a pool of threads. hashlib releases the GIL while hashing
+large blocks, so the threads read and hash different files in parallel. The digests of verified files are
+cached by path, size and modification time, so that files that have not changed are not read again.
+"""
+
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.lookup_cache import LookupCache
+
+
+# Reading 8 MB at a time keeps the number of system calls low for multi-gigabyte FASTQ files
+BUFFER_SIZE = 8 * 1024 * 1024
+DEFAULT_WORKERS = 4
+
+
+def file_digest(file_path, method="md5", buffer_size=BUFFER_SIZE):
+    """Return the hex digest of a file, reading it in blocks into a reused buffer.
+
+    :param file_path: string, path to the file
+    :param method: string, name of the hash algorithm (e.g. "md5")
+    :param buffer_size: integer, number of bytes to read at a time
+    """
+    digest = hashlib.new(method)
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(file_path, "rb", buffering=0) as fh:
+        while True:
+            size = fh.readinto(buffer)
+            if not size:
+                break
+            digest.update(view[:size])
+    return digest.hexdigest()
+
+
+def create_checksum_cache(cache_dir=None):
+    """Return the persistent cache of file digests (see cached_file_digest)."""
+    return LookupCache("file_checksums", cache_dir=cache_dir)
+
+
+def cached_file_digest(file_path, method="md5", cache=None):
+    """Return the digest of a file, using the cached value if the file has the same size and modification time.
+
+    :param file_path: string, path to the file
+    :param method: string, name of the hash algorithm
+    :param cache: (optional) LookupCache object from create_checksum_cache
+    :return: the hex digest and the size of the file in bytes
+    """
+    stat = os.stat(file_path)
+    key = "{}:{}:{}:{}".format(method, stat.st_size, stat.st_mtime_ns, os.path.abspath(file_path))
+    digest = cache.get(key) if cache is not None else None
+    if digest is None:
+        digest = file_digest(file_path, method)
+        if cache is not None:
+            cache.set(key, digest)
+    return digest, stat.st_size
+
+
+def verify_file(file_path, checksum, method="md5", cache=None):
+    """Compare the digest of a file with the declared checksum.
+
+    :return: dictionary with path, status ("verified", "mismatch", "missing" or "unreadable"),
+             the expected checksum, the digest of the file, its size and the error message if it could not be read
+    """
+    result = {"path": file_path, "status": "verified", "expected": checksum, "digest": None, "size": None,
+              "error": None}
+    if not os.path.isfile(file_path):
+        result["status"] = "missing"
+        return result
+    try:
+        result["digest"], result["size"] = cached_file_digest(file_path, method, cache)
+    except OSError as e:
+        result["status"] = "unreadable"
+        result["error"] = str(e)
+        return result
+    if result["digest"] != checksum.strip().lower():
+        result["status"] = "mismatch"
+    return result
+
+
+def verify_files(file_checksums, data_dir, workers=DEFAULT_WORKERS, cache=None):
+    """Verify a list of files in the data directory in parallel.
+
+    :param file_checksums: list of tuples with file name, declared checksum and hash algorithm
+    :param data_dir: string, path to the directory with the data files
+    :param workers: integer, number of files that are read at the same time
+    :param cache: (optional) LookupCache object from create_checksum_cache
+    :return: list of result dictionaries (see verify_file) with the file name added, in the order of the input
+    """
+    def verify(item):
+        name, checksum, method = item
+        result = verify_file(os.path.join(data_dir, name), checksum, method, cache)
+        result["name"] = name
+        return result
+
+    if workers > 1 and len(file_checksums) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(verify, file_checksums))
+    return [verify(item) for item in file_checksums]
@@ -1,27 +1,50 @@
 """Module to run JSON schema validation of a USI submission metadata file against the ArrayExpress submission schema"""
 
 import os
+import threading
+
 import jsonschema
 
 import json_schemas
 from utils.converter_utils import read_json_file
 from utils.common_utils import create_logger
+from utils.profiling import timed
+
 
+# The validator for the submission schema of each thread (see get_submission_validator)
+_thread_data = threading.local()
 
-def validate_submission_json(json_file, schema_file=None, logger=None):
-    """Match a JSON object against a JSON schema and return a human-readable list of all validation errors."""
+
+@timed()
+def validate_submission_json(json_file, schema_file=None, logger=None, json_data=None):
+    """Match a JSON object against a JSON schema and return a human-readable list of all validation errors.
+    The JSON file is only read if its content is not passed in as json_data."""
 
     if not logger:
         # Create local logger in the directory of the JSON data file
         logger = create_logger(os.path.dirname(json_file), "json_validation", os.path.basename(json_file),
                                logger_name="JSON")
     if not schema_file:
-        # If no other schema is given, load the schema describing a full ArrayExpress submission
-        schema_file, schema = load_arrayexpress_submission_schema()
+        # If no other schema is given, use the (compiled) schema describing a full ArrayExpress submission
+        validator = get_submission_validator()
     else:
-        schema = read_json_file(schema_file)
+        validator = create_validator(schema_file, read_json_file(schema_file))
+
+    if json_data is None:
+        json_data = read_json_file(json_file)
 
-    json_data = read_json_file(json_file)
+    # Validate the submission JSON against the submission schema
+    error_messages = [format_json_error_message(e) for e in validator.iter_errors(json_data)]
+
+    # Print out all error messages with where and why details
+    for message in error_messages:
+        logger.error(message)
+
+    return error_messages
+
+
+def create_validator(schema_file, schema):
+    """Return a validator for the schema, after checking the validity of the schema itself."""
 
     # Create validator with 'resolver' to help locate the referenced sub-schemas when interpreting $ref values
     # in the submission schema (creates absolute paths to the 'submittable' schema files)
@@ -30,14 +53,20 @@ def validate_submission_json(json_file, schema_file=None, logger=None):
 
     # Check validity of schema first
     # We shouldn't need this but for now, running this test before calling the checks on the object
-    schema_errors = validator.check_schema(schema)
+    validator.check_schema(schema)
 
-    # Validate the submission JSON against the submission schema
-    validation_errors = validator.iter_errors(json_data)
+    return validator
 
-    # Print out all error messages with where and why details
-    for e in validation_errors:
-        logger.error(format_json_error_message(e))
+
+def get_submission_validator():
+    """Return the validator for the ArrayExpress submission schema, created on first use in the current thread.
+    The resolver keeps the referenced sub-schemas, so they are only read once. It also keeps the current
+    resolution scope while validating, so a validator is not shared between threads."""
+    validator = getattr(_thread_data, "submission_validator", None)
+    if validator is None:
+        validator = create_validator(*load_arrayexpress_submission_schema())
+        _thread_data.submission_validator = validator
+    return validator
 
 
 def load_arrayexpress_submission_schema():
@@ -3,11 +3,91 @@ that the converter module relies on.
 SDRF prevalidation parses the SDRF header and checks that certain nodes are present exactly once
 
 """
+import bisect
 import re
+from collections import Counter, OrderedDict, defaultdict
 
-from utils.converter_utils import get_name, get_value, get_controlled_vocabulary
-
+import pandas as pd
 
+from utils.converter_utils import get_name, get_value, get_controlled_vocabulary
+from utils.profiling import timed
+from utils.sdrf_view import get_column
+
+
+class IDFFieldIndex:
+
+    def __init__(self, fields):
+        """
+        Immutable index of the known IDF fields, with a trigram index to suggest fields for misspelled names.
+
+        :param fields: dictionary of the field names as they appear in the parsed IDF dictionary (i.e. as keys
+            of read_idf_file) and the display names used in suggestions
+        """
+        self.fields = frozenset(fields)
+        self.display_names = dict(fields)
+        trigram_index = defaultdict(set)
+        for field in self.fields:
+            for trigram in _trigrams(field):
+                trigram_index[trigram].add(field)
+        self.trigram_index = {trigram: frozenset(names) for trigram, names in trigram_index.items()}
+        self._suggestions = {}
+
+    def __contains__(self, field):
+        return field in self.fields
+
+    def suggest(self, field, max_candidates=10):
+        """Return the display names of the known fields that are closest to the given (unknown) field.
+        Candidates sharing the most trigrams are compared by edit distance, the closest ones are returned
+        if the difference is small (up to a quarter of the name length, at least 2)."""
+        if field not in self._suggestions:
+            shared = Counter()
+            for trigram in _trigrams(field):
+                shared.update(self.trigram_index.get(trigram, ()))
+            distances = [(edit_distance(field.lower(), candidate.lower()), candidate)
+                         for candidate, _ in shared.most_common(max_candidates)]
+            # Only the closest matches, if they are close enough
+            max_distance = min([max(2, len(field) // 4)] + [distance for distance, _ in distances])
+            self._suggestions[field] = [self.display_names[candidate] for distance, candidate in sorted(distances)
+                                        if distance <= max_distance]
+        return self._suggestions[field]
+
+
+def _trigrams(name):
+    padded = "  {} ".format(name.lower())
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b):
+    """Return the Levenshtein distance between two strings."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+# The index is built on first use and shared by all calls in the process
+_idf_field_index = None
+
+
+def get_idf_field_index():
+    """Return the index of all IDF fields and comments that can be parsed (built once per process)."""
+    global _idf_field_index
+    if _idf_field_index is None:
+        # Remove spaces (we don't care about them in order to parse correctly)
+        fields = {get_name(field): field for field in get_controlled_vocabulary("idf", "magetab")}
+        # Add controlled comment fields (values in square brackets)
+        fields.update({comment: "Comment[{}]".format(comment)
+                       for comment in get_controlled_vocabulary("idf_comment_terms")})
+        _idf_field_index = IDFFieldIndex(fields)
+    return _idf_field_index
+
+
+@timed()
 def idf_prevalidation(idf_dict, logger):
     """Check that all IDF fields and comments are from the allowed list and can be parsed properly.
 
@@ -15,14 +95,15 @@ def idf_prevalidation(idf_dict, logger):
     (no variablilty with spaces and capitalisation) allowed for AE loading"""
 
     # Check if all fields can be parsed
-    idf_fields = get_controlled_vocabulary("idf", "magetab")
-    # Remove spaces (we don't care about them in order to parse correctly)
-    known_fields = [get_name(field) for field in idf_fields]
-    # Add controlled comment fields (values in square brackets)
-    known_fields.extend(get_controlled_vocabulary("idf_comment_terms"))
+    known_fields = get_idf_field_index()
     for idf_key in idf_dict:
         if idf_key not in known_fields:
-            logger.error("Cannot parse IDF field \"{}\".".format(idf_key))
+            suggestions = known_fields.suggest(idf_key)
+            if suggestions:
+                logger.error("Cannot parse IDF field \"{}\". Did you mean \"{}\"?".format(
+                    idf_key, "\" or \"".join(suggestions)))
+            else:
+                logger.error("Cannot parse IDF field \"{}\".".format(idf_key))
 
     # Check fields that can only contain one value
     max1 = ("mage-tabversion", "investigationtitle", "dateofexperiment", "publicreleasedate", "experimentdescription")
@@ -31,62 +112,64 @@ def idf_prevalidation(idf_dict, logger):
             logger.error("IDF field \"{}\" contains more than one value. This is not allowed".format(field))
 
 
+@timed()
 def sdrf_prevalidation(sdrf_list, header, header_dict, submission_type, logger):
     """Perform basic checks on the SDRF, making sure that all expected nodes and protocols are present,
     and that the basic assumptions about the relationships between samples and extracts are correct.
+    The SDRF rows can be a nested list or an SDRFView (only the node name columns are read).
     """
 
-    # Strip whitespace
-    header_names = [get_name(h) for h in header]
+    # Strip whitespace and count the header fields once
+    header_counts = Counter(get_name(h) for h in header)
     node_positions = []
-    samples = []
-    extracts = []
-    le = []
+    node_columns = OrderedDict()
 
     # Source Name
-    if not present_exactly_once("sourcename", header_names):
+    if header_counts["sourcename"] != 1:
         logger.error("Source Name node was not found or more than once.")
     else:
         _add_first_occurance("sourcename", header_dict, node_positions)
         # For later check of sample to extract relationship
-        samples = [row[header_dict.get("sourcename")[0]] for row in sdrf_list]
+        node_columns["Source Name"] = get_column(sdrf_list, header_dict.get("sourcename")[0])
 
     # Extract Name
-    if not present_exactly_once("extractname", header_names):
+    if header_counts["extractname"] != 1:
         logger.error("Extract Name node was not found or more than once.")
     else:
         _add_first_occurance("extractname", header_dict, node_positions)
-        extracts = [row[header_dict.get("extractname")[0]] for row in sdrf_list]
+        node_columns["Extract Name"] = get_column(sdrf_list, header_dict.get("extractname")[0])
 
     # Labeled Extract Name
     if submission_type == "microarray":
-        if not present_exactly_once("labeledextractname", header_names):
+        if header_counts["labeledextractname"] != 1:
             logger.error("Labeled Extract node was not found or more than once.")
         else:
             _add_first_occurance("labeledextractname", header_dict, node_positions)
-            le = [row[header_dict.get("labeledextractname")[0]] for row in sdrf_list]
+            node_columns["Labeled Extract Name"] = get_column(sdrf_list, header_dict.get("labeledextractname")[0])
 
     # Assay Name
-    if not present_exactly_once("assayname", header_names):
+    if header_counts["assayname"] != 1:
         logger.error("Assay Name node was not found or more than once.")
     else:
         _add_first_occurance("assayname", header_dict, node_positions)
+        node_columns["Assay Name"] = get_column(sdrf_list, header_dict.get("assayname")[0])
 
     # Array Data File
-    if not (present_exactly_once("arraydatafile", header_names) or
-            present_exactly_once("arraydatamatrixfile", header_names) or
-            present_exactly_once("scanname", header_names)):
+    if not (header_counts["arraydatafile"] == 1 or
+            header_counts["arraydatamatrixfile"] == 1 or
+            header_counts["scanname"] == 1):
         logger.error("No raw data node was found or more than one.")
 
     # Check for duplicated characteristics terms
     characteristics = [get_value(x).lower() for x in header if re.match("characteristics", x, flags=re.IGNORECASE)]
-    duplicated_categories = [c for c in characteristics if not present_exactly_once(c, characteristics)]
+    characteristics_counts = Counter(characteristics)
+    duplicated_categories = [c for c in characteristics if characteristics_counts[c] != 1]
     if duplicated_categories:
         logger.error("The following characteristics categories is present more than once: {}".format(
             ", ".join(duplicated_categories)))
 
     # Protocols should be between all major nodes
-    ref_positions = header_dict.get("protocolref")
+    ref_positions = sorted(header_dict.get("protocolref", []))
     # Add first node for each data file node type to node positions, where we want a protocol
     _add_first_occurance("arraydatafile", header_dict, node_positions)
     _add_first_occurance("scanname", header_dict, node_positions)
@@ -94,29 +177,51 @@ def sdrf_prevalidation(sdrf_list, header, header_dict, submission_type, logger):
     _add_first_occurance("derivedarraydatafile", header_dict, node_positions)
     _add_first_occurance("derivedarraydatamatrixfile", header_dict, node_positions)
     # Go through nodes up until the one before last
-    for i, node_pos in enumerate(node_positions[:-1]):
-        # Get all protocol positions that fulfill the criteria of being between the current and the next node
-        next_node_pos = node_positions[i+1]
-        prots_in_range = [prot for prot in ref_positions if node_pos < prot < next_node_pos]
-        if not prots_in_range:
+    for node_pos, next_node_pos in zip(node_positions, node_positions[1:]):
+        # Find the first protocol after the current node, it must come before the next node
+        first_ref = bisect.bisect_right(ref_positions, node_pos)
+        if not (first_ref < len(ref_positions) and ref_positions[first_ref] < next_node_pos):
             logger.warn("There is no Protocol REF connecting \"{}\" and \"{}\".".format(
                 header[node_pos], header[next_node_pos]))
 
-    # There must not be more samples than extracts
-    if samples and extracts:
-        if len(samples) > len(extracts):
-            logger.error("Found more samples ({}) than extracts ({}), please check the relationship.".format(
-                len(samples), len(extracts)))
+    if node_columns:
+        sdrf_node_checks(node_columns, submission_type, logger)
 
-    # There must not be more labeled extracts than samples
-    if submission_type == "microarray" and samples and le:
-        if len(samples) > len(le):
-            logger.error("Found more samples ({}) than labeled extracts ({}), please check the relationship.".format(
-                len(samples), len(le)))
 
+def sdrf_node_checks(node_columns, submission_type, logger):
+    """Check the node names column by column: node names must not be empty, and for sequencing experiments each
+    assay must have only one extract. Extracts made from more than one sample (and labeled extracts from more than
+    one extract) are pooled, which is allowed, but reported with a warning so that mistakes can be spotted.
 
-def present_exactly_once(item, term_list):
-    return term_list.count(item) == 1
+    :param node_columns: ordered dictionary with the node type (as SDRF header) and the column values as list
+    :param submission_type: string, microarray, sequencing or singlecell
+    :param logger: log handler
+    """
+    table = pd.DataFrame(node_columns)
+
+    # Empty node names
+    for node_type in table.columns:
+        empty_rows = (table[node_type].str.strip() == "").to_numpy().nonzero()[0]
+        if len(empty_rows):
+            logger.error("{} is empty in {} row(s), e.g. {} {}.".format(
+                node_type, len(empty_rows), "row" if len(empty_rows) == 1 else "rows",
+                ", ".join(str(r + 2) for r in empty_rows[:5])))
+
+    # Child nodes with more than one parent node, only pooling of samples and extracts is allowed
+    relationships = [("Source Name", "Extract Name", True), ("Extract Name", "Labeled Extract Name", True)]
+    if submission_type != "microarray":
+        relationships.append(("Extract Name", "Assay Name", False))
+    for parent, child, pooling in relationships:
+        if parent in table and child in table:
+            parents_per_child = table.groupby(child, sort=False)[parent].nunique()
+            duplicated = parents_per_child[parents_per_child > 1]
+            if len(duplicated):
+                names = ", ".join(str(name) for name in duplicated.index[:10])
+                if pooling:
+                    logger.warning("The following {}s are pooled from more than one {}: {}".format(
+                        child, parent, names))
+                else:
+                    logger.error("The following {}s are linked to more than one {}: {}".format(child, parent, names))
 
 
 def _add_first_occurance(item, lookupdict, target):
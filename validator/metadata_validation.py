@@ -1,23 +1,78 @@
+import functools
+import hashlib
+import os
 import re
+import time
+from collections import OrderedDict
 
 from datamodel.submission import Submission
 from datamodel.assay import SingleCellAssay, MicroarrayAssay
 from utils import converter_utils
 from utils.converter_utils import ontology_term, is_accession
 from utils.common_utils import get_term_descendants, get_ena_library_terms_via_usi, get_ena_instrument_terms_via_usi
+from utils.profiling import timed
+from validator.fastq_inspection import DEFAULT_RECORDS, infer_library_layout, inspect_fastq_files, is_barcode_read, \
+    is_fastq_file
+from validator.file_verification import DEFAULT_WORKERS, verify_files
+from validator.validation_cache import ValidationCache, run_check
+from validator.validation_results import ValidationResults, LoggerSink
 
 
 REGEX_DATE_FORMAT = re.compile("([12]\d{3}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01]))")
 REGEX_DOI_FORMAT = re.compile("^10\.\d{4,9}\/\S+$")
 REGEX_FILE_NAME = re.compile(r"^[A-Za-z0-9._-]+$")
+# Number of files from which the time taken to index the data directory is reported
+LARGE_DATA_DIRECTORY = 10000
 
 
-def run_protocol_checks(sub: Submission, logger):
-    """Run checks on protocol objects and return list of error codes."""
+def checks_version():
+    """Return a hash of the check definitions (this module and the controlled terms),
+    so that cached results are not used after the checks have changed."""
+    sha = hashlib.sha1()
+    base_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    for path in (os.path.realpath(__file__), os.path.join(base_dir, "utils", "ontology_terms.json")):
+        with open(path, "rb") as fh:
+            sha.update(fh.read())
+    return sha.hexdigest()
+
+
+def create_validation_cache(cache_dir=None):
+    """Return a validation cache for the current version of the checks (see run_*_checks)."""
+    return ValidationCache(version=checks_version(), cache_dir=cache_dir)
+
+
+def collect_results(checks, sub, logger, cache=None, results=None):
+    """Run a group of checks and return the list of error codes they found.
+
+    :param checks: function taking the submission, a ValidationResults object and the cache
+    :param sub: Submission object
+    :param logger: log handler, the messages are logged if no results object is given
+    :param cache: (optional) ValidationCache object with the results of previous runs
+    :param results: (optional) ValidationResults object to add the findings to, without logging them
+    """
+    if results is None:
+        own_results = ValidationResults(logger)
+        checks(sub, own_results, cache)
+        own_results.write(LoggerSink(logger))
+        return own_results.codes()
+    start = len(results)
+    checks(sub, results, cache)
+    return results.codes(start)
+
+
+def run_protocol_checks(sub: Submission, logger, cache=None, results=None):
+    """Run checks on protocol objects and return list of error codes.
+    With a ValidationCache, the checks of protocols that have not changed since the last run are skipped.
+    If a ValidationResults object is given, the findings are added to it instead of being logged."""
+
+    return collect_results(_protocol_checks, sub, logger, cache, results)
+
+
+@timed()
+def _protocol_checks(sub, results, cache):
 
     protocols = sub.protocol
 
-    codes = []
     names = set()
     p_types = set()
     allowed_types = ontology_term("protocol_types")
@@ -30,83 +85,80 @@ def run_protocol_checks(sub: Submission, logger):
     found_exclusive = False
 
     if not protocols:
-        logger.error("Experiment has no protocols. At least one expected.")
-        codes.append("PROT-E01")
-        return codes
+        results.error("PROT-E01", "Experiment has no protocols. At least one expected.")
+        return
     for p in protocols:
         if p.alias:
             # Protocol names should be unique.
             if p.alias in names:
-                logger.error("Protocol name \"{}\" is not unique.".format(p.alias))
-                codes.append("PROT-E04")
+                results.error("PROT-E04", "Protocol name \"{}\" is not unique.", p.alias, ref=p.alias)
             names.add(p.alias)
         # Protocol must have a name
         else:
-            logger.error("Protocol found with no name. Not checking it further.")
-            codes.append("PROT-E02")
+            results.error("PROT-E02", "Protocol found with no name. Not checking it further.")
             continue
-        if p.description:
-            # Protocol description should be longer than 50 characters
-            if len(p.description) < 50:
-                logger.warning("Protocol \"{}\" is shorter than 50 characters.".format(p.alias))
-                codes.append("PROT-W01")
-        # Protocol must have description
-        else:
-            logger.error("Protocol \"{}\" has no description.".format(p.alias))
-            codes.append("PROT-E03")
+        run_check(cache, "protocol", p, functools.partial(check_protocol, p, allowed_types), results)
         if p.protocol_type:
-            # Protocol type must be from controlled vocabulary (EFO)
             p_types.add(p.protocol_type.value)
-            if p.protocol_type.value not in allowed_types:
-                logger.error("Protocol \"{}\" has a type that is not from controlled vocabulary/EFO: "
-                             "\"{}\"".format(p.alias, p.protocol_type.value))
-                codes.append("PROT-E05")
             if p.protocol_type.value in exclusive:
                 found_exclusive = True
-        else:
-            # Protocol must have a protocol type
-            logger.warn("Protocol \"{}\" has no protocol type.".format(p.alias))
-            codes.append("PROT-E07")
 
     # Mandatory protocol types (for all experiment types) must be present
     for p_type in mandatory:
         if p_type not in p_types:
-            logger.error("A {} must be included.".format(p_type))
-            codes.append("PROT-E06")
+            results.error("PROT-E06", "A {} must be included.", p_type)
 
     # Every experiment must have at least one growth/treatment/sample collection protocol
     if not found_exclusive:
-        logger.error("A growth, treatment or sample collection protocol must be included.")
-        codes.append("PROT-E07")
+        results.error("PROT-E07", "A growth, treatment or sample collection protocol must be included.")
+
+
+def check_protocol(p, allowed_types, results):
+    """Run the checks of a single (named) protocol object."""
+
+    if p.description:
+        # Protocol description should be longer than 50 characters
+        if len(p.description) < 50:
+            results.warning("PROT-W01", "Protocol \"{}\" is shorter than 50 characters.", p.alias, ref=p.alias)
+    # Protocol must have description
+    else:
+        results.error("PROT-E03", "Protocol \"{}\" has no description.", p.alias, ref=p.alias)
+    if p.protocol_type:
+        # Protocol type must be from controlled vocabulary (EFO)
+        if p.protocol_type.value not in allowed_types:
+            results.error("PROT-E05", "Protocol \"{}\" has a type that is not from controlled vocabulary/EFO: \"{}\"",
+                          p.alias, p.protocol_type.value, ref=p.alias)
+    else:
+        # Protocol must have a protocol type
+        results.warning("PROT-E07", "Protocol \"{}\" has no protocol type.", p.alias, ref=p.alias)
+
+
+def run_sample_checks(sub: Submission, logger, cache=None, results=None):
+    """Run checks on sample objects and factor values and return list of error codes.
+    With a ValidationCache, only the samples that have changed since the last run are checked, and the organism
+    and unit look-ups are only repeated if the sets of values have changed. The factor checks are always done.
+    If a ValidationResults object is given, the findings are added to it instead of being logged."""
 
-    return codes
+    return collect_results(_sample_checks, sub, logger, cache, results)
 
 
-def run_sample_checks(sub: Submission, logger):
-    """Run checks on sample objects and factor values and return list of error codes."""
+@timed()
+def _sample_checks(sub, results, cache):
 
     samples = sub.sample
     factors = [f.value for f in sub.study.experimental_factor]
     organisms = set()
     units = set()
     characteristics = []
-    codes = []
 
     if not samples:
-        logger.error("Experiment has no samples. At least one expected.")
-        codes.append("SAMP-E01")
-        return codes
+        results.error("SAMP-E01", "Experiment has no samples. At least one expected.")
+        return
     for s in samples:
-        # Sample must have a name
+        run_check(cache, "sample", s, functools.partial(check_sample, s), results)
         if not s.alias:
-            logger.error("Sample found with no name. Not checking it further.")
-            codes.append("SAMP-E02")
             continue
-        # Sample must have organism/taxon annotation
-        if not s.taxon:
-            logger.error("Sample \"{}\" has no organism specified.".format(s.alias))
-            codes.append("SAMP-E03")
-        else:
+        if s.taxon:
             organisms.add(s.taxon)
         # Collecting units and categories
         for a, a_attr in s.attributes.items():
@@ -117,26 +169,16 @@ def run_sample_checks(sub: Submission, logger):
                 characteristics.append(a)
 
     # Check organism name is in taxonomy
-    for o in organisms:
-        taxon_id = converter_utils.get_taxon(o)
-        logger.debug("Found taxon ID: {}".format(taxon_id))
-        if not isinstance(taxon_id, int):
-            logger.error("Organism \"{}\" was not found in NCBI taxonomy.".format(o))
-            codes.append("SAMP-E08")
+    run_check(cache, "organisms", organisms, functools.partial(check_organisms, organisms), results, lookups=True)
 
     # Check units
-    unit_term = ontology_term("unit")
-    allowed_units = get_term_descendants(unit_term["ontology"], unit_term["uri"], logger)
-    for unit_label in units:
-        if unit_label not in allowed_units:
-            logger.error("Unit \"{}\" is not from approved list (EFO term).".format(unit_label))
-            codes.append("SAMP-E04")
+    run_check(cache, "units", units, functools.partial(check_units, units), results, lookups=True)
 
     # Check that factors defined in study are found in sample attributes
     undefined_factors = [f for f in factors if f not in characteristics]
     if len(undefined_factors) > 0:
-        logger.error("The following factors are declared but not annotated: {}".format(", ".join(undefined_factors)))
-        codes.append("SAMP-E05")
+        results.error("SAMP-E05", "The following factors are declared but not annotated: {}",
+                      ", ".join(undefined_factors))
 
     # Check that factor values vary
     unique_factor_values = {}
@@ -154,8 +196,7 @@ def run_sample_checks(sub: Submission, logger):
         if f == "dose":
             # Error if both dose + compound/irradiade do not vary
             if "compound" in non_factors or "irradiate" in non_factors:
-                logger.error("For factor values including dose, at least one must vary.")
-                codes.append("SAMP-E07")
+                results.error("SAMP-E07", "For factor values including dose, at least one must vary.")
             # Allow dose to not vary if compound/irradiate do
             elif "compound" in good_factors or "irradiate" in good_factors:
                 continue
@@ -166,119 +207,165 @@ def run_sample_checks(sub: Submission, logger):
             continue
         # Special case immunoprecipitate
         elif f == "immunoprecipitate":
-            logger.info("Found factor \"immunoprecipitate\". This doesn't need to vary.")
+            results.info("Found factor \"immunoprecipitate\". This doesn't need to vary.")
         else:
-            logger.error("Factor value \"{}\" does not vary.".format(f))
-            codes.append("SAMP-E06")
+            results.error("SAMP-E06", "Factor value \"{}\" does not vary.", f)
+
+
+def check_sample(s, results):
+    """Run the checks of a single sample object."""
+
+    # Sample must have a name
+    if not s.alias:
+        results.error("SAMP-E02", "Sample found with no name. Not checking it further.")
+    # Sample must have organism/taxon annotation
+    elif not s.taxon:
+        results.error("SAMP-E03", "Sample \"{}\" has no organism specified.", s.alias, ref=s.alias)
 
-    return codes
 
+def get_allowed_terms(category, results):
+    """Return the labels of the descendants of the ontology term of a category (e.g. "unit"), or None if they
+    could not be retrieved, in which case the check of the terms is skipped with a warning."""
 
-def run_study_checks(sub: Submission, logger):
-    """Run checks on study object and return list of error codes."""
+    term = ontology_term(category)
+    allowed_terms = get_term_descendants(term["ontology"], term["uri"], results.logger)
+    if allowed_terms is None:
+        results.lookup_failed("Could not retrieve the allowed terms of {} \"{}\", skipping the check of the {} "
+                              "terms.".format(term["ontology"], term["uri"], category))
+    return allowed_terms
 
-    study = sub.study
-    codes = []
+
+def check_organisms(organisms, results):
+    """Check that the organism names are found in NCBI taxonomy."""
+
+    for o in organisms:
+        taxon_id = converter_utils.get_taxon(o)
+        results.debug("Found taxon ID: {}", taxon_id)
+        if not isinstance(taxon_id, int):
+            results.error("SAMP-E08", "Organism \"{}\" was not found in NCBI taxonomy.", o)
+            # A failed look-up is not told apart from an unknown organism, so the result is looked up again next time
+            results.lookup_failed()
+
+
+def check_units(units, results):
+    """Check that the unit labels are from EFO."""
+
+    allowed_units = get_allowed_terms("unit", results)
+    if allowed_units is None:
+        return
+    for unit_label in units:
+        if unit_label not in allowed_units:
+            results.error("SAMP-E04", "Unit \"{}\" is not from approved list (EFO term).", unit_label)
+
+
+def run_study_checks(sub: Submission, logger, cache=None, results=None):
+    """Run checks on study object and return list of error codes.
+    With a ValidationCache, the checks are skipped if the study has not changed since the last run.
+    If a ValidationResults object is given, the findings are added to it instead of being logged."""
+
+    return collect_results(_study_checks, sub, logger, cache, results)
+
+
+@timed()
+def _study_checks(sub, results, cache):
+    run_check(cache, "study", sub.study, functools.partial(check_study, sub.study), results, lookups=True)
+
+
+def check_study(study, results):
+    """Run the checks of the study object."""
 
     # Title
     if not study.title:
-        logger.error("Study does not have a title.")
-        codes.append("STUD-E01")
+        results.error("STUD-E01", "Study does not have a title.")
     elif len(study.title) > 255:
-        logger.warn("Study title may be too long. Max 255 characters are allowed.")
-        codes.append("STUD-W01")
+        results.warning("STUD-W01", "Study title may be too long. Max 255 characters are allowed.")
 
     # Description
     if not study.description:
-        logger.error("Study does not have a description. Experiment description must be specified.")
-        codes.append("STUD-E02")
+        results.error("STUD-E02", "Study does not have a description. Experiment description must be specified.")
 
     # Experiment types
     if not study.experiment_type:
-        logger.error("Study does not have any experiment types.")
-        codes.append("STUD-E03")
+        results.error("STUD-E03", "Study does not have any experiment types.")
     else:
         allowed_types = ontology_term("experiment_type")
         all_types = allowed_types["microarray"] + allowed_types["sequencing"] + allowed_types["singlecell"]
         for et in study.experiment_type:
             if et not in all_types:
-                logger.error("Experiment type \"{}\" is not an allowed experiment type.".format(et))
-                codes.append("STUD-E04")
+                results.error("STUD-E04", "Experiment type \"{}\" is not an allowed experiment type.", et)
 
     # Protocol refs
     if len(study.protocolrefs) < 1:
-        logger.error("At least one protocol must be used in an experiment")
-        codes.append("STUD-E07")
+        results.error("STUD-E07", "At least one protocol must be used in an experiment")
 
     # Experimental factors
     if not study.experimental_factor:
-        logger.error("Study does not have any experimental variables. At least one must be included.")
-        codes.append("STUD-E08")
+        results.error("STUD-E08", "Study does not have any experimental variables. At least one must be included.")
 
     # Experimental design
     if study.experimental_design:
-        design_term = ontology_term("study_design")
-        allowed_designs = get_term_descendants(design_term["ontology"], design_term["uri"], logger)
+        allowed_designs = get_allowed_terms("study_design", results)
         for dt in study.experimental_design:
-            if dt.value not in allowed_designs:
-                logger.error("Experimental design \"{}\" is not an allowed term.".format(dt.value))
-                codes.append("STUD-E09")
+            if allowed_designs is not None and dt.value not in allowed_designs:
+                results.error("STUD-E09", "Experimental design \"{}\" is not an allowed term.", dt.value)
 
     # Date format
     if study.date_of_experiment:
         if not REGEX_DATE_FORMAT.match(study.date_of_experiment):
-            logger.error("Date of experiment must be in YYYY-MM-DD format.")
-            codes.append("STUD-E05")
+            results.error("STUD-E05", "Date of experiment must be in YYYY-MM-DD format.")
 
     # Accession format of related experiments
     rel_exp_label = "RelatedExperiment"
     if rel_exp_label in study.comments:
         for acc in study.comments[rel_exp_label]:
             if not is_accession(acc):
-                logger.error("Related experiment \"{}\" does not match allowed accession pattern.".format(acc))
-                codes.append("STUD-E06")
+                results.error("STUD-E06", "Related experiment \"{}\" does not match allowed accession pattern.", acc)
+
 
-    return codes
+def run_project_checks(sub: Submission, logger, cache=None, results=None):
+    """Run checks on project object and return list of error codes.
+    With a ValidationCache, the checks are skipped if the project has not changed since the last run.
+    If a ValidationResults object is given, the findings are added to it instead of being logged."""
 
+    return collect_results(_project_checks, sub, logger, cache, results)
 
-def run_project_checks(sub: Submission, logger):
-    """Run checks on project object and return list of error codes."""
 
-    project = sub.project
-    codes = []
+@timed()
+def _project_checks(sub, results, cache):
+    run_check(cache, "project", sub.project, functools.partial(check_project, sub.project), results, lookups=True)
+
+
+def check_project(project, results):
+    """Run the checks of the project object."""
+
     found_submitter = False
     found_submitter_details = False
 
     # Contacts
     if not project.contacts:
-        logger.error("No contacts found. At least one contact must be included.")
-        codes.append("PROJ-E01")
+        results.error("PROJ-E01", "No contacts found. At least one contact must be included.")
     else:
         # Roles
-        role_term = ontology_term("role")
-        allowed_roles = get_term_descendants(role_term["ontology"], role_term["uri"], logger)
+        allowed_roles = get_allowed_terms("role", results)
         for i, c in enumerate(project.contacts):
             if c.roles:
                 for r in c.roles:
                     role_value = r.lower().rstrip()
-                    if role_value not in allowed_roles:
-                        logger.warning("Contact role \"{}\" is not an allowed term.".format(role_value))
-                        codes.append("PROJ-E05")
+                    if allowed_roles is not None and role_value not in allowed_roles:
+                        results.warning("PROJ-E05", "Contact role \"{}\" is not an allowed term.", role_value)
                     elif role_value == "submitter":
                         found_submitter = True
                         if c.email and c.affiliation:
                             found_submitter_details = True
             if not c.lastName:
-                logger.error("A contact must have last name specified: {}.".format(c))
-                codes.append("PROJ-E02")
+                results.error("PROJ-E02", "A contact must have last name specified: {}.", c)
         # At least one contact must have role "submitter"
         if not found_submitter:
-            logger.error("At least one contact must have role \"submitter\".")
-            codes.append("PROJ-E03")
+            results.error("PROJ-E03", "At least one contact must have role \"submitter\".")
         # At least one submitter contact needs email and affiliation
         if not found_submitter_details:
-            logger.error("At least one contact with role \"submitter\" must have email and affiliation specified.")
-            codes.append("PROJ-E04")
+            results.error("PROJ-E04",
+                          "At least one contact with role \"submitter\" must have email and affiliation specified.")
 
     # Format of PubMed ID and DOI
     if project.publications:
@@ -287,237 +374,423 @@ def run_project_checks(sub: Submission, logger):
                 try:
                     int(pub.pubmedId)
                 except ValueError:
-                    logger.error("PubMed ID must be numerical. Got \"{}\".".format(pub.pubmedId))
-                    codes.append("PROJ-E06")
+                    results.error("PROJ-E06", "PubMed ID must be numerical. Got \"{}\".", pub.pubmedId)
             if pub.doi:
                 if not REGEX_DOI_FORMAT.match(pub.doi.rstrip()):
-                    logger.error("Publication DOI \"{}\" does not match expected pattern.".format(pub.doi))
-                    codes.append("PROJ-E07")
+                    results.error("PROJ-E07", "Publication DOI \"{}\" does not match expected pattern.", pub.doi)
 
     # Release date
     if project.releaseDate:
         if not REGEX_DATE_FORMAT.match(project.releaseDate):
-            logger.error("Release date \"{}\" is not in YYYY-MM-DD format.".format(project.releaseDate))
-            codes.append("PROJ-E09")
+            results.error("PROJ-E09", "Release date \"{}\" is not in YYYY-MM-DD format.", project.releaseDate)
     else:
-        logger.error("No release date found. Project must have release date specified.")
-        codes.append("PROJ-E08")
+        results.error("PROJ-E08", "No release date found. Project must have release date specified.")
+
+
+def run_assay_checks(sub: Submission, logger, cache=None, results=None):
+    """Run checks on assay objects and factor values and return list of error codes.
+    With a ValidationCache, only the assays that have changed since the last run are checked
+    (and ENA's vocabulary is only retrieved if there are any).
+    If a ValidationResults object is given, the findings are added to it instead of being logged."""
 
-    return codes
+    return collect_results(_assay_checks, sub, logger, cache, results)
 
 
-def run_assay_checks(sub: Submission, logger):
-    """Run checks on assay objects and factor values and return list of error codes."""
+@timed()
+def _assay_checks(sub, results, cache):
 
     assays = sub.assay
     exptype = sub.info["submission_type"]
-    codes = []
-    is_sequencing = False
+    # Controlled terms from ENA's assay schema, retrieved with the first assay that needs them
+    vocabulary = {}
 
-    # Get controlled terms from ENA's assay schema
-    if exptype in ("sequencing", "singlecell"):
-        library_terms = get_ena_library_terms_via_usi(logger)
-        instrument_models = get_ena_instrument_terms_via_usi(logger)
-        is_sequencing = True
+    def get_vocabulary():
+        if not vocabulary:
+            vocabulary["library_terms"] = get_ena_library_terms_via_usi(results.logger)
+            vocabulary["instrument_models"] = get_ena_instrument_terms_via_usi(results.logger)
+        return vocabulary
 
     if not assays:
-        logger.error("Experiment has no assays. At least one expected.")
-        codes.append("ASSA-E01")
-        return codes
+        results.error("ASSA-E01", "Experiment has no assays. At least one expected.")
+        return
 
     for a in assays:
-        additional_attributes = [at for at in a.get_all_attributes() if at not in ('alias', 'protocolrefs',
-                                                                                   'sampleref', 'accession')]
-        # Assay must have name
-        if not a.alias:
-            logger.error("Assay \"{}\" does not have a name specified. Not checking it.".format(a))
-            codes.append("ASSA-E02")
-            continue
-        # Technology type
-        if not a.technology_type:
-            logger.error("Assay \"{}\" does not have technology type specified.".format(a.alias))
-            codes.append("ASSA-E03")
-        elif exptype == "microarray" and a.technology_type != "array assay":
-            logger.error("Technology Type must be 'array assay' in a microarray submission. "
-                         "Found \"{}\".".format(a.technology_type))
-            codes.append("ASSA-E04")
-        elif exptype == "sequencing" and a.technology_type != "sequencing assay":
-            logger.error("Technology Type must be 'sequencing assay' in a sequencing submission. "
-                         "Found \"{}\".".format(a.technology_type))
-            codes.append("ASSA-E05")
-
-        # Microarray checks for label and array design
-        if not is_sequencing:
-            # Label
-            if not a.label:
-                logger.error("Microarray assay \"{}\" does not have label attribute specified.".format(a.alias))
-                codes.append("ASSA-E06")
-            # Array design
-            if not a.array_design:
-                logger.error("Microarray assay \"{}\" does not have array design specified.".format(a.alias))
-                codes.append("ASSA-E07")
-            elif not is_accession(a.array_design, "ARRAYEXPRESS"):
-                logger.error("Array design \"{}\" is not a valid ArrayExpress accession number.".format(a.array_design))
-                codes.append("ASSA-E08")
-
-        # Sequencing checks
-        elif is_sequencing:
-            # Absence of MA fields
-            if "label" in additional_attributes:
-                logger.error("Found sequencing assay \"{}\" with 'label' attribute.".format(a.alias))
-                codes.append("ASSA-E09")
-            if "array_design" in additional_attributes:
-                logger.error("Found sequencing assay \"{}\" with 'array design' attribute.".format(a.alias))
-                codes.append("ASSA-E10")
-            # Mandatory ENA library info
-            if not a.library_layout:
-                logger.error("Sequencing assay \"{}\" has no library layout specified.".format(a.alias))
-                codes.append("ASSA-E12")
-            elif a.library_layout.lower() == "paired":
-                if not a.nominal_length:
-                    logger.error("Paired-end assay \"{}\" has no nominal length specified.".format(a.alias))
-                    codes.append("ASSA-E13")
-                if not a.nominal_sdev:
-                    logger.error("Paired-end assay \"{}\" has no nominal sdev specified.".format(a.alias))
-                    codes.append("ASSA-E14")
-            if not a.library_source:
-                logger.error("Sequencing assay \"{}\" has no library source specified.".format(a.alias))
-                codes.append("ASSA-E15")
-            if not a.library_strategy:
-                logger.error("Sequencing assay \"{}\" has no library strategy specified.".format(a.alias))
-                codes.append("ASSA-E16")
-            if not a.library_selection:
-                logger.error("Sequencing assay \"{}\" has no library source specified.".format(a.alias))
-                codes.append("ASSA-E17")
-            if not a.library_strand:
-                logger.warn("Sequencing assay \"{}\" has no library strand specified.".format(a.alias))
-                codes.append("ASSA-W01")
-            if not a.instrument_model:
-                logger.error("Sequencing assay \"{}\" has no instrument model specified.".format(a.alias))
-                codes.append("ASSA-E18")
-            elif a.instrument_model not in instrument_models:
-                logger.error("Sequencing assay \"{}\" has instrument model \"{}\" which does "
-                             "not match against ENA's controlled vocabulary.".format(a.alias, a.instrument_model))
-                codes.append("ASSA-E19")
-            # ENA library terms must match against controlled vocabulary
-            for term, cv in library_terms.items():
-                # Assuming here that the names of the fields are exactly the same as in the assay attributes
-                value = getattr(a, term)
-                if value and value not in cv:
-                    logger.error("Value \"{}\" for {} does not match against ENA's controlled vocabulary.".format(value, term))
-                    codes.append("ASSA-E11")
-
-    return codes
-
-
-def run_singlecell_checks(sub: Submission, logger):
-
-    codes = []
+        run_check(cache, "assay", (exptype, a), functools.partial(check_assay, a, exptype, get_vocabulary), results,
+                  lookups=True)
+
+
+def check_assay(a, exptype, get_vocabulary, results):
+    """Run the checks of a single assay object.
+
+    :param a: assay object
+    :param exptype: string, the submission type
+    :param get_vocabulary: function returning a dictionary with ENA's controlled terms (used for sequencing assays)
+    :param results: ValidationResults object
+    """
+
+    is_sequencing = exptype in ("sequencing", "singlecell")
+    if is_sequencing:
+        vocabulary = get_vocabulary()
+
+    additional_attributes = [at for at in a.get_all_attributes() if at not in ('alias', 'protocolrefs',
+                                                                               'sampleref', 'accession')]
+    # Assay must have name
+    if not a.alias:
+        results.error("ASSA-E02", "Assay \"{}\" does not have a name specified. Not checking it.", a)
+        return
+    ref = a.alias
+    # Technology type
+    if not a.technology_type:
+        results.error("ASSA-E03", "Assay \"{}\" does not have technology type specified.", a.alias, ref=ref)
+    elif exptype == "microarray" and a.technology_type != "array assay":
+        results.error("ASSA-E04", "Technology Type must be 'array assay' in a microarray submission. Found \"{}\".",
+                      a.technology_type, ref=ref)
+    elif exptype == "sequencing" and a.technology_type != "sequencing assay":
+        results.error("ASSA-E05", "Technology Type must be 'sequencing assay' in a sequencing submission. "
+                      "Found \"{}\".", a.technology_type, ref=ref)
+
+    # Microarray checks for label and array design
+    if not is_sequencing:
+        # Label
+        if not a.label:
+            results.error("ASSA-E06", "Microarray assay \"{}\" does not have label attribute specified.", a.alias,
+                          ref=ref)
+        # Array design
+        if not a.array_design:
+            results.error("ASSA-E07", "Microarray assay \"{}\" does not have array design specified.", a.alias,
+                          ref=ref)
+        elif not is_accession(a.array_design, "ARRAYEXPRESS"):
+            results.error("ASSA-E08", "Array design \"{}\" is not a valid ArrayExpress accession number.",
+                          a.array_design, ref=ref)
+
+    # Sequencing checks
+    elif is_sequencing:
+        # Absence of MA fields
+        if "label" in additional_attributes:
+            results.error("ASSA-E09", "Found sequencing assay \"{}\" with 'label' attribute.", a.alias, ref=ref)
+        if "array_design" in additional_attributes:
+            results.error("ASSA-E10", "Found sequencing assay \"{}\" with 'array design' attribute.", a.alias, ref=ref)
+        # Mandatory ENA library info
+        if not a.library_layout:
+            results.error("ASSA-E12", "Sequencing assay \"{}\" has no library layout specified.", a.alias, ref=ref)
+        elif a.library_layout.lower() == "paired":
+            if not a.nominal_length:
+                results.error("ASSA-E13", "Paired-end assay \"{}\" has no nominal length specified.", a.alias, ref=ref)
+            if not a.nominal_sdev:
+                results.error("ASSA-E14", "Paired-end assay \"{}\" has no nominal sdev specified.", a.alias, ref=ref)
+        if not a.library_source:
+            results.error("ASSA-E15", "Sequencing assay \"{}\" has no library source specified.", a.alias, ref=ref)
+        if not a.library_strategy:
+            results.error("ASSA-E16", "Sequencing assay \"{}\" has no library strategy specified.", a.alias, ref=ref)
+        if not a.library_selection:
+            results.error("ASSA-E17", "Sequencing assay \"{}\" has no library source specified.", a.alias, ref=ref)
+        if not a.library_strand:
+            results.warning("ASSA-W01", "Sequencing assay \"{}\" has no library strand specified.", a.alias, ref=ref)
+        if not a.instrument_model:
+            results.error("ASSA-E18", "Sequencing assay \"{}\" has no instrument model specified.", a.alias, ref=ref)
+        elif not vocabulary["instrument_models"]:
+            results.lookup_failed("Could not retrieve ENA's instrument models, skipping the check of the instrument "
+                                  "model of assay \"{}\".".format(a.alias))
+        elif a.instrument_model not in vocabulary["instrument_models"]:
+            results.error("ASSA-E19", "Sequencing assay \"{}\" has instrument model \"{}\" which does "
+                          "not match against ENA's controlled vocabulary.", a.alias, a.instrument_model, ref=ref)
+        # ENA library terms must match against controlled vocabulary
+        if not vocabulary["library_terms"]:
+            results.lookup_failed("Could not retrieve ENA's library terms, skipping the check of the library terms "
+                                  "of assay \"{}\".".format(a.alias))
+        for term, cv in (vocabulary["library_terms"] or {}).items():
+            # Assuming here that the names of the fields are exactly the same as in the assay attributes
+            value = getattr(a, term)
+            if value and value not in cv:
+                results.error("ASSA-E11", "Value \"{}\" for {} does not match against ENA's controlled vocabulary.",
+                              value, term, ref=ref)
+
+
+def run_singlecell_checks(sub: Submission, logger, cache=None, results=None):
+    """Run checks on single-cell assay objects and return list of error codes.
+    With a ValidationCache, only the assays that have changed since the last run are checked.
+    If a ValidationResults object is given, the findings are added to it instead of being logged."""
+
+    return collect_results(_singlecell_checks, sub, logger, cache, results)
+
+
+@timed()
+def _singlecell_checks(sub, results, cache):
 
     # Assay checks
     for a in sub.assay:
         if not isinstance(a, SingleCellAssay):
-            logger.warn("Assay \"{}\" is not a single-cell assay, skipping assay checks.")
+            results.warning(None, "Assay \"{}\" is not a single-cell assay, skipping assay checks.", a.alias,
+                            ref=a.alias)
             continue
-        # Check that sc assays have library construction
-        sc_protocol = a.library_construction
-        if not sc_protocol:
-            logger.error("Single-cell assay \"{}\" has no library construction specified.".format(a.alias))
-            codes.append("CELL-E01")
-        else:
-            # Check that library_construction is from controlled vocabulary
-            allowed_protocols = ontology_term("singlecell_library_construction")
-            if sc_protocol.lower() not in allowed_protocols:
-                logger.error("Library construction \"{}\" for \"{}\" is not an allowed term.".
-                             format(sc_protocol, a.alias))
-                codes.append("CELL-E02")
-        # Check that sc assays have spike_in
-        if not a.spike_in:
-            logger.error("Single-cell assay \"{}\" has no spike in specified.".format(a.alias))
-            codes.append("CELL-E03")
-        # Check that spike_in_dilution is in the correct format
-        if a.spike_in_dilution:
-            if not re.match("^1\:[0-9]+$", a.spike_in_dilution):
-                logger.error("Spike in dilution for \"{}\" does not match expected pattern.".format(a.alias))
-                codes.append("CELL-E04")
-        # Warnings about non-critical single cell attributes
-        if not a.single_cell_isolation:
-            logger.warn("Single-cell assay \"{}\" has no single cell isolation specified.".format(a.alias))
-            codes.append("CELL-W05")
-        if not a.end_bias:
-            logger.warn("Single-cell assay \"{}\" has no end bias specified.".format(a.alias))
-            codes.append("CELL-W06")
-        if not a.input_molecule:
-            logger.warn("Single-cell assay \"{}\" has no input molecule specified.".format(a.alias))
-            codes.append("CELL-W07")
-        if not a.primer:
-            logger.warn("Single-cell assay \"{}\" has no primer specified.".format(a.alias))
-            codes.append("CELL-W08")
-
-    return codes
-
-
-def run_file_checks(sub: Submission, logger):
-    """Run file checks on assay_data and analysis objects and return list of error codes."""
-
-    codes = []
+        run_check(cache, "singlecell_assay", a, functools.partial(check_singlecell_assay, a), results)
+
+
+def check_singlecell_assay(a, results):
+    """Run the single-cell checks of a single assay object."""
+
+    ref = a.alias
+    # Check that sc assays have library construction
+    sc_protocol = a.library_construction
+    if not sc_protocol:
+        results.error("CELL-E01", "Single-cell assay \"{}\" has no library construction specified.", a.alias, ref=ref)
+    else:
+        # Check that library_construction is from controlled vocabulary
+        allowed_protocols = ontology_term("singlecell_library_construction")
+        if sc_protocol.lower() not in allowed_protocols:
+            results.error("CELL-E02", "Library construction \"{}\" for \"{}\" is not an allowed term.",
+                          sc_protocol, a.alias, ref=ref)
+    # Check that sc assays have spike_in
+    if not a.spike_in:
+        results.error("CELL-E03", "Single-cell assay \"{}\" has no spike in specified.", a.alias, ref=ref)
+    # Check that spike_in_dilution is in the correct format
+    if a.spike_in_dilution:
+        if not re.match("^1\:[0-9]+$", a.spike_in_dilution):
+            results.error("CELL-E04", "Spike in dilution for \"{}\" does not match expected pattern.", a.alias, ref=ref)
+    # Warnings about non-critical single cell attributes
+    if not a.single_cell_isolation:
+        results.warning("CELL-W05", "Single-cell assay \"{}\" has no single cell isolation specified.", a.alias,
+                        ref=ref)
+    if not a.end_bias:
+        results.warning("CELL-W06", "Single-cell assay \"{}\" has no end bias specified.", a.alias, ref=ref)
+    if not a.input_molecule:
+        results.warning("CELL-W07", "Single-cell assay \"{}\" has no input molecule specified.", a.alias, ref=ref)
+    if not a.primer:
+        results.warning("CELL-W08", "Single-cell assay \"{}\" has no primer specified.", a.alias, ref=ref)
+
+
+def run_file_checks(sub: Submission, logger, cache=None, results=None):
+    """Run file checks on assay_data and analysis objects and return list of error codes.
+    With a ValidationCache, only the data objects that have changed since the last run are checked.
+    The label check of raw data files linked to several assays is always done for all files.
+    If a ValidationResults object is given, the findings are added to it instead of being logged."""
+
+    return collect_results(_file_checks, sub, logger, cache, results)
+
+
+@timed()
+def _file_checks(sub, results, cache):
 
     if not sub.assay_data and not sub.analysis:
-        logger.error("Experiment does not have any data files associated with it.")
-        codes.append("DATA-E01")
-        return codes
+        results.error("DATA-E01", "Experiment does not have any data files associated with it.")
+        return
 
     # Run assay_data checks
     if not sub.assay_data:
-        logger.error("Experiment does not have raw data files.")
-        codes.append("DATA-E02")
+        results.error("DATA-E02", "Experiment does not have raw data files.")
     else:
-        _data_object_checks(sub.assay_data, logger, codes)
+        _data_object_checks(sub.assay_data, results, cache)
         # Assay labels to raw data file assignment check
         if sub.info.get("submission_type") == "microarray":
+            assay_labels = {}
+            for a in sub.assay:
+                if isinstance(a, MicroarrayAssay):
+                    assay_labels.setdefault(a.alias, a.label)
             for ad in sub.assay_data:
                 if ad.data_type == "raw":
                     connected_assays = [aref for aref in ad.assayrefs if ad.assayrefs]
-                    labels = [sub.get_assay(assay_name).label for assay_name in connected_assays
-                              if isinstance(sub.get_assay(assay_name), MicroarrayAssay)]
+                    labels = [assay_labels[assay_name] for assay_name in connected_assays
+                              if assay_name in assay_labels]
                     if len(labels) != len(set(labels)):
-                        logger.error("The number of assays linked to the same raw data file must match the number of "
-                                     "different channels (dyes used) and the labels of these assays must be distinct. "
-                                     "{} is currently linked to {} assays with labels {}.".format(
-                                      ad.alias, str(len(labels)), " and ".join(labels)))
-                        codes.append("DATA-E07")
+                        results.error("DATA-E07", "The number of assays linked to the same raw data file must match "
+                                      "the number of different channels (dyes used) and the labels of these assays "
+                                      "must be distinct. {} is currently linked to {} assays with labels {}.",
+                                      ad.alias, str(len(labels)), " and ".join(labels), ref=ad.alias)
 
     # Run analysis (processed data) checks
     if not sub.analysis:
-        logger.warning("Experiment does not have processed data.")
-        codes.append("DATA-W01")
+        results.warning("DATA-W01", "Experiment does not have processed data.")
     else:
-        _data_object_checks(sub.analysis, logger, codes)
-
-    return codes
+        _data_object_checks(sub.analysis, results, cache)
 
 
-def _data_object_checks(data_objects, logger, codes):
+def _data_object_checks(data_objects, results, cache=None):
 
     for ad in data_objects:
-        if not ad.alias:
-            logger.error("Found data object \"{}\" without name specified. Not checking it.".format(ad))
-            codes.append("DATA-E03")
-            continue
-        if not ad.files:
-            logger.error("Found data object \"{}\" with no data files.".format(ad.alias))
-            codes.append("DATA-E04")
-        else:
-            _file_object_checks(ad.files, logger, codes)
+        run_check(cache, "data_object", ad, functools.partial(check_data_object, ad), results)
+
+
+def check_data_object(ad, results):
+    """Run the checks of a single data object (assay_data or analysis)."""
+
+    if not ad.alias:
+        results.error("DATA-E03", "Found data object \"{}\" without name specified. Not checking it.", ad)
+    elif not ad.files:
+        results.error("DATA-E04", "Found data object \"{}\" with no data files.", ad.alias, ref=ad.alias)
+    else:
+        _file_object_checks(ad.files, ad.alias, results)
 
 
-def _file_object_checks(file_objects, logger, codes):
+def _file_object_checks(file_objects, ref, results):
     for f in file_objects:
         if f.name:
             if not REGEX_FILE_NAME.match(f.name):
-                logger.error("File name \"{}\" does not match allowed pattern.".format(f.name))
-                codes.append("DATA-E06")
+                results.error("DATA-E06", "File name \"{}\" does not match allowed pattern.", f.name, ref=ref)
         else:
-            logger.error("Found data file object \"{}\" without name specified.".format(f))
-            codes.append("DATA-E05")
+            results.error("DATA-E05", "Found data file object \"{}\" without name specified.", f, ref=ref)
 
+
+def run_checksum_checks(sub: Submission, data_dir, logger, workers=DEFAULT_WORKERS, checksum_cache=None,
+                        index=None, results=None):
+    """Verify the data files in the data directory against the checksums of the file objects
+    and return list of error codes. The files are hashed in parallel by the given number of workers.
+    With a checksum cache, files that have not changed since they were last verified are not read again.
+    With a DataDirectoryIndex, files that are not in the directory are skipped (see run_data_directory_checks).
+    If a ValidationResults object is given, the findings are added to it instead of being logged."""
+
+    checks = functools.partial(_checksum_checks, data_dir=data_dir, workers=workers, checksum_cache=checksum_cache,
+                               index=index)
+    return collect_results(checks, sub, logger, results=results)
+
+
+@timed()
+def _checksum_checks(sub, results, cache, data_dir, workers, checksum_cache, index=None):
+
+    # The same file can be listed in several data objects (e.g. for multiple channels)
+    file_checksums = {}
+    for ad in (sub.assay_data or []) + (sub.analysis or []):
+        for f in ad.files or []:
+            if not f.name or (index is not None and f.name not in index):
+                continue
+            if not f.checksum:
+                results.debug("No checksum given for data file \"{}\".", f.name, ref=ad.alias)
+            elif (f.checksum_method or "").lower() not in hashlib.algorithms_available:
+                results.warning("DATA-W03", "Cannot verify data file \"{}\" with unknown checksum method \"{}\".",
+                                f.name, f.checksum_method, ref=ad.alias)
+            else:
+                file_checksums.setdefault(f.name, (f.name, f.checksum, f.checksum_method.lower()))
+    if not file_checksums:
+        return
+
+    start = time.perf_counter()
+    verified = verify_files(list(file_checksums.values()), data_dir, workers=workers, cache=checksum_cache)
+    for r in verified:
+        if r["status"] == "mismatch":
+            results.error("DATA-E08", "Checksum of data file \"{}\" ({}) does not match the checksum given in the "
+                          "SDRF ({}).", r["name"], r["digest"], r["expected"], ref=r["name"])
+        elif r["status"] == "missing":
+            results.warning("DATA-W02", "Cannot verify checksum of data file \"{}\", the file was not found in {}.",
+                            r["name"], data_dir, ref=r["name"])
+        elif r["status"] == "unreadable":
+            results.warning("DATA-W02", "Cannot verify checksum of data file \"{}\": {}", r["name"], r["error"],
+                            ref=r["name"])
+    total_size = sum(r["size"] or 0 for r in verified)
+    results.debug("Checked {} data files ({} bytes read or cached) in {:.2f} s.",
+                  len(verified), total_size, time.perf_counter() - start)
+
+
+def run_data_directory_checks(sub: Submission, index, logger, ignore=(), results=None):
+    """Check that the data files of the file objects exist in the data directory and are not empty,
+    and that there are no other files in the directory. Return list of error codes.
+
+    :param sub: Submission object
+    :param index: DataDirectoryIndex of the data directory
+    :param logger: log handler
+    :param ignore: names of other files that are expected in the data directory (e.g. IDF and SDRF)
+    :param results: (optional) ValidationResults object to add the findings to, without logging them
+    """
+
+    checks = functools.partial(_data_directory_checks, index=index, ignore=ignore)
+    return collect_results(checks, sub, logger, results=results)
+
+
+@timed()
+def _data_directory_checks(sub, results, cache, index, ignore):
+
+    file_names = [f.name for ad in (sub.assay_data or []) + (sub.analysis or []) for f in ad.files or [] if f.name]
+    missing, empty, unreferenced = index.compare(file_names, ignore=ignore)
+    for name in missing:
+        results.error("DATA-E09", "Data file \"{}\" was not found in the data directory.", name, ref=name)
+    for name in empty:
+        results.error("DATA-E10", "Data file \"{}\" is empty.", name, ref=name)
+    for name in unreferenced:
+        results.warning("DATA-W04", "File \"{}\" in the data directory is not listed in the SDRF.", name, ref=name)
+    # Report how long the directory scan took, at info level for large directories
+    message = "Indexed {} files in {} in {:.2f} s."
+    if len(index) >= LARGE_DATA_DIRECTORY:
+        results.info(message, len(index), index.data_dir, index.elapsed)
+    else:
+        results.debug(message, len(index), index.data_dir, index.elapsed)
+
+
+def run_fastq_checks(sub: Submission, data_dir, logger, max_records=DEFAULT_RECORDS, workers=DEFAULT_WORKERS,
+                     index=None, results=None):
+    """Inspect the first records of the FASTQ files of assay_data objects and compare the read lengths and layout
+    with the attributes of the assays. Return list of error codes. The files are read in parallel.
+    With a DataDirectoryIndex, files that are not in the directory are skipped (see run_data_directory_checks).
+    If a ValidationResults object is given, the findings are added to it instead of being logged."""
+
+    checks = functools.partial(_fastq_checks, data_dir=data_dir, max_records=max_records, workers=workers,
+                               index=index)
+    return collect_results(checks, sub, logger, results=results)
+
+
+@timed()
+def _fastq_checks(sub, results, cache, data_dir, max_records, workers, index=None):
+
+    runs = []
+    for ad in sub.assay_data or []:
+        files = [f for f in ad.files or [] if f.name and is_fastq_file(f.name)
+                 and (index is None or f.name in index)]
+        if files:
+            runs.append((ad, files))
+    if not runs:
+        return
+
+    start = time.perf_counter()
+    file_names = list(OrderedDict.fromkeys(f.name for _, files in runs for f in files))
+    inspections = inspect_fastq_files([os.path.join(data_dir, name) for name in file_names], max_records, workers)
+    inspections = dict(zip(file_names, inspections))
+    results.debug("Inspected {} FASTQ files in {:.2f} s.", len(file_names), time.perf_counter() - start)
+
+    assays = {a.alias: a for a in sub.assay or []}
+    for ad, files in runs:
+        run_files = []
+        for f in files:
+            inspection = inspections[f.name]
+            if inspection["error"]:
+                results.error("FASTQ-E01", "Cannot read FASTQ file \"{}\": {}", f.name, inspection["error"],
+                              ref=ad.alias)
+                continue
+            results.debug("FASTQ file \"{}\" has reads of {}-{} bp (read number {}).", f.name,
+                          inspection["min_length"], inspection["max_length"],
+                          "/".join(inspection["read_numbers"]) or "unknown", ref=ad.alias)
+            read_type = getattr(f, "read_type", None)
+            if read_type in ("read1", "read2") and len(inspection["read_numbers"]) == 1 \
+                    and inspection["read_numbers"][0] != read_type[-1]:
+                results.warning("FASTQ-W03", "FASTQ file \"{}\" is given as {} file, but the read headers have "
+                                "read number {}.", f.name, read_type, inspection["read_numbers"][0], ref=ad.alias)
+            run_files.append((f, inspection))
+        for assay_name in ad.assayrefs or []:
+            if assay_name in assays and run_files:
+                _compare_fastq_with_assay(assays[assay_name], ad, run_files, results)
+
+
+def _compare_fastq_with_assay(a, ad, run_files, results):
+
+    layout = infer_library_layout([inspection for _, inspection in run_files])
+    declared_layout = (getattr(a, "library_layout", None) or "").upper()
+    if layout and declared_layout and layout != declared_layout:
+        results.warning("FASTQ-W01", "Assay \"{}\" has library layout {}, but the FASTQ files of \"{}\" look {}.",
+                        a.alias, declared_layout, ad.alias, layout.lower(), ref=a.alias)
+    if not isinstance(a, SingleCellAssay):
+        return
+
+    # The files are only linked to the read types in the droplet format (see dm2magetab.is_droplet)
+    files_by_read_type = {getattr(f, "read_type", None): inspection for f, inspection in run_files}
+    for barcode, barcode_name in (("cell_barcode", "cell barcode"), ("umi_barcode", "UMI barcode")):
+        inspection = files_by_read_type.get(getattr(a, barcode + "_read", None))
+        try:
+            size = int(getattr(a, barcode + "_size", None))
+            offset = int(getattr(a, barcode + "_offset", None) or 0)
+        except (TypeError, ValueError):
+            continue
+        if inspection and inspection["min_length"] < offset + size:
+            results.error("FASTQ-E02", "Reads in FASTQ file \"{}\" are {} bp long, too short for the {} of assay "
+                          "\"{}\" (offset {} + size {}).", os.path.basename(inspection["path"]),
+                          inspection["min_length"], barcode_name, a.alias, offset, size, ref=a.alias)
+    inspection = files_by_read_type.get(getattr(a, "cDNA_read", None))
+    if inspection and is_barcode_read(inspection):
+        results.warning("FASTQ-W02", "The cDNA read file \"{}\" of assay \"{}\" only has reads of up to {} bp, "
+                        "it looks like a barcode read.", os.path.basename(inspection["path"]), a.alias,
+                        inspection["max_length"], ref=a.alias)
@@ -0,0 +1,126 @@
+"""Module with a content-addressed cache for the results of metadata validation checks.
+
+Each check is stored under a hash of its name and of the content of its inputs (e.g. one sample object,
+or the set of organism names of all samples). When a submission is validated again, only the checks whose
+inputs have changed are run. For the others, the validation records from the previous run are added to the
+results, so that the remote look-ups the checks depend on are skipped as well. The keys of checks with remote
+look-ups also contain the version of the vocabulary snapshot in offline mode (see utils.vocabulary_snapshot),
+and the records of a check are not stored if one of its look-ups failed.
+
+Checks across objects (e.g. that factor values vary, or that a file is not used by two assays with the same
+label) are cheap and always run.
+
+The records are stored with the version of the checks and the time they were added. When the cache is saved,
+records of other versions and records older than MAX_AGE are dropped, and at most MAX_ENTRIES are kept.
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+from utils.lookup_cache import LookupCache
+from utils.vocabulary_snapshot import get_vocabulary_version
+from validator.validation_results import ValidationResult
+
+
+MAX_AGE = 30 * 24 * 3600
+MAX_ENTRIES = 100000
+
+
+def canonical_form(obj):
+    """Return a JSON serialisable representation of an object (e.g. a datamodel object) and its attributes,
+    with dictionaries and sets in a fixed order, so that equal content always gives the same representation."""
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    if isinstance(obj, dict):
+        return [[str(k), canonical_form(v)] for k, v in sorted(obj.items(), key=lambda item: str(item[0]))]
+    if isinstance(obj, (list, tuple)):
+        return [canonical_form(x) for x in obj]
+    if isinstance(obj, (set, frozenset)):
+        return sorted((canonical_form(x) for x in obj), key=repr)
+    if hasattr(obj, "__dict__"):
+        return [type(obj).__name__, canonical_form(vars(obj))]
+    return repr(obj)
+
+
+def fingerprint(*inputs):
+    """Return a hash of the content of the given objects."""
+    content = json.dumps(canonical_form(inputs), separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class ValidationCache:
+
+    def __init__(self, version="", name="validation_results", cache_dir=None, max_age=MAX_AGE,
+                 max_entries=MAX_ENTRIES):
+        """
+        Store of the validation records of checks, addressed by the content of the checks' inputs.
+        The records are persisted like the look-up caches (see utils.lookup_cache).
+
+        :param version: string, identifier of the version of the checks, results of other versions are not used
+        :param name: string, name of the cache file
+        :param cache_dir: (optional) directory of the cache file
+        :param max_age: seconds after which the records of a check are dropped
+        :param max_entries: maximum number of checks to keep records of, the oldest are dropped first
+        """
+        self.version = version
+        # The keys start with (the beginning of) the version, so that records of other versions can be dropped
+        self.key_prefix = "{}:".format(version[:12])
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.store = LookupCache(name, cache_dir=cache_dir, prune=self.prune)
+        # Numbers of checks replayed from the cache and run, counted under the lock as worker threads share a cache
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def run_check(self, check_name, inputs, check_function, results, lookups=False):
+        """Add the records of a check to the results, running it only if there are no records for the same inputs.
+
+        :param check_name: string, name of the check
+        :param inputs: the objects the check depends on
+        :param check_function: function that takes a ValidationResults object and adds its findings to it
+        :param results: ValidationResults object
+        :param lookups: boolean, flag that the check uses remote look-ups (vocabularies, taxonomy)
+        """
+        vocabulary_version = get_vocabulary_version() if lookups else None
+        key = self.key_prefix + fingerprint(self.version, check_name, vocabulary_version, inputs)
+        entry = self.store.get(key)
+        if entry is not None:
+            with self.lock:
+                self.hits += 1
+            results.extend(ValidationResult.from_list(r) for r in entry[1])
+            return
+        with self.lock:
+            self.misses += 1
+        start = len(results)
+        failed_lookups = results.failed_lookups
+        check_function(results)
+        if results.failed_lookups > failed_lookups:
+            # The findings may be different once the look-ups work again
+            return
+        # The time the records were added and the records
+        self.store.set(key, [time.time(), [r.to_list() for r in results.records[start:]]])
+
+    def prune(self, entries):
+        """Return the entries of the current version that are not too old, at most max_entries of the newest."""
+        oldest = time.time() - self.max_age
+        kept = [(key, entry) for key, entry in entries.items()
+                if key.startswith(self.key_prefix) and isinstance(entry, list) and entry[0] >= oldest]
+        if len(kept) > self.max_entries:
+            kept.sort(key=lambda item: item[1][0])
+            kept = kept[-self.max_entries:]
+        return dict(kept)
+
+    def save(self):
+        """Write the new records to the cache file."""
+        self.store.save()
+
+
+def run_check(cache, check_name, inputs, check_function, results, lookups=False):
+    """Run a check through the validation cache, or directly if no cache is given."""
+    if cache is None:
+        check_function(results)
+    else:
+        cache.run_check(check_name, inputs, check_function, results, lookups)
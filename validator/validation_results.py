@@ -0,0 +1,151 @@
+"""Module for collecting the findings of the metadata validation as structured records.
+
+The checks add a record with the error code, severity, the object it refers to and the message template with
+its arguments. The message is only formatted when a sink needs it: the LoggerSink (only for the levels that
+the logger is enabled for), the JSONLinesSink or the SummarySink, which only counts the codes.
+"""
+
+import json
+import logging
+from collections import Counter, OrderedDict
+
+
+class ValidationResult:
+
+    __slots__ = ("severity", "code", "ref", "template", "args")
+
+    def __init__(self, severity, code, ref, template, args):
+        """
+        Single finding of a validation check.
+
+        :param severity: integer, logging level (e.g. logging.ERROR)
+        :param code: string, error code (e.g. "PROT-E01"), None for messages without code
+        :param ref: string, name of the object the finding refers to (None for the whole submission)
+        :param template: string, message with "{}" placeholders
+        :param args: tuple, values for the placeholders
+        """
+        self.severity = severity
+        self.code = code
+        self.ref = ref
+        self.template = template
+        self.args = args
+
+    @property
+    def message(self):
+        return self.template.format(*self.args) if self.args else self.template
+
+    def to_list(self):
+        """Return the record as JSON serialisable list (e.g. for the validation cache)."""
+        return [self.severity, self.code, self.ref, self.template, [str(a) for a in self.args]]
+
+    @classmethod
+    def from_list(cls, values):
+        severity, code, ref, template, args = values
+        return cls(severity, code, ref, template, tuple(args))
+
+    def to_dict(self):
+        return OrderedDict([("code", self.code), ("severity", logging.getLevelName(self.severity)),
+                            ("ref", self.ref), ("message", self.message)])
+
+
+class ValidationResults:
+
+    def __init__(self, logger=None):
+        """
+        Collector of the validation findings.
+
+        :param logger: (optional) log handler, passed on to remote look-ups made by the checks
+        """
+        self.records = []
+        self.logger = logger or logging.getLogger()
+        # Number of remote look-ups that failed, the findings of checks with failed look-ups are not cached
+        self.failed_lookups = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def add(self, severity, code, template, *args, ref=None):
+        self.records.append(ValidationResult(severity, code, ref, template, args))
+
+    def error(self, code, template, *args, ref=None):
+        self.records.append(ValidationResult(logging.ERROR, code, ref, template, args))
+
+    def warning(self, code, template, *args, ref=None):
+        self.records.append(ValidationResult(logging.WARNING, code, ref, template, args))
+
+    def info(self, template, *args, ref=None):
+        self.records.append(ValidationResult(logging.INFO, None, ref, template, args))
+
+    def debug(self, template, *args, ref=None):
+        self.records.append(ValidationResult(logging.DEBUG, None, ref, template, args))
+
+    def lookup_failed(self, message=None):
+        """Record that a remote look-up of a check failed (or may have failed), and log the message as warning."""
+        self.failed_lookups += 1
+        if message:
+            self.logger.warning(message)
+
+    def extend(self, records):
+        self.records.extend(records)
+
+    def codes(self, start=0):
+        """Return the list of error codes (in the order they were found), optionally from the given record on."""
+        return [r.code for r in self.records[start:] if r.code]
+
+    def unique_codes(self):
+        """Return the distinct error codes in the order they were first found."""
+        return list(OrderedDict.fromkeys(self.codes()))
+
+    def write(self, *sinks, start=0):
+        """Pass the records (optionally from the given record on) to the sinks."""
+        records = self.records[start:]
+        for sink in sinks:
+            sink.write(records)
+
+
+class LoggerSink:
+
+    def __init__(self, logger):
+        """Sink that logs the messages, formatting only those the logger is enabled for."""
+        self.logger = logger
+
+    def write(self, records):
+        for r in records:
+            if self.logger.isEnabledFor(r.severity):
+                self.logger.log(r.severity, r.message)
+
+
+class JSONLinesSink:
+
+    def __init__(self, file_handle, min_severity=logging.INFO):
+        """Sink that writes one JSON object per record (code, severity, ref and message) to an open file.
+
+        :param file_handle: file object opened for writing text
+        :param min_severity: integer, records with lower severity are not written
+        """
+        self.file_handle = file_handle
+        self.min_severity = min_severity
+
+    def write(self, records):
+        self.file_handle.writelines(json.dumps(r.to_dict()) + "\n" for r in records if r.severity >= self.min_severity)
+
+
+class SummarySink:
+
+    def __init__(self):
+        """Sink that only counts the records per code and severity, no messages are formatted."""
+        self.code_counts = Counter()
+        self.severity_counts = Counter()
+
+    def write(self, records):
+        for r in records:
+            self.severity_counts[logging.getLevelName(r.severity)] += 1
+            if r.code:
+                self.code_counts[r.code] += 1
+
+    def summary(self):
+        return OrderedDict([("severities", dict(self.severity_counts)),
+                            ("codes", OrderedDict(sorted(self.code_counts.items())))])